@@ -0,0 +1,84 @@
+"""
+Compare the pandas and Arrow backends of the analyzer on synthetic data.
+
+Both backends analyze the same synthetic tables (benchmarks.synthetic) with percentiles
+enabled. Their output frames must be identical; the best of --repeat runs of each backend
+is reported.
+
+Usage:
+    python -m benchmarks.bench_analysis_backends --messages 1e6 --repeat 3 --compact
+"""
+
+import argparse
+import sys
+import time
+from datetime import timedelta
+
+import pandas as pd
+from loguru import logger
+
+from src import ArrowChatResponseAnalyzer, ChatResponseAnalyzer
+
+from .synthetic import generate_tables
+
+WORK_START = timedelta(hours=9)
+WORK_END = timedelta(hours=18)
+UTC_OFFSET = timedelta(hours=3)
+BACKENDS = {"pandas": ChatResponseAnalyzer, "arrow": ArrowChatResponseAnalyzer}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=float, default=1e6)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Pass chat messages in the compact layout (as with COMPACT_DTYPES).",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    tables = generate_tables(messages=int(args.messages), seed=args.seed)
+    if args.compact:
+        tables["chat_messages"] = ChatResponseAnalyzer.compact_messages(
+            tables["chat_messages"]
+        )
+
+    results = {}
+    for backend, cls in BACKENDS.items():
+        analyzer = cls(
+            work_start=WORK_START,
+            work_end=WORK_END,
+            utc_offset=UTC_OFFSET,
+            percentiles=(0.5, 0.9, 0.99),
+        )
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = analyzer.analyze_result(
+                tables["chat_messages"], tables["managers"], tables["rops"]
+            )
+            timings.append(time.perf_counter() - start)
+        results[backend] = (min(timings), result)
+
+    pd.testing.assert_frame_equal(results["pandas"][1], results["arrow"][1])
+    for backend, (seconds, _) in results.items():
+        print(
+            f"{backend:>6}: best of {args.repeat} = {seconds:.3f} s, "
+            f"{args.messages / seconds:,.0f} messages/s"
+        )
+    print(
+        f"Output frames are identical. Speed-up of arrow over pandas: "
+        f"{results['pandas'][0] / results['arrow'][0]:.2f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Compare the "read_sql" and "copy" extraction backends of DatabaseExtractor.
+
+A synthetic chat_messages table is created in a separate schema of the database
+configured in settings/db_api/connect.yaml, loaded with both backends and dropped
+afterwards (unless --keep is passed).
+
+Usage:
+    python -m benchmarks.bench_extraction_backends --rows 1000000 --repeat 3
+"""
+
+import argparse
+import time
+
+from loguru import logger
+
+from src import Config, DatabaseExtractor
+
+SCHEMA = "bench_extraction"
+
+CREATE_TABLE = f"""
+DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;
+CREATE SCHEMA {SCHEMA};
+CREATE TABLE {SCHEMA}.chat_messages AS
+SELECT
+    g AS id,
+    (random() * %(entities)s)::int AS entity_id,
+    CASE WHEN r < 0.5 THEN 'incoming_chat_message'
+         ELSE 'outgoing_chat_message' END AS type,
+    1700000000 + (random() * 30 * 86400)::bigint AS created_at,
+    CASE WHEN r < 0.5 THEN NULL ELSE 1 + (random() * 50)::int END AS created_by,
+    md5(g::text) AS message
+FROM (SELECT g, random() AS r FROM generate_series(1, %(rows)s) AS g) AS s;
+"""
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--entities", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--wide",
+        action="store_true",
+        help="Fetch all columns (SELECT *) instead of the analyzer projection.",
+    )
+    parser.add_argument("--keep", action="store_true", help="Keep the synthetic table.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    db_info = Config().bd_info()
+
+    extractors = {
+        backend: DatabaseExtractor(
+            db_host=db_info["HOST"],
+            db_port=db_info["PORT"],
+            db_name=db_info["NAME"],
+            db_user=db_info["USER"],
+            db_password=db_info["PASSWORD"],
+            backend=backend,
+        )
+        for backend in ("read_sql", "copy")
+    }
+    for extractor in extractors.values():
+        extractor.query_builder.schema = SCHEMA
+        extractor.queries = {
+            "chat_messages": f"SELECT * FROM {SCHEMA}.chat_messages;"
+            if args.wide
+            else extractor.query_builder.select("chat_messages")
+        }
+
+    conn = extractors["copy"].connect_to_db()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(CREATE_TABLE, {"rows": args.rows, "entities": args.entities})
+        conn.commit()
+        logger.info(f"Synthetic table with {args.rows} rows created.")
+
+        results = {}
+        for backend, extractor in extractors.items():
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                df = extractor._read_query(conn, extractor.queries["chat_messages"])
+                timings.append(time.perf_counter() - start)
+            results[backend] = (min(timings), df.memory_usage(deep=True).sum())
+
+        for backend, (seconds, memory) in results.items():
+            logger.info(
+                f"{backend:>8}: best of {args.repeat} = {seconds:.3f} s, "
+                f"{args.rows / seconds:,.0f} rows/s, frame {memory / 2**20:.1f} MiB"
+            )
+        logger.info(
+            f"Speed-up of copy over read_sql: "
+            f"{results['read_sql'][0] / results['copy'][0]:.2f}x"
+        )
+    finally:
+        if not args.keep:
+            with conn.cursor() as cursor:
+                cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;")
+            conn.commit()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
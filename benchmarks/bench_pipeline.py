@@ -0,0 +1,347 @@
+"""
+Benchmark the analysis stages and the whole extract/analyze/upload pipeline offline.
+
+Synthetic tables from benchmarks.synthetic are served by a stub database and written to a
+stub Google Sheets service. Every stage is timed (best of --repeat runs), and its peak
+memory is measured with tracemalloc in one extra run. Results are written as JSON and can
+be compared with a previous run.
+
+Usage:
+    python -m benchmarks.bench_pipeline --messages 1e4 1e5 1e6 --output results.json
+    python -m benchmarks.bench_pipeline --messages 1e6 --baseline results.json
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from programm_avarage_response import PERCENTILES
+from src import AsyncPipeline, ChatResponseAnalyzer, Config
+
+from .stubs import StubDatabaseExtractor, StubGoogleSheetsHandler
+from .synthetic import generate_tables
+
+WORK_START = timedelta(hours=9)
+WORK_END = timedelta(hours=18)
+UTC_OFFSET = timedelta(hours=3)
+
+
+class StageRecorder:
+    """
+    Calls stage functions and records their wall time and, optionally, peak memory.
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        self.trace_memory = trace_memory
+        self.seconds = {}
+        self.peak_bytes = {}
+
+    def __call__(self, name: str, function, *args, **kwargs):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.seconds[name] = time.perf_counter() - start
+
+        if self.trace_memory:
+            self.peak_bytes[name] = tracemalloc.get_traced_memory()[1] - baseline
+        return result
+
+
+def run_stages(
+    record: StageRecorder,
+    analyzer: ChatResponseAnalyzer,
+    tables: dict,
+    fetch_size: int,
+    range_name: str,
+) -> None:
+    """
+    Run every benchmarked stage once.
+
+    Args:
+        record (StageRecorder): Recorder timing the stages.
+        analyzer (ChatResponseAnalyzer): Analyzer to benchmark.
+        tables (dict): Synthetic tables.
+        fetch_size (int): Chunk size of the streaming stages.
+        range_name (str): Sheet range of the uploads.
+    """
+    # Стадии analyze_result по отдельности; входные таблицы копируются вне замеров
+    df_managers = tables["managers"].copy()
+    df_rops = tables["rops"].copy()
+    df_chat_messages = record(
+        "analyzer.preprocess_messages",
+        analyzer._preprocess_messages,
+        tables["chat_messages"].copy(),
+    )
+    filtered_messages = record(
+        "analyzer.filter_messages", analyzer._filter_messages, df_chat_messages
+    )
+    responses_df = record(
+        "analyzer.calculate_response_times",
+        analyzer._calculate_response_times,
+        filtered_messages,
+    )
+    summary = record(
+        "analyzer.summarize_response_times",
+        analyzer._summarize_response_times,
+        responses_df,
+    )
+    average_response_time = record(
+        "analyzer.calculate_average_response_time",
+        analyzer._calculate_average_response_time,
+        summary,
+        df_managers,
+    )
+    record(
+        "analyzer.attach_rops",
+        analyzer._attach_rops,
+        average_response_time,
+        df_managers,
+        df_rops,
+    )
+    del df_chat_messages, filtered_messages, responses_df
+
+    # Весь конвейер на заглушках базы и Google Sheets
+    db_extractor = StubDatabaseExtractor(tables, fetch_size=fetch_size)
+    gs_handler = StubGoogleSheetsHandler()
+
+    dict_table = record("pipeline.extract", db_extractor.extract_and_save_data)
+    result = record(
+        "pipeline.analyze_result",
+        analyzer.analyze_result,
+        dict_table["chat_messages"],
+        dict_table["managers"],
+        dict_table["rops"],
+    )
+    del dict_table
+    record("pipeline.upload_full", gs_handler.save_data_table, range_name, result)
+    record(
+        "pipeline.upload_diff",
+        gs_handler.save_data_table,
+        range_name,
+        result,
+        diff=True,
+    )
+
+    dict_table = db_extractor.extract_and_save_data(tables=["managers", "rops"])
+    record(
+        "pipeline.analyze_chunks",
+        analyzer.analyze_chunks,
+        db_extractor.stream_chat_messages(),
+        dict_table["managers"],
+        dict_table["rops"],
+    )
+
+    pipeline = AsyncPipeline(
+        analyzer, db_extractor, StubGoogleSheetsHandler(), range_name
+    )
+    record("pipeline.async", lambda: asyncio.run(pipeline.run()))
+
+
+def benchmark(messages: int, args: argparse.Namespace) -> dict:
+    """
+    Benchmark all stages on one table size.
+
+    Args:
+        messages (int): Number of synthetic chat messages.
+        args (argparse.Namespace): Command line arguments.
+
+    Returns:
+        dict: Parameters of the run and per-stage best time and peak memory.
+    """
+    tables = generate_tables(
+        messages=messages,
+        entities=args.entities,
+        managers=args.managers,
+        rops=args.rops,
+        mean_block_length=args.block_length,
+        off_hours_share=args.off_hours,
+        work_start=WORK_START,
+        work_end=WORK_END,
+        utc_offset=UTC_OFFSET,
+        seed=args.seed,
+    )
+    # Таблица с процентилями и диапазон листа те же, что у задания
+    analyzer = ChatResponseAnalyzer(
+        work_start=WORK_START,
+        work_end=WORK_END,
+        utc_offset=UTC_OFFSET,
+        percentiles=PERCENTILES,
+    )
+    range_name = Config().get_google_sheets_info()["RANGE_NAME"]
+
+    # Память таблицы сообщений в исходной и компактной схеме
+    compact_messages = ChatResponseAnalyzer.compact_messages(tables["chat_messages"])
+    frame_bytes = {
+        "object": int(tables["chat_messages"].memory_usage(deep=True).sum()),
+        "compact": int(compact_messages.memory_usage(deep=True).sum()),
+    }
+    logger.info(
+        f"{messages:>11,} chat_messages frame: {frame_bytes['object'] / 2**20:.1f} MiB, "
+        f"compact {frame_bytes['compact'] / 2**20:.1f} MiB "
+        f"({frame_bytes['object'] / frame_bytes['compact']:.1f}x smaller)"
+    )
+    if args.compact:
+        tables["chat_messages"] = compact_messages
+    del compact_messages
+    fetch_size = args.fetch_size or max(messages // 10, 1)
+
+    best = {}
+    for _ in range(args.repeat):
+        record = StageRecorder()
+        run_stages(record, analyzer, tables, fetch_size, range_name)
+        for name, seconds in record.seconds.items():
+            best[name] = min(seconds, best.get(name, seconds))
+
+    stages = {name: {"seconds": seconds} for name, seconds in best.items()}
+    if not args.no_memory:
+        record = StageRecorder(trace_memory=True)
+        tracemalloc.start()
+        try:
+            run_stages(record, analyzer, tables, fetch_size, range_name)
+        finally:
+            tracemalloc.stop()
+        for name, peak in record.peak_bytes.items():
+            stages[name]["peak_mib"] = round(peak / 2**20, 3)
+
+    for name, stage in stages.items():
+        logger.info(
+            f"{messages:>11,} {name:<42} {stage['seconds']:9.4f} s"
+            + (f" {stage['peak_mib']:10.1f} MiB" if "peak_mib" in stage else "")
+        )
+
+    return {
+        "messages": messages,
+        "fetch_size": fetch_size,
+        "chat_messages_bytes": frame_bytes,
+        "stages": stages,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> int:
+    """
+    Log the time ratios against a baseline and count the regressions.
+
+    Args:
+        results (dict): Results of this run.
+        baseline (dict): Results of an earlier run.
+        threshold (float): Relative slowdown reported as a regression, e.g. 0.1 for 10%.
+
+    Returns:
+        int: Number of stages slower than the baseline by more than the threshold.
+    """
+    baseline_runs = {run["messages"]: run for run in baseline["runs"]}
+    regressions = 0
+
+    for run in results["runs"]:
+        baseline_run = baseline_runs.get(run["messages"])
+        if baseline_run is None:
+            logger.warning(f"No baseline for {run['messages']} messages.")
+            continue
+        for name, stage in run["stages"].items():
+            baseline_stage = baseline_run["stages"].get(name)
+            if baseline_stage is None:
+                continue
+            ratio = stage["seconds"] / baseline_stage["seconds"]
+            regressed = ratio > 1 + threshold
+            regressions += regressed
+            (logger.warning if regressed else logger.info)(
+                f"{run['messages']:>11,} {name:<42} {ratio:6.2f}x baseline time"
+                + (" REGRESSION" if regressed else "")
+            )
+
+    return regressions
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--messages",
+        type=lambda value: int(float(value)),
+        nargs="+",
+        default=[10_000, 100_000],
+        help="Table sizes to benchmark, e.g. 1e4 1e6.",
+    )
+    parser.add_argument("--entities", type=int, default=None)
+    parser.add_argument("--managers", type=int, default=50)
+    parser.add_argument("--rops", type=int, default=5)
+    parser.add_argument("--block-length", type=float, default=2.0)
+    parser.add_argument(
+        "--off-hours",
+        type=float,
+        default=0.3,
+        help="Share of conversations starting outside working hours.",
+    )
+    parser.add_argument("--fetch-size", type=int, default=None)
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="Feed the stages chat messages already in the compact layout.",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--no-memory", action="store_true", help="Skip the tracemalloc run."
+    )
+    parser.add_argument("--output", help="Write the results to this JSON file.")
+    parser.add_argument("--baseline", help="Compare with results of an earlier run.")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+        },
+        "parameters": {
+            "entities": args.entities,
+            "managers": args.managers,
+            "rops": args.rops,
+            "block_length": args.block_length,
+            "off_hours": args.off_hours,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "compact": args.compact,
+        },
+        "runs": [benchmark(messages, args) for messages in args.messages],
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        logger.info(f"Results saved to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline.get("parameters") != results["parameters"]:
+            logger.warning("The baseline was generated with different parameters.")
+        regressions = compare(results, baseline, args.threshold)
+        logger.info(
+            f"{regressions} stages regressed by more than {args.threshold:.0%}."
+        )
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
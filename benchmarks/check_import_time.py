@@ -0,0 +1,155 @@
+"""
+Check that the entry points do not import heavy dependencies they do not need.
+
+Every case is started in a fresh interpreter with ``python -X importtime``. The check fails
+if a case imports one of its forbidden modules (e.g. pandas for ``cli.py --help``, the
+Google API client for the extraction) or, for the light cases, if its import time exceeds
+the budget (scaled by --budget-factor on slow machines). The best of --repeat starts of
+every case is reported with its heaviest top-level import.
+
+Usage:
+    python -m benchmarks.check_import_time --repeat 3
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY = (
+    "pandas",
+    "numpy",
+    "pyarrow",
+    "psycopg2",
+    "googleapiclient",
+    "oauth2client",
+    "httplib2",
+)
+GOOGLE = ("googleapiclient", "oauth2client", "httplib2")
+# Бэкенды и режимы, которые загружаются, только если включены или вызваны
+OPTIONAL_BACKENDS = (
+    "src.arrow_analysis",
+    "src.backfill",
+    "src.parallel_analysis",
+    "src.pipeline",
+    "src.sql_analysis",
+)
+
+# Команда upload до чтения результата: отсутствующий файл останавливает её перед
+# обращением к Google API
+UPLOAD = """
+import cli
+try:
+    cli.main(["upload", "--input", "missing.arrow"])
+except OSError:
+    pass
+"""
+
+# Название -> (аргументы интерпретатора, запрещённые модули, бюджет в мс или None)
+CASES = {
+    "cli --help": (["cli.py", "--help"], HEAVY, 150),
+    "upload --help": (["cli.py", "upload", "--help"], HEAVY, 150),
+    "upload": (
+        ["-c", UPLOAD],
+        ("psycopg2", "programm_avarage_response") + OPTIONAL_BACKENDS,
+        None,
+    ),
+    "import src": (["-c", "import src"], HEAVY, 150),
+    "config": (["-c", "from src import Config, Tenant"], HEAVY, 250),
+    "scheduler": (["-c", "import main"], HEAVY, 400),
+    "job": (
+        ["-c", "import programm_avarage_response"],
+        GOOGLE + OPTIONAL_BACKENDS,
+        None,
+    ),
+    "extractor": (["-c", "from src import DatabaseExtractor"], GOOGLE, None),
+    "sheets": (
+        ["-c", "from src import GoogleSheetsHandler"],
+        GOOGLE + ("psycopg2",),
+        None,
+    ),
+}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--budget-factor",
+        type=float,
+        default=1.0,
+        help="Multiplier of the import time budgets.",
+    )
+    return parser.parse_args()
+
+
+def import_times(arguments: list[str]) -> dict:
+    """
+    Start an interpreter with ``-X importtime`` and parse its report.
+
+    Returns:
+        dict: Imported module -> (cumulative microseconds, whether it is a top-level import).
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", *arguments],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if process.returncode:
+        raise RuntimeError(f"{' '.join(arguments)} failed:\n{process.stderr}")
+
+    modules = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # Вложенные импорты сдвинуты на два пробела за уровень
+        modules[name.strip()] = (int(cumulative), not name[1:].startswith(" "))
+    return modules
+
+
+def main():
+    args = parse_args()
+    errors = []
+    for case, (arguments, forbidden, budget) in CASES.items():
+        best = None
+        for _ in range(args.repeat):
+            modules = import_times(arguments)
+            top_level = {
+                name: cumulative
+                for name, (cumulative, is_top) in modules.items()
+                if is_top
+            }
+            total = sum(top_level.values()) / 1000
+            if best is None or total < best[0]:
+                best = (total, modules, max(top_level, key=top_level.get))
+
+        total, modules, heaviest = best
+        found = [module for module in forbidden if module in modules]
+        print(
+            f"{case:>13}: {total:7.1f} ms, {len(modules):4d} modules, "
+            f"heaviest {heaviest} ({modules[heaviest][0] / 1000:.1f} ms)"
+        )
+        if found:
+            errors.append(f"{case}: imports {', '.join(found)}")
+        if budget is not None and total > budget * args.budget_factor:
+            errors.append(
+                f"{case}: {total:.1f} ms exceeds the budget of "
+                f"{budget * args.budget_factor:.0f} ms"
+            )
+
+    if errors:
+        for error in errors:
+            print(f"FAIL {error}", file=sys.stderr)
+        sys.exit(1)
+    print("Import times are within the budgets, no forbidden imports.")
+
+
+if __name__ == "__main__":
+    main()
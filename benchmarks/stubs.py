@@ -0,0 +1,105 @@
+"""
+Offline stand-ins for the database and the Google Sheets API, so the whole pipeline can be
+benchmarked without network access.
+"""
+
+from typing import Any, Iterator
+
+import pandas as pd
+
+from src import DatabaseExtractor, GoogleSheetsHandler
+
+
+class StubDatabaseExtractor(DatabaseExtractor):
+    """
+    A DatabaseExtractor that serves tables from memory instead of querying the database.
+    """
+
+    def __init__(self, tables: dict, **kwargs):
+        """
+        Initialize the stub.
+
+        Args:
+            tables (dict): Table name -> DataFrame, e.g. from ``generate_tables``.
+            **kwargs: Keyword arguments of DatabaseExtractor (``fetch_size``, ``pool_size``, ...).
+        """
+        super().__init__(
+            db_host="stub",
+            db_port=0,
+            db_name="stub",
+            db_user="stub",
+            db_password="stub",
+            **kwargs,
+        )
+        self.tables = tables
+        self.queries = {table_name: table_name for table_name in tables}
+
+    def _fetch_table(self, table_name: str, incremental: bool = False) -> pd.DataFrame:
+        # Копия, как и у нового результата запроса: анализатор может менять таблицы
+        return self.tables[table_name].copy()
+
+    def stream_chat_messages(self) -> Iterator[pd.DataFrame]:
+        messages = self.tables["chat_messages"].sort_values(
+            ["entity_id", "created_at"], kind="stable", ignore_index=True
+        )
+        for start in range(0, len(messages), self.fetch_size):
+            yield messages.iloc[start : start + self.fetch_size].copy()
+
+
+class _StubRequest:
+    def __init__(self, service: "StubSheetsService", method: str, kwargs: dict):
+        self.service = service
+        self.method = method
+        self.kwargs = kwargs
+
+    def execute(self) -> dict:
+        self.service.calls.append(self.method)
+        if self.method == "get":
+            return {"values": self.service.data}
+        if self.method == "clear":
+            self.service.data = []
+        elif self.method == "update":
+            self.service.data = self.kwargs["body"]["values"]
+        elif self.method == "batchUpdate":
+            self.service.cells += sum(
+                len(value_range["values"][0])
+                for value_range in self.kwargs["body"]["data"]
+            )
+        return {}
+
+
+class StubSheetsService:
+    """
+    Minimal in-memory replacement of the ``sheets`` v4 service used by GoogleSheetsHandler.
+    Keeps the written values in ``data`` and records the API calls made and the number of
+    cells sent by ``batchUpdate``.
+    """
+
+    def __init__(self):
+        self.data = []
+        self.calls = []
+        self.cells = 0
+
+    def spreadsheets(self) -> "StubSheetsService":
+        return self
+
+    def values(self) -> "StubSheetsService":
+        return self
+
+    def __getattr__(self, method: str) -> Any:
+        if method in ("get", "clear", "update", "batchUpdate"):
+            return lambda **kwargs: _StubRequest(self, method, kwargs)
+        raise AttributeError(method)
+
+
+class StubGoogleSheetsHandler(GoogleSheetsHandler):
+    """
+    A GoogleSheetsHandler writing to a StubSheetsService.
+    """
+
+    def __init__(self):
+        super().__init__(spreadsheet_id="stub", path_google_key="stub")
+        self.stub_service = StubSheetsService()
+
+    def _get_service(self) -> StubSheetsService:
+        return self.stub_service
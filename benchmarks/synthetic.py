@@ -0,0 +1,164 @@
+"""
+Seeded generator of synthetic chat_messages, managers and rops tables.
+
+Conversations (entities) consist of alternating blocks of incoming and outgoing messages.
+Everything is generated with vectorized NumPy, so 10^8 messages only need enough memory
+for the resulting frames (roughly 4 GB).
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+MESSAGE_TYPES = np.array(
+    ["incoming_chat_message", "outgoing_chat_message"], dtype=object
+)
+
+
+def _off_hours_seconds(
+    rng: np.random.Generator, size: int, work_start: int, work_end: int
+) -> np.ndarray:
+    """
+    Draw local times of day (seconds) uniformly outside [work_start, work_end).
+    """
+    off_length = 86400 - (work_end - work_start)
+    seconds = rng.uniform(0, off_length, size)
+    # Время после конца рабочего дня или до его начала
+    return np.where(
+        seconds < 86400 - work_end, work_end + seconds, seconds - (86400 - work_end)
+    )
+
+
+def generate_tables(
+    messages: int = 100_000,
+    entities: int = None,
+    managers: int = 50,
+    rops: int = 5,
+    mean_block_length: float = 2.0,
+    off_hours_share: float = 0.3,
+    mean_response_minutes: float = 30.0,
+    days: int = 7,
+    work_start: timedelta = timedelta(hours=9),
+    work_end: timedelta = timedelta(hours=18),
+    utc_offset: timedelta = timedelta(hours=3),
+    start: datetime = datetime(2024, 1, 1, tzinfo=timezone.utc),
+    seed: int = 0,
+) -> dict:
+    """
+    Generate the tables read by DatabaseExtractor.
+
+    Args:
+        messages (int): Number of chat messages.
+        entities (int): Number of conversations. Defaults to one per 20 messages.
+        managers (int): Number of managers.
+        rops (int): Number of ROPs.
+        mean_block_length (float): Mean number of messages in a block of one type
+            (geometric distribution).
+        off_hours_share (float): Share of conversations starting outside working hours.
+        mean_response_minutes (float): Mean gap before the first message of a block
+            (exponential distribution). Messages inside a block are about a minute apart.
+        days (int): Number of days the conversations start in.
+        work_start (timedelta): Start of the working day (local time).
+        work_end (timedelta): End of the working day (local time).
+        utc_offset (timedelta): Offset of the local time from UTC.
+        start (datetime): First day of the generated period.
+        seed (int): Seed of the random generator.
+
+    Returns:
+        dict: Table name -> DataFrame for ``chat_messages``, ``managers`` and ``rops``.
+    """
+    rng = np.random.default_rng(seed)
+    entities = entities or max(messages // 20, 1)
+
+    # Длины блоков: генерируем с запасом и обрезаем до нужного числа сообщений
+    block_lengths = rng.geometric(
+        1 / mean_block_length, messages // max(int(mean_block_length), 1) + 16
+    )
+    ends = np.cumsum(block_lengths)
+    while ends[-1] < messages:
+        block_lengths = np.concatenate(
+            [block_lengths, rng.geometric(1 / mean_block_length, len(block_lengths))]
+        )
+        ends = np.cumsum(block_lengths)
+    n_blocks = int(np.searchsorted(ends, messages)) + 1
+    block_lengths = block_lengths[:n_blocks]
+    block_lengths[-1] -= ends[n_blocks - 1] - messages
+
+    # Блоки одной сделки идут подряд, типы внутри сделки чередуются
+    block_entity = np.sort(rng.integers(0, entities, n_blocks))
+    is_first_block = np.ones(n_blocks, dtype=bool)
+    is_first_block[1:] = block_entity[1:] != block_entity[:-1]
+    first_block = np.maximum.accumulate(
+        np.where(is_first_block, np.arange(n_blocks), 0)
+    )
+    starts_outgoing = rng.random(entities) < 0.1
+    block_type = (
+        (np.arange(n_blocks) - first_block) + starts_outgoing[block_entity]
+    ) % 2
+
+    entity = np.repeat(block_entity, block_lengths)
+    type_codes = np.repeat(block_type, block_lengths).astype(np.uint8)
+    is_block_start = np.zeros(messages, dtype=bool)
+    is_block_start[np.cumsum(block_lengths)[:-1]] = True
+    is_block_start[0] = True
+
+    # Начало переписки: день и локальное время, рабочее или нерабочее
+    work_start_s = int(work_start.total_seconds())
+    work_end_s = int(work_end.total_seconds())
+    off_hours = rng.random(entities) < off_hours_share
+    local_seconds = np.where(
+        off_hours,
+        _off_hours_seconds(rng, entities, work_start_s, work_end_s),
+        rng.uniform(work_start_s, work_end_s, entities),
+    )
+    entity_start = (
+        int(start.timestamp())
+        + rng.integers(0, days, entities) * 86400
+        + local_seconds.astype(np.int64)
+        - int(utc_offset.total_seconds())
+    )
+
+    # Интервалы между сообщениями: ожидание ответа перед блоком, около минуты внутри блока
+    gaps = np.where(
+        is_block_start,
+        rng.exponential(mean_response_minutes * 60, messages),
+        rng.exponential(60, messages),
+    ).astype(np.int64)
+    is_first_message = np.ones(messages, dtype=bool)
+    is_first_message[1:] = entity[1:] != entity[:-1]
+    gaps[is_first_message] = 0
+    offsets = np.cumsum(gaps)
+    offsets -= np.maximum.accumulate(np.where(is_first_message, offsets, 0))
+    created_at = entity_start[entity] + offsets
+
+    entity_manager = rng.integers(1, managers + 1, entities)
+    created_by = np.where(type_codes == 1, entity_manager[entity], np.nan)
+
+    chat_messages = pd.DataFrame(
+        {
+            "id": np.arange(1, messages + 1),
+            "entity_id": entity + 1,
+            "type": MESSAGE_TYPES[type_codes],
+            "created_at": created_at,
+            "created_by": created_by,
+        }
+    )
+    # Сообщения приходят из базы в порядке вставки, а не по сделкам
+    chat_messages = chat_messages.iloc[rng.permutation(messages)].reset_index(drop=True)
+
+    df_managers = pd.DataFrame(
+        {
+            "mop_id": np.arange(1, managers + 1),
+            "name_mop": [f"Manager {i}" for i in range(1, managers + 1)],
+            "rop_id": rng.integers(1, rops + 1, managers),
+        }
+    )
+    df_rops = pd.DataFrame(
+        {
+            "rop_id": np.arange(1, rops + 1),
+            "rop_name": [f"ROP {i}" for i in range(1, rops + 1)],
+        }
+    )
+
+    return {"chat_messages": chat_messages, "managers": df_managers, "rops": df_rops}
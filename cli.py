@@ -0,0 +1,248 @@
+"""
+Command line interface of the average response time job.
+
+Commands:
+    extract   Extract the tables from the database and save them as snapshots.
+    analyze   Analyze the saved snapshots and save the result.
+    upload    Upload the saved result to Google Sheets.
+    run       Extract, analyze and upload (the scheduled job), for one or all tenants.
+    backfill  Compute the results of past days or weeks in parallel.
+    bench     Run a script of the benchmarks package.
+
+Only the standard library is imported at start-up; each command imports the modules it
+needs when it runs, so ``--help`` and the commands that do not use the database or the
+Google API do not pay for loading them.
+
+Usage:
+    python cli.py run
+    python cli.py run --tenants settings/tenants/tenants.yaml
+    python cli.py extract && python cli.py analyze && python cli.py upload
+    python cli.py backfill --from 2024-05-01 --to 2024-05-31 --partition week --sheets
+    python cli.py bench check_import_time
+"""
+
+import argparse
+import os
+import runpy
+import sys
+from datetime import date
+
+BENCHMARKS_FOLDER = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "benchmarks"
+)
+# Результат команды analyze, который загружает команда upload
+RESULT_FILE = "average_response_time.arrow"
+
+
+def result_path(tenant, path: str = None) -> str:
+    """
+    Path of the result saved by ``analyze``.
+
+    Args:
+        tenant (Tenant): Tenant of the result.
+        path (str): Path given on the command line.
+
+    Returns:
+        str: The given path or ``average_response_time.arrow`` in the data folder.
+    """
+    return path or os.path.join(tenant.data_folder, RESULT_FILE)
+
+
+def extract(args: argparse.Namespace) -> None:
+    import programm_avarage_response as job
+
+    state = job.WarmState()
+    try:
+        dict_table = state.db_extractor.extract_and_save_data(
+            save_to_csv=True,
+            incremental=True,
+            tables=args.tables,
+            save_snapshot=True,
+        )
+    finally:
+        state.close()
+    if not dict_table:
+        raise RuntimeError("No data was extracted.")
+    for table_name, df in dict_table.items():
+        print(f"{table_name}: {len(df)} rows")
+
+
+def analyze(args: argparse.Namespace) -> None:
+    import programm_avarage_response as job
+    from src import DatabaseExtractor
+    from src.utils import DirectoryValidator, FileHandler
+
+    # Снимки анализируются локально: ни база, ни Google Sheets не нужны
+    state = job.WarmState(database=False, sheets=False)
+    dict_table = DatabaseExtractor.load_snapshot(state.snapshot_folder)
+    result = job.analyze_tables(state, dict_table)
+    path = result_path(state.tenant, args.output)
+    DirectoryValidator.create_directory_if_not_exists(os.path.dirname(path) or ".")
+    FileHandler.save_snapshot(
+        result,
+        path,
+        f"Result saved to {path}",
+        "Error saving the result:",
+    )
+    print(result.to_string(index=False))
+
+
+def upload(args: argparse.Namespace) -> None:
+    # Модуль задания не импортируется: он загружает экстрактор с psycopg2
+    from src import Config, GoogleSheetsHandler, Tenant
+    from src.utils import FileHandler
+
+    tenant = Tenant.from_config(Config())
+    result = FileHandler.read_snapshot(result_path(tenant, args.input))
+    gs_handler = GoogleSheetsHandler(tenant.spreadsheet_id, tenant.google_token)
+    gs_handler.save_data_table(tenant.range_name, result, diff=not args.full)
+
+
+def run(args: argparse.Namespace) -> None:
+    import programm_avarage_response as job
+
+    if not args.tenants:
+        job.main()
+        return
+
+    runner = job.TenantRunner(args.tenants)
+    try:
+        reports = runner.run()
+    finally:
+        runner.close()
+    if not all(report["success"] for report in reports):
+        sys.exit(1)
+
+
+def backfill(args: argparse.Namespace) -> None:
+    import programm_avarage_response as job
+
+    if args.first_day > args.last_day:
+        raise SystemExit("--from must not be after --to.")
+    state = job.WarmState()
+    try:
+        reports = job.run_backfill(
+            state,
+            args.first_day,
+            args.last_day,
+            partition=args.partition,
+            to_sheets=args.sheets,
+            workers=args.workers or job.BACKFILL_WORKERS,
+        )
+    finally:
+        state.close()
+    if not all(report["success"] for report in reports):
+        sys.exit(1)
+
+
+def bench(args: argparse.Namespace) -> None:
+    # Скрипт запускается как python -m benchmarks.<name> со своими аргументами
+    sys.argv = [os.path.join(BENCHMARKS_FOLDER, f"{args.name}.py"), *args.args]
+    runpy.run_module(f"benchmarks.{args.name}", run_name="__main__", alter_sys=True)
+
+
+def benchmark_names() -> list[str]:
+    return sorted(
+        os.path.splitext(file_name)[0]
+        for file_name in os.listdir(BENCHMARKS_FOLDER)
+        if file_name.startswith(("bench_", "check_")) and file_name.endswith(".py")
+    )
+
+
+def parse_args(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    parser_extract = commands.add_parser(
+        "extract", help="Extract the tables and save them as snapshots."
+    )
+    parser_extract.add_argument(
+        "--tables",
+        nargs="+",
+        metavar="TABLE",
+        help="Tables to extract (default: all).",
+    )
+    parser_extract.set_defaults(handler=extract)
+
+    parser_analyze = commands.add_parser(
+        "analyze", help="Analyze the saved snapshots and save the result."
+    )
+    parser_analyze.add_argument(
+        "--output", help=f"Result file (default: data/{RESULT_FILE})."
+    )
+    parser_analyze.set_defaults(handler=analyze)
+
+    parser_upload = commands.add_parser(
+        "upload", help="Upload the saved result to Google Sheets."
+    )
+    parser_upload.add_argument(
+        "--input", help=f"Result file (default: data/{RESULT_FILE})."
+    )
+    parser_upload.add_argument(
+        "--full",
+        action="store_true",
+        help="Rewrite the whole range instead of sending only the changed cells.",
+    )
+    parser_upload.set_defaults(handler=upload)
+
+    parser_run = commands.add_parser(
+        "run", help="Extract, analyze and upload (the scheduled job)."
+    )
+    parser_run.add_argument(
+        "--tenants",
+        metavar="MANIFEST",
+        help="Run for every tenant of a manifest (e.g. settings/tenants/tenants.yaml).",
+    )
+    parser_run.set_defaults(handler=run)
+
+    parser_backfill = commands.add_parser(
+        "backfill", help="Compute the results of past days or weeks in parallel."
+    )
+    parser_backfill.add_argument(
+        "--from",
+        dest="first_day",
+        type=date.fromisoformat,
+        required=True,
+        help="First day (YYYY-MM-DD).",
+    )
+    parser_backfill.add_argument(
+        "--to",
+        dest="last_day",
+        type=date.fromisoformat,
+        required=True,
+        help="Last day, inclusive (YYYY-MM-DD).",
+    )
+    parser_backfill.add_argument(
+        "--partition", choices=("day", "week"), default="day", help="Period length."
+    )
+    parser_backfill.add_argument(
+        "--workers", type=int, help="Worker processes (default: BACKFILL_WORKERS)."
+    )
+    parser_backfill.add_argument(
+        "--sheets",
+        action="store_true",
+        help="Also write every period to its own sheet of the spreadsheet.",
+    )
+    parser_backfill.set_defaults(handler=backfill)
+
+    parser_bench = commands.add_parser(
+        "bench", help="Run a script of the benchmarks package."
+    )
+    parser_bench.add_argument("name", choices=benchmark_names())
+    parser_bench.add_argument(
+        "args", nargs=argparse.REMAINDER, help="Arguments of the script."
+    )
+    parser_bench.set_defaults(handler=bench)
+
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] = None) -> None:
+    args = parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,17 @@
+import argparse
 import os
+from functools import lru_cache, partial
+from typing import TYPE_CHECKING
 
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.cron import CronTrigger
 from loguru import logger
 
+if TYPE_CHECKING:
+    import programm_avarage_response
+
 current_directory = os.getcwd()
-PATH_PROGRAM = os.path.join(current_directory, "programm_avarage_response.py")
+PATH_PROGRAM = os.path.join(current_directory, "cli.py")
 
 
 def run_program():
@@ -13,15 +19,79 @@ def run_program():
         logger.info(
             "Starting the program to calculate the average response time of managers..."
         )
-        os.system(f"python {PATH_PROGRAM}")
+        os.system(f"python {PATH_PROGRAM} run")
+    except Exception as e:
+        logger.error(f"Error occurred while running the program:\n{e}")
+
+
+@lru_cache(maxsize=1)
+def get_warm_state() -> "programm_avarage_response.WarmState":
+    # Создаётся при первом запуске и переиспользуется в следующих.
+    # Если создание упало, lru_cache не сохраняет результат и следующий запуск повторит попытку.
+    # Модуль программы (pandas, psycopg2, ...) загружается только в режиме без подпроцесса
+    import programm_avarage_response
+
+    return programm_avarage_response.WarmState()
+
+
+def run_program_in_process():
+    try:
+        logger.info(
+            "Starting the program to calculate the average response time of managers..."
+        )
+        import programm_avarage_response
+
+        programm_avarage_response.main(get_warm_state())
+    except Exception as e:
+        logger.error(f"Error occurred while running the program:\n{e}")
+
+
+@lru_cache(maxsize=1)
+def get_tenant_runner(
+    manifest_path: str,
+) -> "programm_avarage_response.TenantRunner":
+    # Состояния арендаторов создаются при их первом запуске и переиспользуются
+    import programm_avarage_response
+
+    return programm_avarage_response.TenantRunner(manifest_path)
+
+
+def run_tenants_in_process(manifest_path: str):
+    try:
+        logger.info(
+            "Starting the program to calculate the average response time of managers "
+            "for all tenants..."
+        )
+        get_tenant_runner(manifest_path).run()
     except Exception as e:
         logger.error(f"Error occurred while running the program:\n{e}")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--subprocess",
+        action="store_true",
+        help="Start a new interpreter for every run instead of running in-process.",
+    )
+    parser.add_argument(
+        "--tenants",
+        metavar="MANIFEST",
+        help="Run for every tenant of a manifest (e.g. settings/tenants/tenants.yaml) "
+        "in one process.",
+    )
+    args = parser.parse_args()
+    if args.tenants and args.subprocess:
+        parser.error("--tenants runs in-process and cannot be used with --subprocess.")
+
+    if args.tenants:
+        job = partial(run_tenants_in_process, args.tenants)
+    else:
+        job = run_program if args.subprocess else run_program_in_process
+
     scheduler = BlockingScheduler()
 
-    scheduler.add_job(run_program, CronTrigger(hour="0-23", minute="0", second="0"))
+    scheduler.add_job(job, CronTrigger(hour="0-23", minute="0", second="0"))
     logger.info(
         "Scheduler for running the program every hour has been successfully initialized."
     )
@@ -30,3 +100,8 @@ if __name__ == "__main__":
         scheduler.start()
     except Exception as e:
         logger.error(f"An error occurred while starting the scheduler:\n{e}")
+    finally:
+        if get_warm_state.cache_info().currsize:
+            get_warm_state().close()
+        if get_tenant_runner.cache_info().currsize:
+            get_tenant_runner(args.tenants).close()
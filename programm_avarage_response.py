@@ -1,78 +1,626 @@
-import warnings
-from datetime import timedelta
+import asyncio
+import functools
+import hashlib
+import os
+import time
+from datetime import date
 
+import pandas as pd
 from loguru import logger
 
 from src import Config
 from src import ChatResponseAnalyzer
+from src import DailyStatsStore
 from src import DatabaseExtractor
 from src import GoogleSheetsHandler
+from src import MetricsRecorder
+from src import QueryBuilder
+from src import TeamCalendars
+from src import Tenant
+from src.utils import DirectoryValidator, FileHandler
 
+# === Load Configuration ===
+# Working hours, days off and UTC offsets are set in settings/calendar/calendar.yaml
+# Overlap window (seconds) re-fetched on every incremental run for late arrivals
+INCREMENTAL_OVERLAP = 6 * 60 * 60
+# Stream chat messages through a server-side cursor instead of loading the table
+STREAMING = False
+STREAM_FETCH_SIZE = 50_000
+# Stream, analyze and upload concurrently (streams chat messages like STREAMING)
+ASYNC_PIPELINE = False
+# Fetched chunks waiting for the analysis in the async pipeline
+PIPELINE_QUEUE_SIZE = 4
+# How tables are loaded: "read_sql" or "copy" (COPY ... TO STDOUT)
+EXTRACTION_BACKEND = "read_sql"
+# Keep chat messages in the compact layout (categorical type, int32 ids) from extraction on
+COMPACT_DTYPES = True
+# Analyze the last saved snapshot instead of querying the database
+FROM_SNAPSHOT = False
+# Number of processes for the sharded analysis (1 runs it in the current process)
+ANALYSIS_WORKERS = 1
+# How the analysis runs in the current process: "pandas" or "arrow" (Arrow compute)
+ANALYSIS_BACKEND = "pandas"
+# Send only the changed cells to Google Sheets (full rewrite when the table shape changes)
+SHEETS_DIFF_WRITES = True
+# Trace allocations of every stage with tracemalloc (slows the analysis down)
+TRACE_MEMORY = False
+# JSON run records kept in data/metrics/runs (older ones are deleted); 720 hourly runs
+# are 30 days, None keeps all
+RUN_RECORDS_KEPT = 720
+# Save per-(manager, day) response time statistics to a local SQLite store
+DAILY_STATS = True
+# Percentiles of the response time added to the uploaded table (the sheet range in
+# google_sheets_info.yaml must have a column for each)
+PERCENTILES = (0.5, 0.9, 0.99)
+# Compute response times inside PostgreSQL; only per-manager aggregates are transferred
+IN_DATABASE_ANALYSIS = False
+# Skip extraction, analysis and upload when chat messages, managers and rops (and the
+# settings below) have not changed since the last successful run
+SKIP_UNCHANGED = True
 
-def main():
-    logger.info("START SCRIPT")
+# === Backfill (python cli.py backfill --from 2024-05-01 --to 2024-05-31) ===
+# Worker processes extracting and analyzing past periods, each with its own connection
+BACKFILL_WORKERS = 4
 
-    # === Load Configuration ===
-    WORK_START = timedelta(hours=9, minutes=30, seconds=0)
-    WORK_END = timedelta(hours=23, minutes=59, seconds=59, microseconds=59)
-    UTC_OFFSET = timedelta(hours=3)
+# === Multi-Tenant Runner (python main.py --tenants settings/tenants/tenants.yaml) ===
+# Tenants extracting from their databases at the same time
+TENANT_EXTRACTIONS = 4
+# Tenants analyzed at the same time (the analysis is CPU-bound)
+TENANT_ANALYSES = 1
+# Tenants uploading to Google Sheets at the same time
+TENANT_UPLOADS = 4
 
-    config = Config()
 
-    DB_HOST = config.bd_info().get("HOST")
-    DB_PORT = config.bd_info().get("PORT")
-    DB_NAME = config.bd_info().get("NAME")
-    DB_USER = config.bd_info().get("USER")
-    DB_PASSWORD = config.bd_info().get("PASSWORD")
+class WarmState:
+    """
+    Objects that are expensive to create and are reused between scheduled runs:
+    the configuration, the working calendar, the analyzer, the database extractor
+    (with its open connection) and the Google Sheets handler (with its credentials
+    and service object).
+    """
 
-    PATH_GOOGLE_TOKEN = config.get_paths().get("google_token")
-    SPREADSHEET_ID = config.get_google_sheets_info().get("SPREADSHEET_ID")
-    RANGE_NAME = config.get_google_sheets_info().get("RANGE_NAME")
+    def __init__(
+        self,
+        tenant: Tenant = None,
+        credentials_cache: dict = None,
+        database: bool = True,
+        sheets: bool = True,
+    ):
+        """
+        Create the objects of a tenant.
 
-    # === Suppress Warnings ===
-    warnings.filterwarnings(
-        "ignore",
-        category=UserWarning,
-        message="pandas only supports SQLAlchemy connectable",
-    )
+        Args:
+            tenant (Tenant): Tenant to run for. Default is the single tenant configured in
+                ``settings``.
+            credentials_cache (dict): Google credentials shared with the states of other
+                tenants. Default is None (own credentials).
+            database (bool): If False, no database extractor is created (``db_extractor``
+                is None) and the analysis runs locally even with IN_DATABASE_ANALYSIS,
+                e.g. to analyze saved snapshots.
+            sheets (bool): If False, no Google Sheets handler is created (``gs_handler``
+                is None).
+        """
+        if tenant is None:
+            self.config = Config()
+            tenant = Tenant.from_config(self.config)
+        self.tenant = tenant
 
-    # === Extract Data from Database ===
-    db_extractor = DatabaseExtractor(
-        db_host=DB_HOST,
-        db_port=DB_PORT,
-        db_name=DB_NAME,
-        db_user=DB_USER,
-        db_password=DB_PASSWORD,
-    )
+        DB_HOST = tenant.db_info.get("HOST")
+        DB_PORT = tenant.db_info.get("PORT")
+        DB_NAME = tenant.db_info.get("NAME")
+        DB_USER = tenant.db_info.get("USER")
+        DB_PASSWORD = tenant.db_info.get("PASSWORD")
+
+        PATH_GOOGLE_TOKEN = tenant.google_token
+        SPREADSHEET_ID = tenant.spreadsheet_id
+        self.range_name = tenant.range_name
+
+        CACHE_FOLDER = os.path.join(tenant.data_folder, "cache")
+        self.snapshot_folder = os.path.join(tenant.data_folder, "snapshots")
+        self.metrics_folder = os.path.join(tenant.data_folder, "metrics")
+        DAILY_STATS_PATH = os.path.join(
+            tenant.data_folder, "stats", "daily_stats.sqlite3"
+        )
+
+        # === Load Working Calendar ===
+        self.calendar = TeamCalendars.from_yaml(tenant.calendar)
+
+        # Настройки, от которых зависит результат, входят в отпечаток входных данных
+        with open(tenant.calendar, "rb") as file:
+            calendar_checksum = hashlib.md5(file.read()).hexdigest()
+        self.settings_fingerprint = {
+            "calendar": calendar_checksum,
+            "percentiles": list(PERCENTILES),
+            "daily_stats": DAILY_STATS,
+            "spreadsheet_id": SPREADSHEET_ID,
+            "range_name": self.range_name,
+        }
+
+        # === Configure Metrics ===
+        self.metrics = MetricsRecorder(trace_memory=TRACE_MEMORY)
+
+        # === Configure Daily Statistics Store ===
+        self.daily_store = (
+            DailyStatsStore(
+                DAILY_STATS_PATH, utc_offset=self.calendar.default.utc_offset
+            )
+            if DAILY_STATS
+            else None
+        )
+
+        # === Configure Analyzer ===
+        # Optional backends are imported only when they are configured
+        if ANALYSIS_WORKERS > 1:
+            from src import ParallelChatResponseAnalyzer
+
+            self.analyzer = ParallelChatResponseAnalyzer(
+                calendar=self.calendar,
+                workers=ANALYSIS_WORKERS,
+                metrics=self.metrics,
+                daily_store=self.daily_store,
+                percentiles=PERCENTILES,
+            )
+        elif ANALYSIS_BACKEND == "arrow":
+            from src import ArrowChatResponseAnalyzer
+
+            self.analyzer = ArrowChatResponseAnalyzer(
+                calendar=self.calendar,
+                metrics=self.metrics,
+                daily_store=self.daily_store,
+                percentiles=PERCENTILES,
+            )
+        else:
+            self.analyzer = ChatResponseAnalyzer(
+                calendar=self.calendar,
+                metrics=self.metrics,
+                daily_store=self.daily_store,
+                percentiles=PERCENTILES,
+            )
+
+        # === Configure Database Extractor ===
+        self.db_extractor = None
+        if database:
+            self.db_extractor = DatabaseExtractor(
+                db_host=DB_HOST,
+                db_port=DB_PORT,
+                db_name=DB_NAME,
+                db_user=DB_USER,
+                db_password=DB_PASSWORD,
+                cache_folder=CACHE_FOLDER,
+                overlap=INCREMENTAL_OVERLAP,
+                fetch_size=STREAM_FETCH_SIZE,
+                query_builder=QueryBuilder.from_analyzer(
+                    self.analyzer, schema=tenant.schema
+                ),
+                backend=EXTRACTION_BACKEND,
+                snapshot_folder=self.snapshot_folder,
+                keep_alive=True,
+                metrics=self.metrics,
+                compact_dtypes=COMPACT_DTYPES,
+            )
+
+        # === Configure In-Database Analysis ===
+        if IN_DATABASE_ANALYSIS and database:
+            from src import SqlChatResponseAnalyzer
+
+            self.analyzer = SqlChatResponseAnalyzer(
+                calendar=self.calendar,
+                db_extractor=self.db_extractor,
+                metrics=self.metrics,
+                daily_store=self.daily_store,
+                percentiles=PERCENTILES,
+            )
+
+        # === Configure Google Sheets Handler ===
+        self.gs_handler = None
+        if sheets:
+            self.gs_handler = GoogleSheetsHandler(
+                SPREADSHEET_ID,
+                PATH_GOOGLE_TOKEN,
+                metrics=self.metrics,
+                credentials_cache=credentials_cache,
+            )
+
+    def export_metrics(self) -> None:
+        """
+        Write the metrics of the last run for the Prometheus textfile collector and as a
+        JSON run record. Errors are logged and do not fail the run.
+        """
+        try:
+            self.metrics.write_prometheus(
+                os.path.join(self.metrics_folder, "average_response.prom")
+            )
+            self.metrics.write_run_record(
+                os.path.join(self.metrics_folder, "runs"), keep=RUN_RECORDS_KEPT
+            )
+        except Exception as e:
+            logger.error(f"Metrics were not exported: {e}")
 
-    dict_table = db_extractor.extract_and_save_data(save_to_csv=True)
+    def close(self) -> None:
+        if self.db_extractor is not None:
+            self.db_extractor.close()
+
+
+def fingerprint_inputs(state: WarmState) -> tuple[dict, bool]:
+    """
+    Compare a fingerprint of the inputs with the one of the last successful run.
+
+    Args:
+        state (WarmState): Objects of the tenant.
+
+    Returns:
+        tuple[dict, bool]: The fingerprint (None when the check is off or failed) and
+        whether the inputs are unchanged since the last successful run.
+    """
+    if not SKIP_UNCHANGED or FROM_SNAPSHOT:
+        return None, False
+    try:
+        fingerprint = state.db_extractor.input_fingerprint(
+            extra=state.settings_fingerprint
+        )
+        unchanged = state.db_extractor.inputs_unchanged(fingerprint)
+    except Exception as e:
+        logger.warning(f"Input fingerprint failed, the run is not skipped: {e}")
+        return None, False
+    if unchanged:
+        logger.info("Inputs have not changed since the last successful run.")
+        state.metrics.increment("runs_skipped_unchanged")
+    return fingerprint, unchanged
+
+
+def save_fingerprint(state: WarmState, fingerprint: dict) -> None:
+    """
+    Remember the fingerprint of the inputs of a successful run. It was taken before the
+    extraction, so rows added during the run make the next run differ and be processed.
+    Errors are logged and do not fail the run.
+
+    Args:
+        state (WarmState): Objects of the tenant.
+        fingerprint (dict): Fingerprint from ``fingerprint_inputs``.
+    """
+    if fingerprint is None:
+        return
+    try:
+        state.db_extractor.save_fingerprint(fingerprint)
+    except Exception as e:
+        logger.error(f"Input fingerprint was not saved: {e}")
+
+
+def extract_tables(state: WarmState) -> dict:
+    """
+    Extract the tables of the batch mode: all tables, or only managers and rops when
+    chat messages are analyzed in the database.
+
+    Args:
+        state (WarmState): Objects of the tenant.
+
+    Returns:
+        dict: Table name -> DataFrame.
+    """
+    if IN_DATABASE_ANALYSIS:
+        return state.db_extractor.extract_and_save_data(tables=["managers", "rops"])
+
+    if FROM_SNAPSHOT:
+        dict_table = DatabaseExtractor.load_snapshot(state.snapshot_folder)
+    else:
+        dict_table = state.db_extractor.extract_and_save_data(
+            save_to_csv=True, incremental=True, save_snapshot=True
+        )
 
     if dict_table:
         logger.info("Data extraction completed successfully.")
     else:
         logger.error("No data was extracted.")
+    return dict_table
 
-    df_chat_messages = dict_table["chat_messages"]
-    df_managers = dict_table["managers"]
-    df_rops = dict_table["rops"]
 
-    # === Analyze Chat Messages ===
-    analyzer = ChatResponseAnalyzer(
-        work_start=WORK_START,
-        work_end=WORK_END,
-        utc_offset=UTC_OFFSET,
-    )
+def analyze_tables(state: WarmState, dict_table: dict) -> pd.DataFrame:
+    """
+    Calculate the average response time of managers from the extracted tables.
+
+    Args:
+        state (WarmState): Objects of the tenant.
+        dict_table (dict): Tables from ``extract_tables``.
 
-    average_response_time_pandas = analyzer.analyze_result(
-        df_chat_messages, df_managers, df_rops
+    Returns:
+        pd.DataFrame: Dataframe with average response time per manager.
+    """
+    if IN_DATABASE_ANALYSIS and state.db_extractor is not None:
+        return state.analyzer.analyze_in_database(
+            dict_table["managers"], dict_table["rops"]
+        )
+    return state.analyzer.analyze_result(
+        dict_table["chat_messages"], dict_table["managers"], dict_table["rops"]
     )
 
-    # === Save Data to Google Sheets ===
-    gs_handler = GoogleSheetsHandler(SPREADSHEET_ID, PATH_GOOGLE_TOKEN)
-    gs_handler.save_data_table(RANGE_NAME, average_response_time_pandas)
+
+def main(state: WarmState = None):
+    """
+    Calculate the average response time of managers and upload it to Google Sheets.
+
+    Args:
+        state (WarmState): Objects reused between runs. If None, they are created for this
+            run only and released at the end.
+    """
+    logger.info("START SCRIPT")
+
+    own_state = state is None
+    if own_state:
+        state = WarmState()
+
+    state.metrics.start_run()
+    success = False
+    try:
+        analyzer = state.analyzer
+        db_extractor = state.db_extractor
+
+        # === Skip the Run When the Inputs Have Not Changed ===
+        fingerprint, unchanged = fingerprint_inputs(state)
+        if unchanged:
+            logger.info("Extraction, analysis and upload are skipped.")
+
+        # === Extract, Analyze and Save Concurrently ===
+        elif ASYNC_PIPELINE and not IN_DATABASE_ANALYSIS:
+            from src import AsyncPipeline
+
+            pipeline = AsyncPipeline(
+                analyzer,
+                db_extractor,
+                state.gs_handler,
+                state.range_name,
+                queue_size=PIPELINE_QUEUE_SIZE,
+                diff=SHEETS_DIFF_WRITES,
+            )
+            asyncio.run(pipeline.run())
+
+        # === Extract and Analyze Chat Messages in Chunks ===
+        elif STREAMING and not IN_DATABASE_ANALYSIS:
+            dict_table = db_extractor.extract_and_save_data(tables=["managers", "rops"])
+            average_response_time_pandas = analyzer.analyze_chunks(
+                db_extractor.stream_chat_messages(),
+                dict_table["managers"],
+                dict_table["rops"],
+            )
+
+        # === Extract and Analyze Chat Messages (or Analyze Them in the Database) ===
+        else:
+            dict_table = extract_tables(state)
+            average_response_time_pandas = analyze_tables(state, dict_table)
+
+        # === Save Data to Google Sheets ===
+        if not unchanged and (IN_DATABASE_ANALYSIS or not ASYNC_PIPELINE):
+            state.gs_handler.save_data_table(
+                state.range_name, average_response_time_pandas, diff=SHEETS_DIFF_WRITES
+            )
+        save_fingerprint(state, fingerprint)
+        success = True
+    finally:
+        state.metrics.finish_run(success)
+        state.export_metrics()
+        if own_state:
+            state.close()
 
     logger.info("END SCRIPT")
 
 
+def run_backfill(
+    state: WarmState,
+    first_day: date,
+    last_day: date,
+    partition: str = "day",
+    to_sheets: bool = False,
+    workers: int = BACKFILL_WORKERS,
+) -> list[dict]:
+    """
+    Compute the results of past periods (see ``BackfillRunner``) and save them to
+    ``<data folder>/backfill/<partition>``, the daily statistics store and, optionally,
+    one sheet per period.
+
+    Args:
+        state (WarmState): Objects of the tenant.
+        first_day (date): First day of the range.
+        last_day (date): Last day of the range (inclusive).
+        partition (str): ``"day"`` or ``"week"``.
+        to_sheets (bool): Whether to write every period to its own sheet.
+        workers (int): Number of worker processes.
+
+    Returns:
+        list[dict]: Reports of the periods in chronological order.
+    """
+    from src import BackfillRunner
+
+    output_folder = os.path.join(state.tenant.data_folder, "backfill", partition)
+    runner = BackfillRunner(
+        state.analyzer,
+        state.db_extractor,
+        output_folder,
+        workers=workers,
+        gs_handler=state.gs_handler if to_sheets else None,
+        range_name=state.range_name,
+    )
+    dict_table = state.db_extractor.extract_and_save_data(tables=["managers", "rops"])
+    # Соединения родителя не должны унаследовать процессы пула
+    state.db_extractor.close()
+    reports = runner.run(
+        first_day, last_day, dict_table["managers"], dict_table["rops"], partition
+    )
+
+    logger.info("Backfill summary:\n" + pd.DataFrame(reports).to_string(index=False))
+    try:
+        FileHandler.save_json(
+            reports,
+            os.path.join(output_folder, "last_run.json"),
+            "Backfill summary saved.",
+            "Error saving the backfill summary:",
+        )
+    except Exception as e:
+        logger.error(f"Backfill summary was not saved: {e}")
+    return reports
+
+
+class TenantRunner:
+    """
+    Runs the job for all tenants of a manifest in one process.
+
+    Every tenant has its own WarmState (database pool, analyzer, daily store and metrics
+    in its data folder), created on its first run and reused by the next ones; tenants
+    with the same Google key file share the credentials. The stages of different tenants
+    overlap, and the number of tenants extracting, analyzing and uploading at the same
+    time is bounded separately. Tenants run in the batch mode (``extract_tables``,
+    ``analyze_tables``, upload); a failed tenant does not stop the others.
+    """
+
+    def __init__(
+        self,
+        manifest_path: str,
+        extractions: int = TENANT_EXTRACTIONS,
+        analyses: int = TENANT_ANALYSES,
+        uploads: int = TENANT_UPLOADS,
+    ):
+        """
+        Load the manifest.
+
+        Args:
+            manifest_path (str): Path to the tenant manifest YAML file.
+            extractions (int): Maximum number of tenants extracting at the same time.
+            analyses (int): Maximum number of tenants analyzing at the same time.
+            uploads (int): Maximum number of tenants uploading at the same time.
+        """
+        self.tenants = Tenant.load_manifest(manifest_path)
+        self.limits = {"extract": extractions, "analyze": analyses, "upload": uploads}
+        self.summary_path = os.path.join(
+            os.getcwd(), "data", "tenants", "last_run.json"
+        )
+        self.states = {}
+        self._credentials_cache = {}
+
+    async def _stage(
+        self, semaphore: asyncio.Semaphore, report: dict, name: str, function, *args
+    ):
+        # Стадия выполняется в потоке, когда освобождается место в её лимите
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                return await asyncio.to_thread(function, *args)
+            finally:
+                report[f"{name}_seconds"] = round(time.perf_counter() - start, 3)
+
+    async def _run_tenant(self, tenant: Tenant, semaphores: dict) -> dict:
+        """
+        Extract, analyze and upload the data of one tenant.
+
+        Args:
+            tenant (Tenant): The tenant.
+            semaphores (dict): Stage name -> semaphore bounding its concurrency.
+
+        Returns:
+            dict: Success, total and per-stage seconds, number of managers and the error.
+        """
+        report = {"tenant": tenant.name, "success": False}
+        start = time.perf_counter()
+        try:
+            state = self.states.get(tenant.name)
+            if state is None:
+                state = await asyncio.to_thread(
+                    WarmState, tenant, self._credentials_cache
+                )
+                self.states[tenant.name] = state
+
+            state.metrics.start_run()
+            try:
+                fingerprint, unchanged = await self._stage(
+                    semaphores["extract"],
+                    report,
+                    "fingerprint",
+                    fingerprint_inputs,
+                    state,
+                )
+                report["skipped"] = unchanged
+                if not unchanged:
+                    dict_table = await self._stage(
+                        semaphores["extract"], report, "extract", extract_tables, state
+                    )
+                    result = await self._stage(
+                        semaphores["analyze"],
+                        report,
+                        "analyze",
+                        analyze_tables,
+                        state,
+                        dict_table,
+                    )
+                    del dict_table
+                    await self._stage(
+                        semaphores["upload"],
+                        report,
+                        "upload",
+                        functools.partial(
+                            state.gs_handler.save_data_table, diff=SHEETS_DIFF_WRITES
+                        ),
+                        state.range_name,
+                        result,
+                    )
+                    save_fingerprint(state, fingerprint)
+                    report["managers"] = len(result)
+                report["success"] = True
+            finally:
+                state.metrics.finish_run(report["success"])
+                state.export_metrics()
+        except Exception as e:
+            report["error"] = f"{type(e).__name__}: {e}"
+            logger.error(f"Tenant {tenant.name} failed: {e}")
+        report["seconds"] = round(time.perf_counter() - start, 3)
+        return report
+
+    async def run_async(self) -> list[dict]:
+        """
+        Run all tenants concurrently within the stage limits.
+
+        Returns:
+            list[dict]: Reports of the tenants in the order of the manifest.
+        """
+        semaphores = {
+            stage: asyncio.Semaphore(limit) for stage, limit in self.limits.items()
+        }
+        return await asyncio.gather(
+            *(self._run_tenant(tenant, semaphores) for tenant in self.tenants)
+        )
+
+    def run(self) -> list[dict]:
+        """
+        Run all tenants, log the per-tenant summary and save it as JSON.
+
+        Returns:
+            list[dict]: Reports of the tenants in the order of the manifest.
+        """
+        logger.info(f"START MULTI-TENANT RUN: {len(self.tenants)} tenants")
+        start = time.perf_counter()
+        reports = asyncio.run(self.run_async())
+
+        failed = [report["tenant"] for report in reports if not report["success"]]
+        logger.info("Tenant summary:\n" + pd.DataFrame(reports).to_string(index=False))
+        logger.info(
+            f"END MULTI-TENANT RUN: {len(reports) - len(failed)} of {len(reports)} "
+            f"tenants succeeded in {time.perf_counter() - start:.1f} s"
+            + (f", failed: {', '.join(failed)}" if failed else "")
+        )
+        try:
+            DirectoryValidator.create_directory_if_not_exists(
+                os.path.dirname(self.summary_path)
+            )
+            FileHandler.save_json(
+                reports,
+                self.summary_path,
+                "Tenant summary saved.",
+                "Error saving the tenant summary:",
+            )
+        except Exception as e:
+            logger.error(f"Tenant summary was not saved: {e}")
+        return reports
+
+    def close(self) -> None:
+        for state in self.states.values():
+            state.close()
+
+
 if __name__ == "__main__":
     main()
@@ -1,11 +1,74 @@
-from .config import Config
-from .data_processing import ChatResponseAnalyzer
-from .get_data_db import DatabaseExtractor
-from .save_data_google_sheets import GoogleSheetsHandler
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+# Классы загружаются при первом обращении (PEP 562): импорт пакета не тянет pandas,
+# psycopg2 и клиенты Google API, каждая точка входа загружает только нужные модули
+_EXPORTS = {
+    "ArrowChatResponseAnalyzer": ".arrow_analysis",
+    "AsyncPipeline": ".pipeline",
+    "BackfillRunner": ".backfill",
+    "Config": ".config",
+    "ChatResponseAnalyzer": ".data_processing",
+    "DailyStatsStore": ".daily_stats",
+    "DatabaseExtractor": ".get_data_db",
+    "GoogleSheetsHandler": ".save_data_google_sheets",
+    "MetricsRecorder": ".metrics",
+    "ParallelChatResponseAnalyzer": ".parallel_analysis",
+    "QuantileSketch": ".quantile_sketch",
+    "QueryBuilder": ".query_builder",
+    "SqlChatResponseAnalyzer": ".sql_analysis",
+    "TeamCalendars": ".working_calendar",
+    "Tenant": ".tenants",
+    "WorkingCalendar": ".working_calendar",
+}
+
+if TYPE_CHECKING:
+    from .arrow_analysis import ArrowChatResponseAnalyzer
+    from .backfill import BackfillRunner
+    from .config import Config
+    from .daily_stats import DailyStatsStore
+    from .data_processing import ChatResponseAnalyzer
+    from .get_data_db import DatabaseExtractor
+    from .metrics import MetricsRecorder
+    from .parallel_analysis import ParallelChatResponseAnalyzer
+    from .pipeline import AsyncPipeline
+    from .quantile_sketch import QuantileSketch
+    from .query_builder import QueryBuilder
+    from .save_data_google_sheets import GoogleSheetsHandler
+    from .sql_analysis import SqlChatResponseAnalyzer
+    from .tenants import Tenant
+    from .working_calendar import TeamCalendars, WorkingCalendar
+
+
+def __getattr__(name: str):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module_name, __name__), name)
+    # Следующие обращения не проходят через __getattr__
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted([*globals(), *_EXPORTS])
+
 
 __all__ = [
+    "ArrowChatResponseAnalyzer",
+    "AsyncPipeline",
+    "BackfillRunner",
     "Config",
     "ChatResponseAnalyzer",
+    "DailyStatsStore",
     "DatabaseExtractor",
     "GoogleSheetsHandler",
+    "MetricsRecorder",
+    "ParallelChatResponseAnalyzer",
+    "QuantileSketch",
+    "QueryBuilder",
+    "SqlChatResponseAnalyzer",
+    "TeamCalendars",
+    "Tenant",
+    "WorkingCalendar",
 ]
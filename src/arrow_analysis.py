@@ -0,0 +1,260 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from loguru import logger
+
+from .data_processing import INCOMING_CODE, OUTGOING_CODE, ChatResponseAnalyzer
+
+
+def _differs_from_previous(array: pa.Array) -> pa.Array:
+    """
+    Mask of the values differing from the previous value; the first value is True.
+    """
+    return pa.concat_arrays(
+        [
+            pa.array([True]),
+            pc.not_equal(array.slice(1), array.slice(0, len(array) - 1)),
+        ]
+    )
+
+
+class ArrowChatResponseAnalyzer(ChatResponseAnalyzer):
+    """
+    A ChatResponseAnalyzer that runs ``analyze_result`` on Arrow tables.
+
+    Messages are converted once to an Arrow table of the compact layout; filtering,
+    sorting, block detection and the per-manager (and per-day and sketch) aggregations
+    use Arrow compute kernels and the multi-threaded Arrow group-by instead of pandas.
+    Pairing and the working-hours adjustment are the NumPy code of ChatResponseAnalyzer,
+    so the result is the same table as with the pandas backend. ``analyze_chunks`` (the
+    streaming mode) uses the pandas stages.
+    """
+
+    def __init__(self, *args, use_threads: bool = True, **kwargs):
+        """
+        Initialize the analyzer.
+
+        Args:
+            *args: Positional arguments of ChatResponseAnalyzer.
+            use_threads (bool): Whether Arrow may use its thread pool.
+            **kwargs: Keyword arguments of ChatResponseAnalyzer.
+        """
+        super().__init__(*args, **kwargs)
+        self.use_threads = use_threads
+
+    def _preprocess_arrow(self, df_chat_messages: pd.DataFrame) -> pa.Table:
+        """
+        Convert chat messages to an Arrow table sorted by ``entity_id`` and ``created_at``.
+
+        Args:
+            df_chat_messages (pd.DataFrame): Dataframe containing chat messages.
+
+        Returns:
+            pa.Table: ``entity_id``, ``type`` (codes of ``MESSAGE_TYPES``), ``created_at``
+            and ``created_by`` of the chat messages of the analyzed types.
+        """
+        with self.metrics.stage(
+            "analyze.preprocess_messages", rows_in=len(df_chat_messages)
+        ) as record:
+            df_chat_messages = self.compact_messages(
+                df_chat_messages[self.REQUIRED_COLUMNS["chat_messages"]]
+            )
+            table = pa.table(
+                {
+                    "entity_id": pa.array(df_chat_messages["entity_id"]),
+                    # Коды категорий: -1 у прочих типов сообщений
+                    "type": pa.array(df_chat_messages["type"].cat.codes.to_numpy()),
+                    "created_at": pa.array(df_chat_messages["created_at"]),
+                    "created_by": pa.array(df_chat_messages["created_by"]),
+                }
+            )
+            table = table.filter(pc.greater_equal(table["type"], 0))
+            # Сортировка Arrow устойчива, как и сортировка pandas по нескольким столбцам
+            table = table.sort_by(
+                [("entity_id", "ascending"), ("created_at", "ascending")]
+            ).combine_chunks()
+            record["rows_out"] = table.num_rows
+        return table
+
+    def _filter_arrow(self, table: pa.Table) -> pa.Table:
+        """
+        Filter first messages in each conversation block (see ``_filter_messages``).
+
+        Args:
+            table (pa.Table): Messages from ``_preprocess_arrow``.
+
+        Returns:
+            pa.Table: First messages of the blocks.
+        """
+        with self.metrics.stage(
+            "analyze.filter_messages", rows_in=table.num_rows
+        ) as record:
+            if table.num_rows:
+                # Изменился тип сообщения или идентификатор сделки
+                table = table.filter(
+                    pc.or_(
+                        _differs_from_previous(table["type"].chunk(0)),
+                        _differs_from_previous(table["entity_id"].chunk(0)),
+                    )
+                )
+            record["rows_out"] = table.num_rows
+        return table
+
+    def _calculate_response_times_arrow(self, blocks: pa.Table) -> pa.Table:
+        """
+        Calculate response times for outgoing messages (see ``_calculate_response_times``).
+
+        Args:
+            blocks (pa.Table): First messages of the blocks.
+
+        Returns:
+            pa.Table: ``manager_id``, ``created_at`` (epoch seconds), ``response_time``
+            (minutes) and ``response_time_us`` of the replies of known managers.
+        """
+        with self.metrics.stage(
+            "analyze.calculate_response_times", rows_in=blocks.num_rows
+        ) as record:
+            type_codes = blocks["type"].to_numpy()
+            created_at = blocks["created_at"].to_numpy()
+            manager_ids = blocks["created_by"]
+
+            curr_idx, adjusted_response_time = self._pair_responses(
+                blocks["entity_id"].to_numpy(),
+                type_codes == INCOMING_CODE,
+                type_codes == OUTGOING_CODE,
+                created_at * 10**9,
+                manager_ids.to_numpy(),
+            )
+            responses = pa.table(
+                {
+                    "manager_id": manager_ids.take(curr_idx),
+                    "created_at": created_at[curr_idx],
+                    **self._response_time_columns(adjusted_response_time),
+                }
+            )
+            # Ответы без менеджера не учитываются, как при группировке в pandas
+            responses = responses.filter(pc.is_valid(responses["manager_id"]))
+            record["rows_out"] = responses.num_rows
+        return responses
+
+    def _aggregate(
+        self, table: pa.Table, keys: list[str], aggregations: dict
+    ) -> pd.DataFrame:
+        """
+        Group an Arrow table and return the aggregates as a dataframe.
+
+        Args:
+            table (pa.Table): Table to group.
+            keys (list[str]): Grouping columns.
+            aggregations (dict): Result column -> (input column, Arrow aggregate function).
+
+        Returns:
+            pd.DataFrame: The key columns and the result columns.
+        """
+        result = table.group_by(keys, use_threads=self.use_threads).aggregate(
+            list(aggregations.values())
+        )
+        return result.rename_columns(
+            {
+                f"{column}_{function}": name
+                for name, (column, function) in aggregations.items()
+            }
+        ).to_pandas()[[*keys, *aggregations]]
+
+    def _summarize_arrow(self, responses: pa.Table) -> dict:
+        """
+        Reduce response times to mergeable partial aggregates (see ``_summarize_responses``).
+
+        Args:
+            responses (pa.Table): Response times from ``_calculate_response_times_arrow``.
+
+        Returns:
+            dict: Partial aggregates with the same frames as ``_summarize_responses``.
+        """
+        with self.metrics.stage(
+            "analyze.summarize_response_times", rows_in=responses.num_rows
+        ):
+            partials = {
+                "summary": self._aggregate(
+                    responses,
+                    ["manager_id"],
+                    {
+                        "response_time_sum_us": ("response_time_us", "sum"),
+                        "response_count": ("response_time", "count"),
+                    },
+                )
+            }
+
+        response_time = responses["response_time"].to_numpy()
+        if self.daily_store is not None:
+            with self.metrics.stage(
+                "analyze.summarize_daily_response_times", rows_in=responses.num_rows
+            ):
+                responses = responses.append_column(
+                    "day",
+                    pa.array(
+                        self.daily_store.day_numbers(responses["created_at"].to_numpy())
+                    ),
+                ).append_column(
+                    "response_time_sq", pa.array(response_time * response_time)
+                )
+                partials["daily"] = self._aggregate(
+                    responses,
+                    ["manager_id", "day"],
+                    {
+                        "response_count": ("response_time", "count"),
+                        "response_time_sum_us": ("response_time_us", "sum"),
+                        "response_time_sum_sq": ("response_time_sq", "sum"),
+                        "response_time_min": ("response_time", "min"),
+                        "response_time_max": ("response_time", "max"),
+                    },
+                )
+
+        if self.percentiles:
+            with self.metrics.stage(
+                "analyze.summarize_sketches", rows_in=responses.num_rows
+            ):
+                responses = responses.append_column(
+                    "bucket", pa.array(self.sketch.buckets(response_time))
+                )
+                partials["sketch"] = self._aggregate(
+                    responses, ["manager_id", "bucket"], {"count": ("bucket", "count")}
+                )
+                if self.daily_store is not None:
+                    partials["daily_sketch"] = self._aggregate(
+                        responses,
+                        ["manager_id", "day", "bucket"],
+                        {"count": ("bucket", "count")},
+                    )
+
+        return partials
+
+    def analyze_result(
+        self,
+        df_chat_messages: pd.DataFrame,
+        df_managers: pd.DataFrame,
+        df_rops: pd.DataFrame,
+    ) -> pd.DataFrame:
+        """
+        Analyze chat messages with Arrow compute, calculate average response times
+
+        Args:
+            df_chat_messages (pd.DataFrame): Dataframe containing chat messages.
+            df_managers (pd.DataFrame): Dataframe containing manager details.
+            df_rops (pd.DataFrame): Dataframe containing additional rop details.
+
+        Returns:
+            pd.DataFrame: Dataframe with average response time per manager.
+        """
+        table = self._preprocess_arrow(df_chat_messages)
+        blocks = self._filter_arrow(table)
+        del table
+        responses = self._calculate_response_times_arrow(blocks)
+        del blocks
+        average_response_time = self._finalize_summary(
+            self._summarize_arrow(responses), df_managers, df_rops
+        )
+
+        logger.info("The calculations have been carried out successfully with Arrow.")
+
+        return average_response_time
@@ -0,0 +1,292 @@
+import copy
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta, timezone
+
+import pandas as pd
+from loguru import logger
+
+from .data_processing import ChatResponseAnalyzer
+from .get_data_db import DatabaseExtractor
+from .query_builder import QueryBuilder
+from .save_data_google_sheets import GoogleSheetsHandler
+from .utils import DirectoryValidator, FileHandler
+
+# Размеры партиций: день или неделя ISO (с понедельника)
+PARTITIONS = ("day", "week")
+
+
+def partition_periods(
+    first_day: date,
+    last_day: date,
+    partition: str = "day",
+    utc_offset: timedelta = timedelta(0),
+) -> list[tuple[str, datetime, datetime]]:
+    """
+    Split a range of local days into day or week partitions.
+
+    Args:
+        first_day (date): First day of the range.
+        last_day (date): Last day of the range (inclusive).
+        partition (str): ``"day"`` or ``"week"``. Weeks are ISO weeks (Monday to Sunday),
+            the first and the last week are cut to the range.
+        utc_offset (timedelta): Offset of the local days from UTC.
+
+    Returns:
+        list[tuple[str, datetime, datetime]]: Label (``2024-05-06`` or ``2024-W19``),
+        start (inclusive) and end (exclusive) of every partition, as UTC datetimes of the
+        local midnights.
+    """
+    if partition not in PARTITIONS:
+        raise ValueError(f"Unknown partition: {partition}")
+    if first_day > last_day:
+        raise ValueError(f"The range {first_day} - {last_day} is empty.")
+
+    def midnight(day: date) -> datetime:
+        return datetime.combine(day, datetime.min.time(), timezone.utc) - utc_offset
+
+    periods = []
+    day = first_day
+    while day <= last_day:
+        if partition == "day":
+            label = day.isoformat()
+            next_day = day + timedelta(days=1)
+        else:
+            year, week, weekday = day.isocalendar()
+            label = f"{year}-W{week:02d}"
+            next_day = min(day + timedelta(days=8 - weekday), last_day + timedelta(1))
+        periods.append((label, midnight(day), midnight(next_day)))
+        day = next_day
+    return periods
+
+
+def _backfill_partition(
+    analyzer: ChatResponseAnalyzer, db_extractor: DatabaseExtractor
+) -> dict:
+    """
+    Worker entry point: extract the messages of one period and reduce them to partial
+    aggregates.
+
+    Only the messages of the period are read, plus the carry-over of the conversations
+    that started earlier (``QueryBuilder.carry_over``): replies at the start of the
+    period keep the client message they answer, however long ago it was sent. Only
+    replies sent within the period are counted. Each worker opens its own connection.
+
+    Args:
+        analyzer (ChatResponseAnalyzer): Analyzer with the period of the partition.
+        db_extractor (DatabaseExtractor): Extractor with the connection settings.
+
+    Returns:
+        dict: ``partials`` (None without messages), ``rows`` (extracted messages, with
+        the carry-over) and ``seconds`` (time spent in the worker).
+    """
+    start = time.perf_counter()
+    # Одно соединение на процесс, оно закрывается после чтения
+    db_extractor.keep_alive = False
+    db_extractor.pool_size = 1
+    db_extractor.query_builder = QueryBuilder.from_analyzer(
+        analyzer, schema=db_extractor.query_builder.schema
+    )
+    db_extractor.queries = {
+        "carry_over": db_extractor.query_builder.carry_over(),
+        "chat_messages": db_extractor.query_builder.select("chat_messages"),
+    }
+    try:
+        df_carry_over = db_extractor._fetch_table("carry_over")
+        df_chat_messages = db_extractor._fetch_table("chat_messages")
+    finally:
+        db_extractor.close()
+    if not df_carry_over.empty:
+        # Начала блоков до периода идут раньше сообщений периода
+        df_chat_messages = pd.concat(
+            [df_carry_over, df_chat_messages], ignore_index=True
+        )
+    del df_carry_over
+
+    rows = len(df_chat_messages)
+    partials = None
+    if rows:
+        messages = analyzer._preprocess_messages(df_chat_messages)
+        del df_chat_messages
+        responses = analyzer._calculate_response_times(
+            analyzer._filter_messages(messages)
+        )
+        del messages
+        partials = analyzer._summarize_responses(responses)
+    return {
+        "partials": partials,
+        "rows": rows,
+        "seconds": time.perf_counter() - start,
+    }
+
+
+class BackfillRunner:
+    """
+    Computes the results of past periods.
+
+    A range of days is split into day or week partitions, which are extracted and
+    analyzed in parallel by a pool of worker processes. Workers return only the partial
+    aggregates. The parent turns them into the result table of every period and saves it
+    as ``<output_folder>/<period>.arrow``. If the analyzer has a daily store, it saves
+    the daily statistics of the period's days there. If a Google Sheets handler is
+    given, the table is also written to a sheet named after the period.
+    """
+
+    def __init__(
+        self,
+        analyzer: ChatResponseAnalyzer,
+        db_extractor: DatabaseExtractor,
+        output_folder: str,
+        workers: int = None,
+        gs_handler: GoogleSheetsHandler = None,
+        range_name: str = None,
+        sheet_prefix: str = "",
+    ):
+        """
+        Initialize the runner.
+
+        Args:
+            analyzer (ChatResponseAnalyzer): Analyzer with the working calendar,
+                percentiles and daily store. Its period is replaced by each partition's.
+            db_extractor (DatabaseExtractor): Extractor of the tenant. Chat messages are
+                read with the queries of its query builder.
+            output_folder (str): Folder of the per-period result tables.
+            workers (int): Number of worker processes. Defaults to the CPU count.
+            gs_handler (GoogleSheetsHandler): If set, every period is written to its own sheet.
+            range_name (str): Range whose cells (e.g. ``A1:F1000``) are written on every
+                period sheet. Required with ``gs_handler``.
+            sheet_prefix (str): Prefix of the sheet titles.
+        """
+        if gs_handler is not None and not range_name:
+            raise ValueError("Writing periods to Google Sheets requires range_name.")
+        self.analyzer = analyzer
+        self.db_extractor = db_extractor
+        self.output_folder = output_folder
+        self.workers = workers or os.cpu_count()
+        self.gs_handler = gs_handler
+        self.range_name = range_name
+        self.sheet_prefix = sheet_prefix
+
+    def _period_analyzer(
+        self, period_start: datetime, period_end: datetime
+    ) -> ChatResponseAnalyzer:
+        # Копия анализатора с периодом партиции; календарь и хранилище общие.
+        # Сообщения до периода заменяет выборка carry_over, запас lookback не нужен
+        analyzer = copy.copy(self.analyzer)
+        analyzer.period_start = analyzer._to_utc(period_start)
+        analyzer.period_end = analyzer._to_utc(period_end)
+        analyzer.lookback = timedelta(0)
+        return analyzer
+
+    def _save_period(self, label: str, result: pd.DataFrame) -> None:
+        """
+        Save the result table of a period to the output folder and, if configured, to
+        the sheet of the period.
+
+        Args:
+            label (str): Label of the period.
+            result (pd.DataFrame): Result table of the period.
+        """
+        snapshot_path = os.path.join(self.output_folder, f"{label}.arrow")
+        FileHandler.save_snapshot(
+            result,
+            snapshot_path,
+            f"Result of period {label} saved to {snapshot_path}",
+            f"Error saving the result of period {label}:",
+        )
+        if self.gs_handler is not None:
+            title = f"{self.sheet_prefix}{label}"
+            self.gs_handler.ensure_sheet(title)
+            self.gs_handler.save_data_table(
+                f"'{title}'!{self.range_name.rsplit('!', 1)[-1]}", result
+            )
+
+    def run(
+        self,
+        first_day: date,
+        last_day: date,
+        df_managers: pd.DataFrame,
+        df_rops: pd.DataFrame,
+        partition: str = "day",
+    ) -> list[dict]:
+        """
+        Compute and save the results of all periods of a range of days.
+
+        Args:
+            first_day (date): First day of the range.
+            last_day (date): Last day of the range (inclusive).
+            df_managers (pd.DataFrame): Dataframe containing manager details.
+            df_rops (pd.DataFrame): Dataframe containing additional rop details.
+            partition (str): ``"day"`` or ``"week"``.
+
+        Returns:
+            list[dict]: Reports of the periods in chronological order: label, success,
+            extracted messages and counted responses, managers, worker seconds and error.
+        """
+        periods = partition_periods(
+            first_day,
+            last_day,
+            partition,
+            utc_offset=self.analyzer.calendar.default.utc_offset,
+        )
+        DirectoryValidator.create_directory_if_not_exists(self.output_folder)
+        logger.info(
+            f"Backfill of {len(periods)} {partition} partitions from {first_day} "
+            f"to {last_day} on {self.workers} workers."
+        )
+
+        reports = {}
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = {}
+            for label, period_start, period_end in periods:
+                analyzer = self._period_analyzer(period_start, period_end)
+                future = executor.submit(
+                    _backfill_partition, analyzer, self.db_extractor
+                )
+                futures[future] = (label, analyzer)
+
+            # Результаты сохраняются по мере готовности, пока остальные партиции считаются
+            for future in as_completed(futures):
+                label, analyzer = futures[future]
+                report = {"period": label, "success": False}
+                try:
+                    partition_result = future.result()
+                    report["messages"] = partition_result["rows"]
+                    report["seconds"] = round(partition_result["seconds"], 3)
+                    partials = partition_result["partials"]
+                    result = analyzer._finalize_summary(partials, df_managers, df_rops)
+                    self._save_period(label, result)
+                    report["responses"] = (
+                        0
+                        if partials is None
+                        else int(partials["summary"]["response_count"].sum())
+                    )
+                    report["managers"] = len(result)
+                    report["success"] = True
+                except Exception as e:
+                    report["error"] = f"{type(e).__name__}: {e}"
+                    logger.error(f"Backfill of period {label} failed: {e}")
+                reports[label] = report
+
+        reports = [reports[label] for label, _, _ in periods]
+        failed = [report["period"] for report in reports if not report["success"]]
+        logger.info(
+            f"Backfill finished: {len(reports) - len(failed)} of {len(reports)} periods"
+            + (f", failed: {', '.join(failed)}" if failed else "")
+        )
+        return reports
+
+    @staticmethod
+    def load_results(output_folder: str, periods: list[str] = None) -> dict:
+        """
+        Load saved period results.
+
+        Args:
+            output_folder (str): Output folder of the backfill.
+            periods (list[str]): Labels of the periods. Defaults to all saved periods.
+
+        Returns:
+            dict: Period label -> result table.
+        """
+        return DatabaseExtractor.load_snapshot(output_folder, periods)
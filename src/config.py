@@ -17,6 +17,9 @@ class Config:
                 self.BASE_DIR, "./settings/google_api", "google_sheets_info.yaml"
             ),
             "db_info": os.path.join(self.BASE_DIR, "./settings/db_api", "connect.yaml"),
+            "calendar": os.path.join(
+                self.BASE_DIR, "./settings/calendar", "calendar.yaml"
+            ),
         }
 
         # === Path Validation ===
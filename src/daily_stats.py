@@ -0,0 +1,312 @@
+import os
+import sqlite3
+from contextlib import closing
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from .quantile_sketch import QuantileSketch
+from .utils import DirectoryValidator
+
+# Столбцы агрегатов за день в порядке столбцов таблицы
+STAT_COLUMNS = [
+    "response_count",
+    "response_time_sum",
+    "response_time_sum_sq",
+    "response_time_min",
+    "response_time_max",
+]
+
+
+class DailyStatsStore:
+    """
+    Keeps per-(manager, day) sufficient statistics of response times (count, sum, sum of
+    squares, min and max, in minutes) and quantile sketches in a local SQLite database.
+
+    Averages and percentiles over any range of days, e.g. the last N days or the month
+    to date, are calculated from these aggregates without reading the chat messages
+    again. Days are local days (``utc_offset`` from UTC) of the manager reply.
+    """
+
+    TABLE = "manager_daily_stats"
+    SKETCH_TABLE = "manager_daily_sketches"
+
+    def __init__(
+        self,
+        path: str,
+        utc_offset: timedelta = timedelta(0),
+        sketch: QuantileSketch = None,
+    ):
+        """
+        Initialize the store and create its tables if needed.
+
+        Args:
+            path (str): Path of the SQLite database file.
+            utc_offset (timedelta): Offset of the local days from UTC.
+            sketch (QuantileSketch): Parameters of the stored quantile sketches. They
+                cannot change once sketches are stored. Default is ``QuantileSketch()``.
+        """
+        self.path = path
+        self.utc_offset = utc_offset
+        self.sketch = sketch or QuantileSketch()
+
+        if os.path.dirname(path):
+            DirectoryValidator.create_directory_if_not_exists(os.path.dirname(path))
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.TABLE} (
+                    manager_id INTEGER NOT NULL,
+                    day TEXT NOT NULL,
+                    response_count INTEGER NOT NULL,
+                    response_time_sum REAL NOT NULL,
+                    response_time_sum_sq REAL NOT NULL,
+                    response_time_min REAL NOT NULL,
+                    response_time_max REAL NOT NULL,
+                    PRIMARY KEY (day, manager_id)
+                )
+                """
+            )
+            conn.execute(
+                f"""
+                CREATE TABLE IF NOT EXISTS {self.SKETCH_TABLE} (
+                    manager_id INTEGER NOT NULL,
+                    day TEXT NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (day, manager_id, bucket)
+                )
+                """
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value REAL)"
+            )
+            # Корзины скетчей зависят от точности, поэтому её нельзя менять
+            conn.execute(
+                "INSERT OR IGNORE INTO settings VALUES ('sketch_relative_accuracy', ?),"
+                " ('sketch_min_value', ?)",
+                (self.sketch.relative_accuracy, self.sketch.min_value),
+            )
+            stored = dict(conn.execute("SELECT name, value FROM settings"))
+        if stored != {
+            "sketch_relative_accuracy": self.sketch.relative_accuracy,
+            "sketch_min_value": self.sketch.min_value,
+        }:
+            raise ValueError(
+                f"Sketches in {path} were stored with other parameters: {stored}."
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # Соединение открывается на каждую операцию, поэтому хранилище можно
+        # передавать в дочерние процессы и использовать из разных потоков
+        return sqlite3.connect(self.path)
+
+    def day_numbers(self, created_at: np.ndarray) -> np.ndarray:
+        """
+        Local days of epoch timestamps.
+
+        Args:
+            created_at (np.ndarray): Epoch seconds (UTC).
+
+        Returns:
+            np.ndarray: Days since 1970-01-01 in the local time (int64).
+        """
+        offset = int(self.utc_offset.total_seconds())
+        return (np.asarray(created_at, dtype=np.int64) + offset) // 86400
+
+    @staticmethod
+    def _day_to_iso(day: int) -> str:
+        return (date(1970, 1, 1) + timedelta(days=int(day))).isoformat()
+
+    def _rows(self, frame: pd.DataFrame, columns: list[str]) -> Iterator[tuple]:
+        # Значения numpy переводим в типы Python, которые принимает sqlite3
+        return zip(
+            frame["manager_id"].astype("int64").tolist(),
+            [self._day_to_iso(day) for day in frame["day"].tolist()],
+            *(frame[column].tolist() for column in columns),
+        )
+
+    def replace_days(
+        self,
+        daily: pd.DataFrame,
+        first_day: int,
+        last_day: int,
+        sketches: pd.DataFrame = None,
+    ) -> None:
+        """
+        Replace the statistics of a range of days in one transaction.
+
+        Stored rows of the days in the range are deleted, including managers without
+        responses in the new statistics, so recomputed days (e.g. after late messages)
+        fully overwrite the previous values. Days outside the range are kept.
+
+        Args:
+            daily (pd.DataFrame): Statistics with ``manager_id``, ``day`` (days since
+                1970-01-01) and the ``STAT_COLUMNS`` columns.
+            first_day (int): First replaced day (days since 1970-01-01).
+            last_day (int): Last replaced day, inclusive.
+            sketches (pd.DataFrame): Quantile sketches with ``manager_id``, ``day``,
+                ``bucket`` and ``count``, or None to store no sketches for these days.
+        """
+        daily = daily[daily["day"].between(first_day, last_day)]
+        if sketches is None:
+            sketches = pd.DataFrame(columns=["manager_id", "day", "bucket", "count"])
+        sketches = sketches[sketches["day"].between(first_day, last_day)]
+        days = (self._day_to_iso(first_day), self._day_to_iso(last_day))
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    f"DELETE FROM {self.TABLE} WHERE day BETWEEN ? AND ?", days
+                )
+                conn.executemany(
+                    f"INSERT INTO {self.TABLE} VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    self._rows(daily, STAT_COLUMNS),
+                )
+                conn.execute(
+                    f"DELETE FROM {self.SKETCH_TABLE} WHERE day BETWEEN ? AND ?", days
+                )
+                conn.executemany(
+                    f"INSERT INTO {self.SKETCH_TABLE} VALUES (?, ?, ?, ?)",
+                    self._rows(sketches, ["bucket", "count"]),
+                )
+            logger.info(
+                f"Daily statistics saved for {self._day_to_iso(first_day)} – "
+                f"{self._day_to_iso(last_day)} ({len(daily)} rows)."
+            )
+        except Exception as e:
+            logger.error(f"Error saving daily statistics: {e}")
+            raise
+
+    def window_stats(self, first_day: date, last_day: date) -> pd.DataFrame:
+        """
+        Per-manager statistics of a range of days.
+
+        Args:
+            first_day (date): First day of the range.
+            last_day (date): Last day of the range, inclusive.
+
+        Returns:
+            pd.DataFrame: ``manager_id``, the summed ``STAT_COLUMNS`` and
+            ``avg_response_time_minutes`` and ``std_response_time_minutes`` (sample
+            standard deviation), one row per manager with responses in the range.
+        """
+        try:
+            with closing(self._connect()) as conn:
+                stats = pd.read_sql_query(
+                    f"""
+                    SELECT manager_id,
+                           SUM(response_count) AS response_count,
+                           SUM(response_time_sum) AS response_time_sum,
+                           SUM(response_time_sum_sq) AS response_time_sum_sq,
+                           MIN(response_time_min) AS response_time_min,
+                           MAX(response_time_max) AS response_time_max
+                    FROM {self.TABLE}
+                    WHERE day BETWEEN ? AND ?
+                    GROUP BY manager_id
+                    ORDER BY manager_id
+                    """,
+                    conn,
+                    params=(first_day.isoformat(), last_day.isoformat()),
+                )
+        except Exception as e:
+            logger.error(f"Error reading daily statistics: {e}")
+            raise
+
+        count = stats["response_count"]
+        mean = stats["response_time_sum"] / count
+        # Дисперсия по сумме квадратов; отрицательные значения — ошибки округления
+        variance = (
+            (stats["response_time_sum_sq"] - stats["response_time_sum"] * mean)
+            .clip(lower=0)
+            .div(count - 1)
+            .where(count > 1)
+        )
+        return stats.assign(
+            avg_response_time_minutes=mean,
+            std_response_time_minutes=np.sqrt(variance),
+        )
+
+    def window_percentiles(
+        self,
+        first_day: date,
+        last_day: date,
+        quantiles: Iterable[float] = (0.5, 0.9, 0.99),
+        groups: pd.Series = None,
+    ) -> pd.DataFrame:
+        """
+        Percentiles of the response time in a range of days, per manager or per group of
+        managers (e.g. per ROP).
+
+        Args:
+            first_day (date): First day of the range.
+            last_day (date): Last day of the range, inclusive.
+            quantiles (Iterable[float]): Quantiles to estimate.
+            groups (pd.Series): Group of every manager indexed by manager id, e.g.
+                ``df_managers.set_index("mop_id")["rop_id"]``. Managers missing from it
+                are left out. Default is None (per manager).
+
+        Returns:
+            pd.DataFrame: ``manager_id`` (or ``group``) and one column per quantile.
+        """
+        try:
+            with closing(self._connect()) as conn:
+                sketches = pd.read_sql_query(
+                    f"""
+                    SELECT manager_id, bucket, SUM(count) AS count
+                    FROM {self.SKETCH_TABLE}
+                    WHERE day BETWEEN ? AND ?
+                    GROUP BY manager_id, bucket
+                    """,
+                    conn,
+                    params=(first_day.isoformat(), last_day.isoformat()),
+                )
+        except Exception as e:
+            logger.error(f"Error reading quantile sketches: {e}")
+            raise
+
+        keys = ["manager_id"]
+        if groups is not None:
+            groups = groups[~groups.index.duplicated()]
+            positions = groups.index.get_indexer(sketches["manager_id"])
+            sketches = sketches[positions >= 0].assign(
+                group=groups.to_numpy()[positions[positions >= 0]]
+            )
+            keys = ["group"]
+            sketches = self.sketch.merge([sketches[[*keys, "bucket", "count"]]], keys)
+        return self.sketch.quantiles(sketches, keys, quantiles)
+
+    def today(self) -> date:
+        """
+        Current local day.
+        """
+        return (datetime.now(timezone.utc) + self.utc_offset).date()
+
+    def last_days(self, days: int, today: date = None) -> pd.DataFrame:
+        """
+        Per-manager statistics of the last ``days`` days, including today.
+
+        Args:
+            days (int): Number of days.
+            today (date): Last day of the range. Defaults to the current local day.
+
+        Returns:
+            pd.DataFrame: See ``window_stats``.
+        """
+        today = today or self.today()
+        return self.window_stats(today - timedelta(days=days - 1), today)
+
+    def month_to_date(self, today: date = None) -> pd.DataFrame:
+        """
+        Per-manager statistics from the first day of the month to today.
+
+        Args:
+            today (date): Last day of the range. Defaults to the current local day.
+
+        Returns:
+            pd.DataFrame: See ``window_stats``.
+        """
+        today = today or self.today()
+        return self.window_stats(today.replace(day=1), today)
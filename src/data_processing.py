@@ -1,35 +1,242 @@
-from datetime import timedelta
+import math
+from datetime import datetime, timedelta
+from typing import Iterable
 
+import numpy as np
 import pandas as pd
 from loguru import logger
 
+from .daily_stats import STAT_COLUMNS, DailyStatsStore
+from .metrics import MetricsRecorder, measure_stage
+from .quantile_sketch import QuantileSketch
+from .working_calendar import TeamCalendars, WorkingCalendar
+
+# Коды категорий типа сообщения в компактной схеме (порядок MESSAGE_TYPES)
+INCOMING_CODE = 0
+OUTGOING_CODE = 1
+# Суммы времени ответа в частичных агрегатах хранятся в целых микросекундах: целая
+# сумма не зависит от порядка сложения, поэтому все бэкенды и любое разбиение
+# сообщений на части дают одинаковые средние. В минуты суммы переводятся только
+# при расчёте итоговой таблицы и сохранении статистики за день
+US_PER_MINUTE = 60 * 10**6
+
+
+class PartialsBuffer:
+    """
+    Accumulates partial aggregates of chunks and merges them in batches.
+
+    Merging every chunk into the running total re-groups the whole accumulated state
+    (including the per-day sketches) on each chunk. Instead, the partials of the chunks
+    are buffered and merged together with the total once per batch: when ``batch_chunks``
+    chunks or ``batch_rows`` rows of partial aggregates have been buffered, and at the end.
+    """
+
+    def __init__(
+        self,
+        analyzer: "ChatResponseAnalyzer",
+        batch_chunks: int = 64,
+        batch_rows: int = 1_000_000,
+    ):
+        """
+        Initialize the buffer.
+
+        Args:
+            analyzer (ChatResponseAnalyzer): Analyzer merging the partial aggregates.
+            batch_chunks (int): Number of buffered chunks that triggers a merge.
+            batch_rows (int): Number of buffered rows of partial aggregates that triggers
+                a merge, bounding the memory of the buffer.
+        """
+        self.analyzer = analyzer
+        self.batch_chunks = batch_chunks
+        self.batch_rows = batch_rows
+        self._merged = None
+        self._buffer = []
+        self._buffered_rows = 0
+
+    def add(self, partials: dict) -> None:
+        """
+        Add the partial aggregates of a chunk.
+
+        Args:
+            partials (dict): Partial aggregates from ``_summarize_responses``, or None for
+                a chunk without replies.
+        """
+        if partials is None:
+            return
+        self._buffer.append(partials)
+        self._buffered_rows += sum(len(frame) for frame in partials.values())
+        if (
+            len(self._buffer) >= self.batch_chunks
+            or self._buffered_rows >= self.batch_rows
+        ):
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._buffer:
+            return
+        parts = self._buffer if self._merged is None else [self._merged, *self._buffer]
+        self._merged = (
+            parts[0] if len(parts) == 1 else self.analyzer._merge_partials(parts)
+        )
+        self._buffer = []
+        self._buffered_rows = 0
+
+    def result(self) -> dict:
+        """
+        Merge the buffered chunks and return the total.
+
+        Returns:
+            dict: Merged partial aggregates, or None if no chunk had replies.
+        """
+        self._flush()
+        return self._merged
+
 
 class ChatResponseAnalyzer:
     """
     A class to analyze chat messages and calculate average response times for managers.
     """
 
+    # Столбцы таблиц, которые используются при расчёте
+    REQUIRED_COLUMNS = {
+        "chat_messages": ["entity_id", "type", "created_at", "created_by"],
+        "managers": ["mop_id", "name_mop", "rop_id"],
+        "rops": ["rop_id", "rop_name"],
+    }
+    # Типы сообщений, участвующие в расчёте
+    MESSAGE_TYPES = ("incoming_chat_message", "outgoing_chat_message")
+
     def __init__(
         self,
-        work_start: timedelta,
-        work_end: timedelta,
-        utc_offset: timedelta,
+        work_start: timedelta = None,
+        work_end: timedelta = None,
+        utc_offset: timedelta = None,
+        period_start: datetime = None,
+        period_end: datetime = None,
+        lookback: timedelta = timedelta(days=7),
+        metrics: MetricsRecorder = None,
+        daily_store: DailyStatsStore = None,
+        calendar: TeamCalendars = None,
+        percentiles: Iterable[float] = None,
     ):
         """
         Initialize the analyzer with working hours and output settings.
 
         Args:
-            work_start (timedelta): Start of the working day in UTC.
-            work_end (timedelta): End of the working day in UTC.
-            utc_offset (timedelta): Offset for Moscow timezone.
+            work_start (timedelta): Start of the working day in local time. Ignored when
+                ``calendar`` is given.
+            work_end (timedelta): End of the working day in local time.
+            utc_offset (timedelta): Offset of the local time from UTC.
+            period_start (datetime): Start of the reporting window (inclusive). Only replies sent
+                within the window are counted. Naive datetimes are treated as UTC. Default is None
+                (no lower bound).
+            period_end (datetime): End of the reporting window (exclusive). Default is None
+                (no upper bound).
+            lookback (timedelta): How far before ``period_start`` client messages are fetched,
+                so that replies at the start of the window keep their incoming message.
+            metrics (MetricsRecorder): Recorder of the stage timings. Default is a new recorder.
+            daily_store (DailyStatsStore): If set, per-(manager, day) statistics of the
+                response times are saved there on every analysis. Default is None.
+            calendar (TeamCalendars): Working calendars of the managers (shifts, days off,
+                UTC offsets). Default is one shift from ``work_start`` to ``work_end``
+                every day.
+            percentiles (Iterable[float]): Quantiles of the response time added to the
+                result as ``p50_response_time_minutes`` etc., e.g. ``(0.5, 0.9, 0.99)``.
+                They are estimated with mergeable sketches (1% relative error) and also
+                saved to the daily store. Default is None (only the average).
         """
-        # Время старта и окончания рабочего дня переводим из МСК в 0-ой пояс
-        self.work_start = work_start - utc_offset
-        self.work_end = work_end - utc_offset
+        if calendar is None:
+            if None in (work_start, work_end, utc_offset):
+                raise ValueError(
+                    "Either a calendar or work_start, work_end and utc_offset are required."
+                )
+            calendar = TeamCalendars(
+                WorkingCalendar(shifts=[(work_start, work_end)], utc_offset=utc_offset)
+            )
+        self.calendar = calendar
+
+        self.period_start = self._to_utc(period_start)
+        self.period_end = self._to_utc(period_end)
+        self.lookback = lookback
+        self.metrics = metrics or MetricsRecorder()
+        self.daily_store = daily_store
+        self.percentiles = tuple(percentiles or ())
+        self.sketch = (
+            daily_store.sketch if daily_store is not None else QuantileSketch()
+        )
+
+    @staticmethod
+    def _to_utc(value: datetime) -> pd.Timestamp:
+        if value is None:
+            return None
+        value = pd.Timestamp(value)
+        if value.tzinfo is None:
+            return value.tz_localize("UTC")
+        return value.tz_convert("UTC")
+
+    @staticmethod
+    def _compact_ids(ids: pd.Series) -> pd.Series:
+        """
+        Store ids as int32 when they fit, otherwise as int64. Missing ids (e.g. ``created_by``
+        of client messages) are kept with the nullable Int32/Int64 dtypes.
+        """
+        bits = 32
+        if ids.notna().any():
+            if ids.min() < np.iinfo(np.int32).min or ids.max() > np.iinfo(np.int32).max:
+                bits = 64
+        if ids.hasnans:
+            return ids.astype(f"Int{bits}", copy=False)
+        return ids.astype(f"int{bits}", copy=False)
+
+    @classmethod
+    def compact_messages(cls, df_chat_messages: pd.DataFrame) -> pd.DataFrame:
+        """
+        Convert chat messages to the compact layout used by the analyzer.
+
+        ``type`` becomes a categorical of ``MESSAGE_TYPES`` (one byte per row, other types
+        become missing), ``entity_id`` and ``created_by`` become int32 (or int64 when the
+        ids do not fit) and ``created_at`` stays int64 epoch seconds. The input is not
+        changed; frames already in the compact layout are returned without copying data.
+
+        Args:
+            df_chat_messages (pd.DataFrame): Dataframe containing chat messages.
+
+        Returns:
+            pd.DataFrame: Chat messages in the compact layout.
+        """
+        columns = {}
+        for name in df_chat_messages.columns:
+            column = df_chat_messages[name]
+            if name == "type":
+                column = column.astype(
+                    pd.CategoricalDtype(cls.MESSAGE_TYPES), copy=False
+                )
+            elif name in ("entity_id", "created_by"):
+                column = cls._compact_ids(column)
+            elif name == "created_at":
+                column = column.astype(np.int64, copy=False)
+            columns[name] = column
+        return pd.DataFrame(columns, copy=False)
+
+    def extraction_window(self) -> tuple[int, int]:
+        """
+        Range of ``created_at`` values (epoch seconds) needed for the reporting window.
 
+        Returns:
+            tuple[int, int]: Inclusive start and exclusive end, None where unbounded.
+        """
+        window_start = None
+        if self.period_start is not None:
+            window_start = math.floor((self.period_start - self.lookback).timestamp())
+        window_end = None
+        if self.period_end is not None:
+            window_end = math.ceil(self.period_end.timestamp())
+        return window_start, window_end
+
+    @measure_stage("analyze.preprocess_messages")
     def _preprocess_messages(self, df_chat_messages: pd.DataFrame) -> pd.DataFrame:
         """
-        Preprocess chat messages by converting timestamps and sorting.
+        Preprocess chat messages by converting them to the compact layout and sorting.
 
         Args:
             df_chat_messages (pd.DataFrame): Dataframe containing chat messages.
@@ -37,17 +244,20 @@ class ChatResponseAnalyzer:
         Returns:
             pd.DataFrame: Preprocessed dataframe.
         """
-        # Преобразование временных меток в формат datetime
-        df_chat_messages["created_at"] = pd.to_datetime(
-            df_chat_messages["created_at"], unit="s", utc=True
-        )
+        df_chat_messages = self.compact_messages(df_chat_messages)
+
+        # Оставляем только сообщения клиентов и менеджеров (прочие типы не попали в категории)
+        is_chat_message = df_chat_messages["type"].notna()
+        if not is_chat_message.all():
+            df_chat_messages = df_chat_messages[is_chat_message]
 
         # Сортировка сообщений по entity_id (по клиентам) и времени
-        # отправки сообщения в порядке возрастания
-        df_chat_messages.sort_values(by=["entity_id", "created_at"], inplace=True)
+        # отправки сообщения в порядке возрастания. Время остаётся в секундах epoch
+        df_chat_messages = df_chat_messages.sort_values(by=["entity_id", "created_at"])
 
         return df_chat_messages
 
+    @measure_stage("analyze.filter_messages")
     def _filter_messages(self, df_chat_messages: pd.DataFrame) -> pd.DataFrame:
         """
         Filter first messages in each conversation block.
@@ -58,25 +268,116 @@ class ChatResponseAnalyzer:
         Returns:
             pd.DataFrame: Filtered dataframe.
         """
-        # Создадим новое поле с булевыми значениями, куда занесём метки начала
-        # блока сообщений
-        df_chat_messages["is_first_in_block"] = (
+        type_codes = df_chat_messages["type"].cat.codes.to_numpy()
+        entity_ids = df_chat_messages["entity_id"].to_numpy()
+
+        # Метки начала блока сообщений (без нового столбца в таблице):
+        is_first_in_block = np.ones(len(df_chat_messages), dtype=bool)
+        is_first_in_block[1:] = (
             # Если в чате с одним клиентом тип сообщения (отправлен клиентом или
             # отправлен менеджером) на текущей строке не равен типу на предыдущей
-            (df_chat_messages["type"] != df_chat_messages["type"].shift())
+            (type_codes[1:] != type_codes[:-1])
             # ИЛИ
             |
             # Если начался чат с другим клиентом
-            (df_chat_messages["entity_id"] != df_chat_messages["entity_id"].shift())
+            (entity_ids[1:] != entity_ids[:-1])
         )
-        # Возвращаем отфильтрованный дата-фрейм, где is_first_in_block == True.
-        # В результате мы получаем DataFrame, содержащий только первые сообщения
+        # Возвращаем отфильтрованный дата-фрейм с первыми сообщениями
         # из каждого блока, где:
         # - Изменился тип сообщения.
         # Или
         # - Изменился идентификатор сделки.
-        return df_chat_messages[df_chat_messages["is_first_in_block"]]
+        return df_chat_messages[is_first_in_block]
+
+    def _adjust_to_working_hours(
+        self,
+        incoming_ns: np.ndarray,
+        outgoing_ns: np.ndarray,
+        manager_ids: np.ndarray = None,
+    ) -> np.ndarray:
+        """
+        Working time between pairs of incoming/outgoing timestamps.
+
+        Only the working time of the manager's calendar counts, so a reply after a
+        weekend or several days later does not include the nights and days off. A reply
+        outside working hours counts up to the end of the last shift, a client message
+        outside working hours counts from the start of the next shift.
+
+        Args:
+            incoming_ns (np.ndarray): Client message times, int64 nanoseconds since epoch (UTC).
+            outgoing_ns (np.ndarray): Manager reply times, int64 nanoseconds since epoch (UTC).
+            manager_ids (np.ndarray): Replying managers, selecting their team calendars.
+
+        Returns:
+            np.ndarray: Adjusted response times in nanoseconds (int64).
+        """
+        return self.calendar.working_time(incoming_ns, outgoing_ns, manager_ids)
+
+    def _pair_responses(
+        self,
+        entity_ids: np.ndarray,
+        is_incoming: np.ndarray,
+        is_outgoing: np.ndarray,
+        created_at_ns: np.ndarray,
+        manager_ids: np.ndarray = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Pair incoming and outgoing block starts and compute adjusted response times.
+
+        Args:
+            entity_ids (np.ndarray): Entity of every block start, sorted by entity and time.
+            is_incoming (np.ndarray): Mask of block starts sent by the client.
+            is_outgoing (np.ndarray): Mask of block starts sent by a manager.
+            created_at_ns (np.ndarray): Block start times, int64 nanoseconds since epoch (UTC).
+            manager_ids (np.ndarray): Sender of every block start (missing for clients).
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Positions of the replying block starts and
+            their adjusted response times in nanoseconds.
+        """
+        # Сдвинутыми массивами сопоставляем каждое первое сообщение блока с
+        # предыдущим. Время ответа рассчитывается только если:
+        # - оба сообщения относятся к одной сделке;
+        # - предыдущее сообщение было входящим, от клиента;
+        # - текущее сообщение — исходящее, от менеджера клиенту.
+        is_response = (
+            (entity_ids[1:] == entity_ids[:-1]) & is_incoming[:-1] & is_outgoing[1:]
+        )
+        # Учитываем только ответы, отправленные в отчётном периоде
+        if self.period_start is not None:
+            is_response &= created_at_ns[1:] >= self.period_start.value
+        if self.period_end is not None:
+            is_response &= created_at_ns[1:] < self.period_end.value
+        prev_idx = np.flatnonzero(is_response)
+        curr_idx = prev_idx + 1
+
+        adjusted_response_time = self._adjust_to_working_hours(
+            created_at_ns[prev_idx],
+            created_at_ns[curr_idx],
+            None if manager_ids is None else manager_ids[curr_idx],
+        )
+
+        return curr_idx, adjusted_response_time
+
+    @staticmethod
+    def _response_time_columns(adjusted_response_time: np.ndarray) -> dict:
+        """
+        Response time columns of the replies.
+
+        Args:
+            adjusted_response_time (np.ndarray): Adjusted response times in nanoseconds.
 
+        Returns:
+            dict: ``response_time`` in minutes (for the sketches, minimum and maximum) and
+            ``response_time_us``, the exact integer microseconds that are summed. Working
+            time is a whole number of microseconds, the precision of the calendar.
+        """
+        return {
+            "response_time": adjusted_response_time / 10**9 / 60,
+            "response_time_us": adjusted_response_time // 1000,
+        }
+
+    @measure_stage("analyze.calculate_response_times")
     def _calculate_response_times(
         self, filtered_messages: pd.DataFrame
     ) -> pd.DataFrame:
@@ -89,156 +390,358 @@ class ChatResponseAnalyzer:
         Returns:
             pd.DataFrame: Dataframe containing response times.
         """
-        responses = []
-
-        # Группируем сообщения по entity_id (ID сделки)
-        for _, group in filtered_messages.groupby("entity_id"):
-            # Обход сообщений внутри группы
-            for i in range(1, len(group)):
-                # Предыдущее сообщение
-                prev_row = group.iloc[i - 1].copy()
-                # Текущее сообщение
-                curr_row = group.iloc[i].copy()
-
-                # Время ответа рассчитывается только если:
-                # Предыдущее сообщение было входящим, от клиента.
-                # Текущее сообщение — исходящее, от менеджера клиенту.
-                if (
-                    prev_row["type"] == "incoming_chat_message"
-                    and curr_row["type"] == "outgoing_chat_message"
-                ):
-                    # Определение границ рабочего дня на дату отправки сообщения клиентом
-                    start_of_day = prev_row["created_at"].replace(
-                        hour=0, minute=0, second=0, microsecond=0
-                    )
-                    # К 00.00 прибавляем время начала и окончания данного рабочего дня (по UTC=0)
-                    work_start_time = start_of_day + self.work_start
-                    work_end_time = start_of_day + self.work_end
-                    # Получим значение начала следующего рабочего дня
-                    next_work_start_time = work_start_time + timedelta(days=1)
-
-                    # Если сообщение от клиента в рамках текущего рабочего дня
-                    if work_start_time <= prev_row["created_at"] <= work_end_time:
-                        # И ответ менеджера в рамках рабочего дня
-                        if work_start_time <= curr_row["created_at"] <= work_end_time:
-                            # Просто вычитаем разницу во времени
-                            adjusted_response_time = (
-                                curr_row["created_at"] - prev_row["created_at"]
-                            )
-
-                        # Если менеджер ответил на это сообщение после окончания текущего рабочего дня
-                        else:
-                            # И после начала следующего рабочего дня
-                            if next_work_start_time <= curr_row["created_at"]:
-                                # Cчитаем время ответа менеджера, как сумму:
-                                adjusted_response_time = (
-                                    # Разницы окончания рабочего дня, когда клиент
-                                    # задал вопрос, и времени сообщения клиента
-                                    (work_end_time - prev_row["created_at"])
-                                    +
-                                    # Разницы ответа менеджера и начала следующего рабочего дня
-                                    (curr_row["created_at"] - next_work_start_time)
-                                )
-
-                            # Если менеджер ответил в нерабочее время
-                            if (
-                                work_end_time
-                                < curr_row["created_at"]
-                                < next_work_start_time
-                            ):
-                                # Находим разницу между окончанием рабочего дня,
-                                # когда клиент написал вопрос, и сообщением клиента
-                                # Время ответа менеджера после окончения рабочего дня не учитываем
-                                # Так как менеджер проявил инциативу, ответив в нерабочее время:)
-                                adjusted_response_time = (
-                                    work_end_time - prev_row["created_at"]
-                                )
-
-                    # Если же сообщение от клиента в НЕрабочее время
-                    else:
-                        # Сначала рассмотрим случаи, когда сообщение клиента
-                        # и менеджера приходятся на одни сутки для пояса utc=0
-
-                        # И ответ менеджера до начала рабочего дня
-                        if curr_row["created_at"] < work_start_time:
-                            # Считаем время ответа 0, т.к. менеджер начал работу ещё до рабочего дня
-                            adjusted_response_time = timedelta(0)
-
-                        # И ответ менеджера после начала рабочего дня
-                        if work_start_time <= curr_row["created_at"] <= work_end_time:
-                            # Находим время ответа как разницу между сообщением
-                            # менеджера и временем начала рабочего дня
-                            adjusted_response_time = (
-                                curr_row["created_at"] - work_start_time
-                            )
-
-                        # Теперь рассмотрим случаи, когда сообщение клиента
-                        # и менеджера приходятся на разные сутки для пояса utc=0
-
-                        # И ответ менеджера до начала рабочего дня
-                        if curr_row["created_at"] < next_work_start_time:
-                            # Считаем время ответа 0, т.к. менеджер начал работу ещё до рабочего дня
-                            adjusted_response_time = timedelta(0)
-
-                        # И ответ менеджера после начала рабочего дня
-                        if next_work_start_time <= curr_row["created_at"]:
-                            # Находим время ответа как разницу между сообщением
-                            # менеджера и временем начала рабочего дня
-                            adjusted_response_time = (
-                                curr_row["created_at"] - next_work_start_time
-                            )
-
-                    # Возвращаем ID сделки, менеджера и время ответа
-                    responses.append(
-                        {
-                            "entity_id": curr_row["entity_id"],
-                            "manager_id": curr_row["created_by"],
-                            "response_time": adjusted_response_time,
-                        }
-                    )
+        entity_ids = filtered_messages["entity_id"].to_numpy()
+        type_codes = filtered_messages["type"].cat.codes.to_numpy()
+        created_at_ns = filtered_messages["created_at"].to_numpy(np.int64) * 10**9
+        manager_ids = filtered_messages["created_by"].array
+
+        curr_idx, adjusted_response_time = self._pair_responses(
+            entity_ids,
+            type_codes == INCOMING_CODE,
+            type_codes == OUTGOING_CODE,
+            created_at_ns,
+            manager_ids,
+        )
+
+        # Возвращаем ID сделки, менеджера, время ответа (секунды epoch) и время
+        # ответа в минутах и микросекундах
+        return pd.DataFrame(
+            {
+                "entity_id": entity_ids[curr_idx],
+                "manager_id": manager_ids[curr_idx],
+                "created_at": created_at_ns[curr_idx] // 10**9,
+                **self._response_time_columns(adjusted_response_time),
+            }
+        )
+
+    @measure_stage("analyze.summarize_response_times")
+    def _summarize_response_times(self, responses_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Reduce response times to per-manager partial aggregates.
+
+        Args:
+            responses_df (pd.DataFrame): Dataframe with response times.
+
+        Returns:
+            pd.DataFrame: Dataframe with ``manager_id``, ``response_time_sum_us`` and
+            ``response_count`` columns, one row per manager.
+        """
+        return (
+            responses_df.groupby("manager_id")["response_time_us"]
+            .agg(response_time_sum_us="sum", response_count="count")
+            .reset_index()
+        )
+
+    @measure_stage("analyze.summarize_daily_response_times")
+    def _summarize_daily_response_times(
+        self, responses_df: pd.DataFrame
+    ) -> pd.DataFrame:
+        """
+        Reduce response times to per-(manager, day) statistics for the daily store.
+
+        Args:
+            responses_df (pd.DataFrame): Dataframe with response times and the ``day``
+                (local days since 1970-01-01) of the reply.
+
+        Returns:
+            pd.DataFrame: Dataframe with ``manager_id``, ``day`` and the ``STAT_COLUMNS``
+            columns, the sum as ``response_time_sum_us``.
+        """
+        response_time = responses_df["response_time"]
+        return (
+            responses_df.assign(response_time_sq=response_time * response_time)
+            .groupby(["manager_id", "day"])
+            .agg(
+                response_count=("response_time", "count"),
+                response_time_sum_us=("response_time_us", "sum"),
+                response_time_sum_sq=("response_time_sq", "sum"),
+                response_time_min=("response_time", "min"),
+                response_time_max=("response_time", "max"),
+            )
+            .reset_index()
+        )
+
+    @staticmethod
+    def _merge_daily_summaries(summaries: list[pd.DataFrame]) -> pd.DataFrame:
+        """
+        Merge per-(manager, day) statistics computed on disjoint parts of the messages.
+
+        Args:
+            summaries (list[pd.DataFrame]): Statistics from ``_summarize_daily_response_times``.
+
+        Returns:
+            pd.DataFrame: Combined per-(manager, day) statistics.
+        """
+        return (
+            pd.concat(summaries, ignore_index=True)
+            .groupby(["manager_id", "day"])
+            .agg(
+                response_count=("response_count", "sum"),
+                response_time_sum_us=("response_time_sum_us", "sum"),
+                response_time_sum_sq=("response_time_sum_sq", "sum"),
+                response_time_min=("response_time_min", "min"),
+                response_time_max=("response_time_max", "max"),
+            )
+            .reset_index()
+        )
+
+    def _save_daily_summary(
+        self, daily: pd.DataFrame, daily_sketch: pd.DataFrame = None
+    ) -> None:
+        """
+        Replace the days fully covered by this analysis in the daily store.
 
-        responses_df = pd.DataFrame(responses)
-        # Преобразование время ответа в минуты
-        responses_df["response_time"] = (
-            responses_df["response_time"].dt.total_seconds() / 60
+        Without a reporting window every day between the first and the last reply is
+        recomputed, so days that received late messages are overwritten. With a window,
+        only the days entirely inside it are replaced. Errors are logged and do not fail
+        the analysis.
+
+        Args:
+            daily (pd.DataFrame): Per-(manager, day) statistics with the sum in
+                microseconds (``response_time_sum_us``).
+            daily_sketch (pd.DataFrame): Per-(manager, day) quantile sketches, or None.
+        """
+        # В хранилище суммы за день хранятся в минутах
+        daily = daily.assign(
+            response_time_sum=daily["response_time_sum_us"] / US_PER_MINUTE
         )
+        if daily.empty:
+            if self.period_start is None or self.period_end is None:
+                return
+            daily = pd.DataFrame(columns=["manager_id", "day", *STAT_COLUMNS])
+
+        # Первый и последний день, целиком попавшие в отчётный период
+        if self.period_start is None:
+            first_day = int(daily["day"].min())
+        else:
+            # День начала периода учитывается, только если период начался в полночь
+            start = math.ceil(self.period_start.timestamp())
+            first_day = int(self.daily_store.day_numbers(start - 1)) + 1
+        if self.period_end is None:
+            last_day = int(daily["day"].max())
+        else:
+            end = math.floor(self.period_end.timestamp())
+            last_day = int(self.daily_store.day_numbers(end)) - 1
+        if first_day > last_day:
+            return
+
+        try:
+            with self.metrics.stage("analyze.save_daily_stats", rows_in=len(daily)):
+                self.daily_store.replace_days(
+                    daily, first_day, last_day, sketches=daily_sketch
+                )
+        except Exception as e:
+            logger.error(f"Daily statistics were not saved: {e}")
+
+    @staticmethod
+    def _merge_summaries(summaries: list[pd.DataFrame]) -> pd.DataFrame:
+        """
+        Merge partial aggregates computed on disjoint parts of the messages.
 
-        return responses_df
+        Args:
+            summaries (list[pd.DataFrame]): Partial aggregates from ``_summarize_response_times``.
 
+        Returns:
+            pd.DataFrame: Combined per-manager aggregates.
+        """
+        return (
+            pd.concat(summaries, ignore_index=True)
+            .groupby("manager_id")[["response_time_sum_us", "response_count"]]
+            .sum()
+            .reset_index()
+        )
+
+    @measure_stage("analyze.calculate_average_response_time")
     def _calculate_average_response_time(
-        self, responses_df: pd.DataFrame, df_managers: pd.DataFrame
+        self, response_summary: pd.DataFrame, df_managers: pd.DataFrame
     ) -> pd.DataFrame:
         """
         Calculate the average response time for each manager.
 
         Args:
-            responses_df (pd.DataFrame): Dataframe with response times.
+            response_summary (pd.DataFrame): Per-manager partial aggregates of response times.
             df_managers (pd.DataFrame): Dataframe with manager details.
 
         Returns:
             pd.DataFrame: Dataframe with average response time per manager.
         """
-        # Объединение с таблицей менеджеров
-        responses_df = responses_df.merge(
-            df_managers, left_on="manager_id", right_on="mop_id"
+        # Имена менеджеров ищем по индексу таблицы менеджеров вместо объединения таблиц
+        # (при повторе mop_id берётся первая строка); ответы менеджеров, которых нет
+        # в таблице, не учитываются
+        df_managers = df_managers.drop_duplicates("mop_id")
+        positions = pd.Index(df_managers["mop_id"]).get_indexer(
+            response_summary["manager_id"]
+        )
+        is_known = positions >= 0
+        response_summary = pd.DataFrame(
+            {
+                "name_mop": df_managers["name_mop"].to_numpy()[positions[is_known]],
+                "response_time_sum_us": response_summary[
+                    "response_time_sum_us"
+                ].to_numpy()[is_known],
+                "response_count": response_summary["response_count"].to_numpy()[
+                    is_known
+                ],
+            }
         )
 
         # Расчёт среднего времени ответа для каждого менеджера
+        totals = response_summary.groupby("name_mop")[
+            ["response_time_sum_us", "response_count"]
+        ].sum()
         average_response_time = (
-            responses_df.groupby("name_mop")["response_time"].mean().reset_index()
-        )
-        # Переименовываем столбец и округляем
-        average_response_time.rename(
-            columns={"response_time": "avg_response_time_minutes"}, inplace=True
+            (
+                totals["response_time_sum_us"]
+                / (totals["response_count"] * US_PER_MINUTE)
+            )
+            .rename("avg_response_time_minutes")
+            .reset_index()
         )
+        # Округляем
         average_response_time["avg_response_time_minutes"] = average_response_time[
             "avg_response_time_minutes"
         ].round(2)
 
-        average_response_time.sort_values(by="avg_response_time_minutes", inplace=True)
-        average_response_time = average_response_time.reset_index(drop=True)
+        return average_response_time.sort_values(
+            by="avg_response_time_minutes"
+        ).reset_index(drop=True)
 
-        return average_response_time
+    @measure_stage("analyze.attach_rops")
+    def _attach_rops(
+        self,
+        average_response_time: pd.DataFrame,
+        df_managers: pd.DataFrame,
+        df_rops: pd.DataFrame,
+    ) -> pd.DataFrame:
+        """
+        Add the ROP name of every manager to the result.
+
+        Args:
+            average_response_time (pd.DataFrame): Dataframe with average response time per manager.
+            df_managers (pd.DataFrame): Dataframe containing manager details.
+            df_rops (pd.DataFrame): Dataframe containing additional rop details.
+
+        Returns:
+            pd.DataFrame: Dataframe with average response time and ROP name per manager.
+        """
+        # Поиск по индексам небольших таблиц менеджеров и РОПов вместо объединений.
+        # Входные таблицы не изменяются; rop_id сравниваются как строки, так как
+        # в таблицах они могут иметь разные типы
+        df_managers = df_managers.drop_duplicates("name_mop")
+        df_rops = df_rops.drop_duplicates("rop_id")
+        manager_positions = pd.Index(df_managers["name_mop"]).get_indexer(
+            average_response_time["name_mop"]
+        )
+        rop_ids = df_managers["rop_id"].astype(str).to_numpy()[manager_positions]
+        rop_ids[manager_positions < 0] = None
+
+        rop_positions = pd.Index(df_rops["rop_id"].astype(str)).get_indexer(rop_ids)
+        rop_names = df_rops["rop_name"].to_numpy(dtype=object)[rop_positions]
+        rop_names[rop_positions < 0] = np.nan
+
+        return average_response_time.assign(rop_name=rop_names)
+
+    def _attach_percentiles(
+        self,
+        average_response_time: pd.DataFrame,
+        sketch: pd.DataFrame,
+        df_managers: pd.DataFrame,
+    ) -> pd.DataFrame:
+        """
+        Add the percentiles of the response time of every manager to the result.
+
+        Args:
+            average_response_time (pd.DataFrame): Dataframe with average response time per manager.
+            sketch (pd.DataFrame): Per-manager quantile sketches.
+            df_managers (pd.DataFrame): Dataframe containing manager details.
+
+        Returns:
+            pd.DataFrame: The result with one column per percentile.
+        """
+        with self.metrics.stage("analyze.attach_percentiles", rows_in=len(sketch)):
+            # Скетчи менеджеров объединяются по имени, так же как суммы для среднего
+            df_managers = df_managers.drop_duplicates("mop_id")
+            positions = pd.Index(df_managers["mop_id"]).get_indexer(
+                sketch["manager_id"]
+            )
+            is_known = positions >= 0
+            named_sketch = pd.DataFrame(
+                {
+                    "name_mop": df_managers["name_mop"].to_numpy()[positions[is_known]],
+                    "bucket": sketch["bucket"].to_numpy()[is_known],
+                    "count": sketch["count"].to_numpy()[is_known],
+                }
+            )
+            quantiles = self.sketch.quantiles(
+                self.sketch.merge([named_sketch], ["name_mop"]),
+                ["name_mop"],
+                self.percentiles,
+            )
+
+            positions = pd.Index(quantiles["name_mop"]).get_indexer(
+                average_response_time["name_mop"]
+            )
+            return average_response_time.assign(
+                **{
+                    column: quantiles[column].to_numpy()[positions].round(2)
+                    for column in quantiles.columns.drop("name_mop")
+                }
+            )
+
+    def _summarize_responses(self, responses_df: pd.DataFrame) -> dict:
+        """
+        Reduce response times to mergeable partial aggregates.
+
+        Args:
+            responses_df (pd.DataFrame): Dataframe with response times.
+
+        Returns:
+            dict: ``summary`` (per-manager sums and counts) and, when enabled, ``daily``
+            (per-(manager, day) statistics), ``sketch`` (per-manager quantile sketches)
+            and ``daily_sketch`` (per-(manager, day) quantile sketches).
+        """
+        partials = {"summary": self._summarize_response_times(responses_df)}
+
+        if self.daily_store is not None:
+            responses_df = responses_df.assign(
+                day=self.daily_store.day_numbers(responses_df["created_at"])
+            )
+            partials["daily"] = self._summarize_daily_response_times(responses_df)
+
+        if self.percentiles:
+            with self.metrics.stage(
+                "analyze.summarize_sketches", rows_in=len(responses_df)
+            ):
+                partials["sketch"] = self.sketch.summarize(responses_df, ["manager_id"])
+                if self.daily_store is not None:
+                    partials["daily_sketch"] = self.sketch.summarize(
+                        responses_df, ["manager_id", "day"]
+                    )
+
+        return partials
+
+    def _merge_partials(self, partials: list[dict]) -> dict:
+        """
+        Merge partial aggregates computed on disjoint parts of the messages.
+
+        Args:
+            partials (list[dict]): Partial aggregates from ``_summarize_responses``.
+
+        Returns:
+            dict: Combined partial aggregates.
+        """
+        mergers = {
+            "summary": self._merge_summaries,
+            "daily": self._merge_daily_summaries,
+            "sketch": lambda sketches: self.sketch.merge(sketches, ["manager_id"]),
+            "daily_sketch": lambda sketches: self.sketch.merge(
+                sketches, ["manager_id", "day"]
+            ),
+        }
+        return {
+            name: mergers[name]([part[name] for part in partials])
+            for name in partials[0]
+        }
 
     def analyze_result(
         self,
@@ -260,21 +763,123 @@ class ChatResponseAnalyzer:
         df_chat_messages = self._preprocess_messages(df_chat_messages)
         filtered_messages = self._filter_messages(df_chat_messages)
         responses_df = self._calculate_response_times(filtered_messages)
-        average_response_time = self._calculate_average_response_time(
-            responses_df, df_managers
+        average_response_time = self._finalize_summary(
+            self._summarize_responses(responses_df), df_managers, df_rops
         )
 
-        df_managers["rop_id"] = df_managers["rop_id"].astype(str)
-        merged_df = average_response_time.merge(
-            df_managers[["name_mop", "rop_id"]], on="name_mop", how="left"
+        logger.info("The calculations have been carried out successfully.")
+
+        return average_response_time
+
+    def _summarize_chunk(
+        self, chunk: pd.DataFrame, carry: pd.DataFrame = None
+    ) -> tuple[dict, pd.DataFrame]:
+        """
+        Calculate partial aggregates for one chunk of ordered messages.
+
+        Args:
+            chunk (pd.DataFrame): Chunk of chat messages ordered by ``entity_id`` and ``created_at``.
+            carry (pd.DataFrame): Start of the last block of the previous chunk, or None.
+
+        Returns:
+            tuple[dict, pd.DataFrame]: Partial aggregates of the chunk (None for a chunk
+            without replies) and the carry for the next chunk.
+        """
+        if chunk.empty:
+            return None, carry
+
+        chunk = self._preprocess_messages(chunk)
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+
+        filtered_messages = self._filter_messages(chunk)
+        responses_df = self._calculate_response_times(filtered_messages)
+
+        # Начало последнего блока переносим в следующий чанк: оно определяет
+        # и границу блока, и пару входящее→исходящее на стыке чанков
+        carry = filtered_messages.iloc[[-1]]
+
+        if responses_df.empty:
+            return None, carry
+        return self._summarize_responses(responses_df), carry
+
+    def _finalize_summary(
+        self,
+        partials: dict,
+        df_managers: pd.DataFrame,
+        df_rops: pd.DataFrame,
+    ) -> pd.DataFrame:
+        """
+        Turn merged partial aggregates into the final table and save the daily statistics.
+
+        Args:
+            partials (dict): Merged partial aggregates, or None if there were no messages.
+            df_managers (pd.DataFrame): Dataframe containing manager details.
+            df_rops (pd.DataFrame): Dataframe containing additional rop details.
+
+        Returns:
+            pd.DataFrame: Dataframe with average response time, ROP name and percentiles
+            per manager.
+        """
+        if partials is None:
+            partials = self._summarize_responses(
+                pd.DataFrame(
+                    {
+                        "manager_id": pd.Series(dtype="Int64"),
+                        "created_at": pd.Series(dtype="int64"),
+                        "response_time": pd.Series(dtype="float64"),
+                        "response_time_us": pd.Series(dtype="int64"),
+                    }
+                )
+            )
+
+        if self.daily_store is not None:
+            self._save_daily_summary(partials["daily"], partials.get("daily_sketch"))
+
+        average_response_time = self._calculate_average_response_time(
+            partials["summary"], df_managers
+        )
+        average_response_time = self._attach_rops(
+            average_response_time, df_managers, df_rops
         )
+        if self.percentiles:
+            average_response_time = self._attach_percentiles(
+                average_response_time, partials["sketch"], df_managers
+            )
+        return average_response_time
+
+    def analyze_chunks(
+        self,
+        chunks: Iterable[pd.DataFrame],
+        df_managers: pd.DataFrame,
+        df_rops: pd.DataFrame,
+    ) -> pd.DataFrame:
+        """
+        Analyze chat messages delivered in chunks, keeping only one chunk in memory.
+
+        Chunks must arrive ordered by ``entity_id`` and ``created_at`` (as produced by
+        ``DatabaseExtractor.stream_chat_messages``). The first message of the last block
+        of every chunk is carried over, so blocks and incoming→outgoing pairs spanning a
+        chunk boundary are handled the same way as in ``analyze_result``.
+
+        Args:
+            chunks (Iterable[pd.DataFrame]): Ordered chunks of chat messages.
+            df_managers (pd.DataFrame): Dataframe containing manager details.
+            df_rops (pd.DataFrame): Dataframe containing additional rop details.
+
+        Returns:
+            pd.DataFrame: Dataframe with average response time per manager.
+        """
+        partials = PartialsBuffer(self)
+        carry = None
+
+        for chunk in chunks:
+            chunk_partials, carry = self._summarize_chunk(chunk, carry)
+            partials.add(chunk_partials)
 
-        df_rops["rop_id"] = df_rops["rop_id"].astype(str)
-        merged_df = merged_df.merge(
-            df_rops[["rop_id", "rop_name"]], on="rop_id", how="left"
+        average_response_time = self._finalize_summary(
+            partials.result(), df_managers, df_rops
         )
-        average_response_time = merged_df.drop(columns=["rop_id"])
-        average_response_time["rop_name"] = merged_df["rop_name"]
 
         logger.info("The calculations have been carried out successfully.")
 
@@ -1,10 +1,100 @@
+import json
 import os
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator
 
 import pandas as pd
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
 from loguru import logger
 from tenacity import retry, stop_after_delay, wait_fixed
 
+from .data_processing import ChatResponseAnalyzer
+from .metrics import MetricsRecorder, record_retry
+from .query_builder import QueryBuilder
+from .utils import DirectoryValidator, FileHandler
+
+# PostgreSQL type OIDs of the result columns loaded by the COPY backend
+INTEGER_TYPES = {20, 21, 23}  # int8, int2, int4
+FLOAT_TYPES = {700, 701, 1700}  # float4, float8, numeric
+BOOLEAN_TYPES = {16}
+TIMESTAMP_TYPES = {1082, 1114}  # date, timestamp
+TIMESTAMPTZ_TYPES = {1184}
+# COPY sends one message per row: buffer the pipe so rows cross it in large blocks
+PIPE_BUFFER_SIZE = 1 << 20
+
+
+class _CountingWriter:
+    """
+    File-like wrapper counting the bytes written through it.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.bytes = 0
+
+    def write(self, data: bytes) -> int:
+        self.bytes += len(data)
+        return self.file.write(data)
+
+
+def _csv_types(columns: list[tuple]) -> dict:
+    """
+    Builds the ``pd.read_csv`` type arguments for a COPY result.
+
+    :param columns: ``(name, type OID)`` of the result columns.
+    :return: ``dtype``, ``parse_dates`` and boolean literal arguments of ``pd.read_csv``.
+    """
+    dtype, parse_dates = {}, []
+    for name, type_code in columns:
+        if type_code in INTEGER_TYPES:
+            # The parser infers int64, or float64 when there are NULLs, as read_sql
+            # returns them; the nullable Int64 parser is several times slower
+            continue
+        if type_code in FLOAT_TYPES:
+            dtype[name] = "float64"
+        elif type_code in BOOLEAN_TYPES:
+            dtype[name] = "boolean"
+        elif type_code in TIMESTAMP_TYPES:
+            parse_dates.append(name)
+        elif type_code not in TIMESTAMPTZ_TYPES:
+            # Text and every other type keep the server's text representation
+            dtype[name] = str
+    return {
+        "dtype": dtype,
+        "parse_dates": parse_dates,
+        "true_values": ["t"],
+        "false_values": ["f"],
+    }
+
+
+def _convert_csv_types(df: pd.DataFrame, columns: list[tuple]) -> pd.DataFrame:
+    """
+    Brings a parsed COPY result to the dtypes ``pd.read_sql_query`` returns.
+
+    :param df: Frame parsed with the arguments of ``_csv_types``.
+    :param columns: ``(name, type OID)`` of the result columns.
+    :return: The frame with NULLs as NaN in numeric columns and as None elsewhere.
+    """
+    for name, type_code in columns:
+        column = df[name]
+        if type_code in BOOLEAN_TYPES:
+            df[name] = (
+                column.astype(object).where(column.notna(), None)
+                if column.hasnans
+                else column.astype(bool)
+            )
+        elif type_code in TIMESTAMPTZ_TYPES:
+            df[name] = pd.to_datetime(column, utc=True)
+        elif (
+            type_code not in INTEGER_TYPES | FLOAT_TYPES | TIMESTAMP_TYPES
+            and column.hasnans
+        ):
+            df[name] = column.astype(object).where(column.notna(), None)
+    return df
+
 
 class DatabaseExtractor:
     def __init__(
@@ -16,6 +106,20 @@ class DatabaseExtractor:
         db_password: str,
         output_folder: str = None,
         queries: dict = None,
+        cache_folder: str = None,
+        incremental_queries: dict = None,
+        watermark_column: str = "created_at",
+        overlap: int = 3600,
+        stream_query: str | tuple = None,
+        fetch_size: int = 50_000,
+        query_builder: QueryBuilder = None,
+        backend: str = "read_sql",
+        snapshot_folder: str = None,
+        keep_alive: bool = False,
+        pool_size: int = 3,
+        metrics: MetricsRecorder = None,
+        compact_dtypes: bool = False,
+        fingerprint_query: str | tuple = None,
     ):
         """
         Initializes the DatabaseExtractor with database connection parameters and the folder to save CSV files.
@@ -26,19 +130,90 @@ class DatabaseExtractor:
         :param db_user: Username for the database.
         :param db_password: Password for the database.
         :param output_folder: Folder where CSV files will be saved. Default is None (no CSV saving).
-        :param queries: A dictionary of SQL queries. Defaults to fetching all rows from the tables.
+        :param queries: A dictionary of SQL queries, either plain strings or ``(sql, params)`` tuples.
+            Defaults to the queries produced by ``query_builder``.
+        :param cache_folder: Folder for the locally cached history and high-water marks used by the
+            incremental mode. Default is None (incremental mode unavailable).
+        :param incremental_queries: A dictionary of SQL queries (or ``(sql, params)`` tuples) fetching
+            rows newer than the ``%(watermark)s`` parameter. Tables missing here are always fetched in full.
+        :param watermark_column: Monotonic column (e.g. ``created_at`` or ``id``) used as the high-water mark.
+        :param overlap: Overlap window subtracted from the high-water mark to pick up late arrivals,
+            in units of the watermark column (seconds for ``created_at``).
+        :param stream_query: SQL query (or ``(sql, params)`` tuple) used by the streaming mode.
+            It must return chat messages ordered by ``entity_id`` and ``created_at``.
+        :param fetch_size: Number of rows fetched from the server-side cursor per round trip
+            (and per yielded chunk) in the streaming mode.
+        :param query_builder: Builder of the default queries. Defaults to a builder projecting the
+            columns and message types required by ChatResponseAnalyzer, without a time window.
+        :param backend: How query results are loaded: ``"read_sql"`` (``pd.read_sql_query``) or
+            ``"copy"`` (``COPY ... TO STDOUT`` streamed into the pandas C CSV parser with the
+            column types of the result).
+        :param snapshot_folder: Folder where columnar (Arrow IPC) snapshots of the extracted tables
+            are saved. Default is None (no snapshots).
+        :param keep_alive: If True, the pooled connections used by ``extract_and_save_data`` stay
+            open between calls (after a health check) until ``close`` is called.
+        :param pool_size: Maximum number of pooled connections, i.e. the number of tables
+            extracted concurrently.
+        :param metrics: Recorder of the extraction timings, row counts, DB bytes (COPY backend) and
+            retries. Default is a new recorder.
+        :param compact_dtypes: If True, chat messages are converted to the compact layout of
+            ``ChatResponseAnalyzer.compact_messages`` right after they are read.
+        :param fingerprint_query: SQL query (or ``(sql, params)`` tuple) returning one row that
+            changes whenever the extracted inputs change. Defaults to ``query_builder.fingerprint()``
+            (message count, maximum id and ``created_at``, checksums of managers and rops).
         """
+        if backend not in ("read_sql", "copy"):
+            raise ValueError(f"Unknown extraction backend: {backend}")
+
         self.db_host = db_host
         self.db_port = db_port
         self.db_name = db_name
         self.db_user = db_user
         self.db_password = db_password
         self.output_folder = output_folder
+        self.query_builder = query_builder or QueryBuilder(
+            columns=ChatResponseAnalyzer.REQUIRED_COLUMNS,
+            message_types=ChatResponseAnalyzer.MESSAGE_TYPES,
+        )
         self.queries = queries or {
-            "chat_messages": "SELECT * FROM test.chat_messages;",
-            "managers": "SELECT * FROM test.managers;",
-            "rops": "SELECT * FROM test.rops;",
+            "chat_messages": self.query_builder.select("chat_messages"),
+            "managers": self.query_builder.select("managers"),
+            "rops": self.query_builder.select("rops"),
         }
+        self.cache_folder = cache_folder
+        self.incremental_queries = incremental_queries or {
+            "chat_messages": self.query_builder.select(
+                "chat_messages", watermark_column=watermark_column
+            ),
+        }
+        self.watermark_column = watermark_column
+        self.overlap = overlap
+        self.stream_query = stream_query or self.query_builder.select(
+            "chat_messages", order_by=("entity_id", "created_at")
+        )
+        self.fingerprint_query = fingerprint_query or self.query_builder.fingerprint()
+        self.fetch_size = fetch_size
+        self.backend = backend
+        self.snapshot_folder = snapshot_folder
+        self.keep_alive = keep_alive
+        self.pool_size = pool_size
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._watermarks_lock = threading.Lock()
+        self.metrics = metrics or MetricsRecorder()
+        self.compact_dtypes = compact_dtypes
+
+    def __getstate__(self) -> dict:
+        # Connections and locks cannot be sent to a child process; the copy opens its own pool
+        state = self.__dict__.copy()
+        del state["_pool_lock"], state["_watermarks_lock"]
+        state["_pool"] = None
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._pool_lock = threading.Lock()
+        self._watermarks_lock = threading.Lock()
 
     def connect_to_db(self) -> psycopg2.extensions.connection:
         """
@@ -60,43 +235,539 @@ class DatabaseExtractor:
             logger.error(f"Error connecting to the database: {e}")
             raise
 
-    @retry(stop=stop_after_delay(60), wait=wait_fixed(5))
-    def extract_and_save_data(self, save_to_csv: bool = False) -> dict:
+    def _get_pool(self) -> ThreadedConnectionPool:
         """
-        Extracts data from the database using predefined or custom SQL queries and optionally saves them as CSV files.
+        Returns the connection pool, creating it on first use.
 
-        :param save_to_csv: If True, saves the extracted data to CSV files.
-        :return: A dictionary where keys are table names and values are the corresponding DataFrames.
+        :return: Thread-safe pool of at most ``pool_size`` connections.
         """
-        data_frames = {}
+        with self._pool_lock:
+            if self._pool is None or self._pool.closed:
+                # The pool keeps at most minconn idle connections and closes the rest
+                self._pool = ThreadedConnectionPool(
+                    self.pool_size if self.keep_alive else 0,
+                    self.pool_size,
+                    host=self.db_host,
+                    port=self.db_port,
+                    dbname=self.db_name,
+                    user=self.db_user,
+                    password=self.db_password,
+                )
+                logger.info(f"Database connection pool of {self.pool_size} created.")
+            return self._pool
+
+    @staticmethod
+    def _is_alive(conn: psycopg2.extensions.connection) -> bool:
+        """
+        Checks that a connection is open and the server responds.
 
+        :param conn: Database connection object.
+        :return: True if the connection can be used.
+        """
+        if conn.closed:
+            return False
         try:
-            conn = self.connect_to_db()
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except psycopg2.Error as e:
+            logger.warning(f"Database connection is broken: {e}")
+            return False
+
+    def _acquire_connection(self) -> psycopg2.extensions.connection:
+        """
+        Takes a connection from the pool. Broken connections are discarded and replaced.
+
+        :return: Database connection object.
+        """
+        pool = self._get_pool()
+        conn = pool.getconn()
+        if not self._is_alive(conn):
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+        return conn
+
+    def _release_connection(self, conn: psycopg2.extensions.connection) -> None:
+        """
+        Ends the transaction of a connection and returns it to the pool.
+
+        :param conn: Database connection object.
+        """
+        close = conn.closed
+        if not close:
+            try:
+                # End the read transaction so the session does not stay
+                # "idle in transaction" until the next run
+                conn.rollback()
+            except psycopg2.Error as e:
+                logger.warning(f"Error ending the transaction: {e}")
+                close = True
+        self._pool.putconn(conn, close=close)
+
+    def close(self) -> None:
+        """
+        Closes all pooled connections.
+        """
+        with self._pool_lock:
+            if self._pool is not None and not self._pool.closed:
+                self._pool.closeall()
+                logger.info("Database connections closed.")
+            self._pool = None
+
+    def _read_query(
+        self, conn: psycopg2.extensions.connection, query, params: dict = None
+    ) -> pd.DataFrame:
+        """
+        Runs a query given as a plain string or a ``(sql, params)`` tuple with the configured backend.
+
+        :param conn: Open database connection.
+        :param query: SQL query or ``(sql, params)`` tuple.
+        :param params: Extra parameters merged into the query parameters.
+        :return: The query result.
+        """
+        if isinstance(query, tuple):
+            query, query_params = query
+            params = {**query_params, **(params or {})}
+
+        if self.backend == "copy":
+            return self._copy_query(conn, query, params or None)
+
+        with warnings.catch_warnings():
+            # psycopg2 connections work with read_sql_query, SQLAlchemy is not required
+            warnings.filterwarnings(
+                "ignore",
+                category=UserWarning,
+                message="pandas only supports SQLAlchemy connectable",
+            )
+            return pd.read_sql_query(query, conn, params=params or None)
+
+    def _copy_query(
+        self, conn: psycopg2.extensions.connection, query: str, params: dict = None
+    ) -> pd.DataFrame:
+        """
+        Loads a query result with ``COPY (query) TO STDOUT``.
+
+        The server streams the result as CSV through a pipe into the pandas C parser, so
+        neither per-row Python objects nor a copy of the whole result are built. Column
+        types are taken from the result description instead of being guessed from the
+        text: text columns stay strings, integer columns become ``int64`` (``float64`` if
+        they hold NULLs, as with ``read_sql``), timestamps become datetimes. NULL is sent
+        as an unquoted ``\\N``, so it differs from an empty string and from text such as
+        ``"NA"`` or ``"null"``.
+
+        :param conn: Open database connection.
+        :param query: SQL query with ``%(name)s`` placeholders.
+        :param params: Query parameters.
+        :return: The query result.
+        """
+        with conn.cursor() as cursor:
+            select = cursor.mogrify(query, params).strip().rstrip(b";")
+            cursor.execute(b"SELECT * FROM (" + select + b") AS result LIMIT 0")
+            columns = [(column.name, column.type_code) for column in cursor.description]
+            copy = (
+                b"COPY ("
+                + select
+                + b") TO STDOUT WITH (FORMAT csv, HEADER true, NULL '\\N')"
+            )
 
-            for table_name, query in self.queries.items():
+            read_fd, write_fd = os.pipe()
+            copied = {}
+
+            def write_result() -> None:
                 try:
-                    df = pd.read_sql_query(query, conn)
-                    data_frames[table_name] = df
-                    logger.info(f"Data extracted from table: {table_name}")
+                    with os.fdopen(write_fd, "wb", buffering=PIPE_BUFFER_SIZE) as pipe:
+                        writer = _CountingWriter(pipe)
+                        cursor.copy_expert(copy, writer)
+                        copied["bytes"] = writer.bytes
+                except Exception as e:
+                    copied["error"] = e
 
-                    if save_to_csv and self.output_folder:
-                        output_path = os.path.join(
-                            self.output_folder, f"{table_name}.csv"
-                        )
-                        df.to_csv(output_path, index=False, encoding="utf-8")
-                        logger.info(
-                            f"Data from table {table_name} saved to {output_path}"
+            writer_thread = threading.Thread(target=write_result, daemon=True)
+            writer_thread.start()
+            try:
+                with os.fdopen(read_fd, "rb", buffering=PIPE_BUFFER_SIZE) as pipe:
+                    df = pd.read_csv(
+                        pipe,
+                        encoding=psycopg2.extensions.encodings[conn.encoding],
+                        keep_default_na=False,
+                        na_values=["\\N"],
+                        **_csv_types(columns),
+                    )
+            finally:
+                # If parsing failed, the closed read end aborts the COPY
+                writer_thread.join()
+                # COPY runs inside a transaction block; end it so the connection stays reusable
+                conn.rollback()
+        if "error" in copied:
+            raise copied["error"]
+        self.metrics.increment("db_bytes_fetched", copied["bytes"])
+        return _convert_csv_types(df, columns)
+
+    def _apply_schema(self, table_name: str, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Converts chat messages to the compact layout if ``compact_dtypes`` is set.
+
+        :param table_name: Name of the extracted table.
+        :param df: The extracted data.
+        :return: The data, compacted if it is the chat_messages table.
+        """
+        if self.compact_dtypes and table_name == "chat_messages":
+            return ChatResponseAnalyzer.compact_messages(df)
+        return df
+
+    def _watermarks_path(self) -> str:
+        return os.path.join(self.cache_folder, "watermarks.json")
+
+    def _history_path(self, table_name: str) -> str:
+        return os.path.join(self.cache_folder, f"{table_name}.arrow")
+
+    def _fingerprint_path(self) -> str:
+        return os.path.join(self.cache_folder, "fingerprint.json")
+
+    def _load_watermarks(self) -> dict:
+        """
+        Loads the persisted high-water marks.
+
+        :return: A dictionary where keys are table names and values are the last seen watermark.
+        """
+        if not os.path.isfile(self._watermarks_path()):
+            return {}
+        return FileHandler.read_json(self._watermarks_path())
+
+    def _extract_incremental(
+        self, conn: psycopg2.extensions.connection, table_name: str
+    ) -> pd.DataFrame:
+        """
+        Fetches only rows newer than the stored high-water mark (minus the overlap window)
+        and merges them into the locally cached history.
+
+        :param conn: Open database connection.
+        :param table_name: Name of the table to extract.
+        :return: The full history of the table after the merge.
+        """
+        watermark = self._load_watermarks().get(table_name)
+        history_path = self._history_path(table_name)
+
+        history = None
+        if watermark is not None and os.path.isfile(history_path):
+            df_new = self._apply_schema(
+                table_name,
+                self._read_query(
+                    conn,
+                    self.incremental_queries[table_name],
+                    params={"watermark": watermark - self.overlap},
+                ),
+            )
+            logger.info(
+                f"Fetched {len(df_new)} rows from table {table_name} "
+                f"newer than {watermark - self.overlap}."
+            )
+            cached = FileHandler.read_snapshot(history_path, memory_map=False)
+            if list(cached.columns) != list(df_new.columns):
+                # A cache written with other columns (e.g. before the message id was
+                # selected) cannot be merged with the new rows
+                logger.info(
+                    f"Cached history of table {table_name} has other columns, "
+                    "full extraction."
+                )
+            else:
+                # Rows from the overlap window are already in the cache. Messages are
+                # de-duplicated by id, the fetched row replacing the cached one, so
+                # distinct messages with equal values are kept; tables without the id
+                # column are de-duplicated by whole rows
+                id_column = self.query_builder.id_column
+                history = pd.concat(
+                    [cached, df_new], ignore_index=True
+                ).drop_duplicates(
+                    subset=[id_column] if id_column in df_new.columns else None,
+                    keep="last",
+                    ignore_index=True,
+                )
+            del cached, df_new
+        else:
+            logger.info(f"No cached history for table {table_name}, full extraction.")
+
+        if history is None:
+            history = self._apply_schema(
+                table_name, self._read_query(conn, self.queries[table_name])
+            )
+
+        FileHandler.save_snapshot(
+            history,
+            history_path,
+            f"Cached history of table {table_name} saved to {history_path}",
+            f"Error saving cached history of table {table_name}:",
+        )
+
+        if not history.empty:
+            # Tables are extracted concurrently, re-read the file so other tables' marks are kept
+            with self._watermarks_lock:
+                watermarks = self._load_watermarks()
+                watermarks[table_name] = history[self.watermark_column].max().item()
+                FileHandler.save_json(
+                    watermarks,
+                    self._watermarks_path(),
+                    f"High-water mark of table {table_name}: {watermarks[table_name]}",
+                    "Error saving high-water marks:",
+                )
+
+        return history
+
+    def input_fingerprint(self, extra: dict = None) -> dict:
+        """
+        Computes a fingerprint of the inputs with one cheap aggregate query (no rows are
+        transferred).
+
+        :param extra: Additional JSON-serializable entries, e.g. settings the result depends on.
+        :return: The values of ``fingerprint_query``, the query itself (schema, time window and
+            message types) and ``extra``, as JSON-compatible values.
+        """
+        query, params = (
+            self.fingerprint_query
+            if isinstance(self.fingerprint_query, tuple)
+            else (self.fingerprint_query, None)
+        )
+        with self.metrics.stage("extract.fingerprint"):
+            conn = self._acquire_connection()
+            try:
+                with conn.cursor() as cursor:
+                    fingerprint = {
+                        "query": cursor.mogrify(query, params).decode(conn.encoding)
+                    }
+                    cursor.execute(query, params)
+                    fingerprint.update(
+                        zip(
+                            [column.name for column in cursor.description],
+                            cursor.fetchone(),
                         )
-                except Exception as e:
-                    logger.error(f"Error processing table {table_name}: {e}")
+                    )
+            finally:
+                self._release_connection(conn)
+        fingerprint.update(extra or {})
+        # Normalize database values (Decimal, datetime) to what is read back from the JSON file
+        return json.loads(json.dumps(fingerprint, default=str))
+
+    def inputs_unchanged(self, fingerprint: dict) -> bool:
+        """
+        Checks whether a fingerprint equals the one saved by ``save_fingerprint``.
+
+        :param fingerprint: Fingerprint from ``input_fingerprint``.
+        :return: True if the inputs have not changed since the fingerprint was saved.
+        """
+        if not self.cache_folder or not os.path.isfile(self._fingerprint_path()):
+            return False
+        return FileHandler.read_json(self._fingerprint_path()) == fingerprint
+
+    def save_fingerprint(self, fingerprint: dict) -> None:
+        """
+        Saves the fingerprint of the inputs of a successful run to ``cache_folder``.
+
+        :param fingerprint: Fingerprint from ``input_fingerprint``.
+        """
+        if not self.cache_folder:
+            raise ValueError("Saving the input fingerprint requires cache_folder.")
+        DirectoryValidator.create_directory_if_not_exists(self.cache_folder)
+        FileHandler.save_json(
+            fingerprint,
+            self._fingerprint_path(),
+            f"Input fingerprint saved to {self._fingerprint_path()}",
+            "Error saving the input fingerprint:",
+        )
+
+    def stream_chat_messages(self) -> Iterator[pd.DataFrame]:
+        """
+        Streams chat messages through a server-side (named) cursor.
+
+        Only ``fetch_size`` rows are held on the client at a time, so peak memory does not
+        depend on the size of the table. Chunks follow the order of ``stream_query``.
+
+        :return: An iterator of DataFrames with at most ``fetch_size`` rows each.
+        """
+        conn = self.connect_to_db()
+        try:
+            with conn.cursor(name="chat_messages_stream") as cursor:
+                cursor.itersize = self.fetch_size
+                if isinstance(self.stream_query, tuple):
+                    cursor.execute(*self.stream_query)
+                else:
+                    cursor.execute(self.stream_query)
+
+                columns = None
+                while True:
+                    with self.metrics.stage("extract.stream_chat_messages") as stage:
+                        rows = cursor.fetchmany(self.fetch_size)
+                        stage["rows_out"] = len(rows)
+                    if columns is None:
+                        columns = [column.name for column in cursor.description]
+                    if not rows:
+                        break
+                    yield self._apply_schema(
+                        "chat_messages",
+                        pd.DataFrame.from_records(rows, columns=columns),
+                    )
+
+            logger.info("Chat messages streamed successfully.")
+        except Exception as e:
+            logger.error(f"Error while streaming chat messages: {e}")
+            raise
+        finally:
+            conn.close()
+            logger.info("Database connection closed.")
+
+    @staticmethod
+    def load_snapshot(
+        snapshot_folder: str, tables: list[str] = None, memory_map: bool = True
+    ) -> dict:
+        """
+        Loads tables from columnar snapshots saved by ``extract_and_save_data``.
+
+        :param snapshot_folder: Folder with the ``<table>.arrow`` snapshots.
+        :param tables: Names of the tables to load. Defaults to all snapshots in the folder.
+        :param memory_map: If True, snapshots are memory-mapped (zero-copy for numeric columns).
+        :return: A dictionary where keys are table names and values are the corresponding DataFrames.
+        """
+        if tables is None:
+            tables = sorted(
+                os.path.splitext(file_name)[0]
+                for file_name in os.listdir(snapshot_folder)
+                if file_name.endswith(".arrow")
+            )
+
+        data_frames = {}
+        for table_name in tables:
+            snapshot_path = os.path.join(snapshot_folder, f"{table_name}.arrow")
+            data_frames[table_name] = FileHandler.read_snapshot(
+                snapshot_path, memory_map=memory_map
+            )
+            logger.info(f"Data of table {table_name} loaded from {snapshot_path}")
+
+        return data_frames
+
+    @retry(
+        stop=stop_after_delay(60),
+        wait=wait_fixed(5),
+        reraise=True,
+        before_sleep=record_retry,
+    )
+    def _fetch_table(self, table_name: str, incremental: bool = False) -> pd.DataFrame:
+        """
+        Fetches one table on a pooled connection. Retried on its own, so a failure does not
+        re-fetch the other tables.
+
+        :param table_name: Name of the table to extract.
+        :param incremental: If True and the table is listed in ``incremental_queries``, it is
+            fetched from the stored high-water mark.
+        :return: The extracted table.
+        """
+        conn = self._acquire_connection()
+        try:
+            if incremental and table_name in self.incremental_queries:
+                return self._extract_incremental(conn, table_name)
+            return self._apply_schema(
+                table_name, self._read_query(conn, self.queries[table_name])
+            )
+        finally:
+            self._release_connection(conn)
+
+    def _extract_table(
+        self,
+        table_name: str,
+        save_to_csv: bool = False,
+        incremental: bool = False,
+        save_snapshot: bool = False,
+    ) -> pd.DataFrame:
+        """
+        Fetches one table and saves it as CSV and/or snapshot.
+
+        :param table_name: Name of the table to extract.
+        :param save_to_csv: If True, saves the table to a CSV file.
+        :param incremental: If True, uses the incremental mode for the table.
+        :param save_snapshot: If True, saves the table as a columnar snapshot.
+        :return: The extracted table.
+        """
+        with self.metrics.stage(f"extract.{table_name}") as stage:
+            df = self._fetch_table(table_name, incremental)
+            stage["rows_out"] = len(df)
+        logger.info(f"Data extracted from table: {table_name}")
+
+        if save_to_csv and self.output_folder:
+            output_path = os.path.join(self.output_folder, f"{table_name}.csv")
+            df.to_csv(output_path, index=False, encoding="utf-8")
+            logger.info(f"Data from table {table_name} saved to {output_path}")
+
+        if save_snapshot and self.snapshot_folder:
+            snapshot_path = os.path.join(self.snapshot_folder, f"{table_name}.arrow")
+            FileHandler.save_snapshot(
+                df,
+                snapshot_path,
+                f"Snapshot of table {table_name} saved to {snapshot_path}",
+                f"Error saving snapshot of table {table_name}:",
+            )
+
+        return df
+
+    def extract_and_save_data(
+        self,
+        save_to_csv: bool = False,
+        incremental: bool = False,
+        tables: list[str] = None,
+        save_snapshot: bool = False,
+    ) -> dict:
+        """
+        Extracts data from the database using predefined or custom SQL queries and optionally saves them as CSV files.
+
+        Tables are extracted concurrently, each on its own pooled connection, and each table is
+        retried separately.
+
+        :param save_to_csv: If True, saves the extracted data to CSV files.
+        :param incremental: If True, tables listed in ``incremental_queries`` are fetched from the
+            stored high-water mark and merged into the cached history in ``cache_folder``.
+        :param tables: Names of the tables to extract. Defaults to all tables in ``queries``.
+        :param save_snapshot: If True, saves the extracted data as columnar snapshots in
+            ``snapshot_folder``, which can be reloaded with ``load_snapshot``.
+        :return: A dictionary where keys are table names and values are the corresponding DataFrames.
+        """
+        if incremental:
+            if not self.cache_folder:
+                raise ValueError("Incremental extraction requires cache_folder.")
+            DirectoryValidator.create_directory_if_not_exists(self.cache_folder)
+        if save_snapshot and self.snapshot_folder:
+            DirectoryValidator.create_directory_if_not_exists(self.snapshot_folder)
+
+        table_names = [
+            table_name
+            for table_name in self.queries
+            if tables is None or table_name in tables
+        ]
+        data_frames = {}
+
+        try:
+            with ThreadPoolExecutor(
+                max_workers=max(min(self.pool_size, len(table_names)), 1)
+            ) as executor:
+                futures = {
+                    table_name: executor.submit(
+                        self._extract_table,
+                        table_name,
+                        save_to_csv,
+                        incremental,
+                        save_snapshot,
+                    )
+                    for table_name in table_names
+                }
+                for table_name, future in futures.items():
+                    try:
+                        data_frames[table_name] = future.result()
+                    except Exception as e:
+                        logger.error(f"Error processing table {table_name}: {e}")
 
         except Exception as e:
             logger.error(f"Error during data extraction: {e}")
             raise
 
         finally:
-            if "conn" in locals() and conn:
-                conn.close()
-                logger.info("Database connection closed.")
+            if not self.keep_alive:
+                self.close()
 
         return data_frames
@@ -0,0 +1,430 @@
+import functools
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Iterator
+
+import pandas as pd
+from loguru import logger
+
+from .utils import DirectoryValidator, FileHandler
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRIC_PREFIX = "average_response"
+
+# tracemalloc включается на весь процесс, а рекордеры арендаторов работают в потоках
+# одновременно: трассировку останавливает последний завершивший запуск рекордер
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False
+
+
+def _peak_rss_bytes() -> int:
+    """
+    Peak resident set size of the process, or None where it is not available.
+    """
+    if resource is None:
+        return None
+    # ru_maxrss в килобайтах на Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _acquire_tracemalloc() -> None:
+    """
+    Start tracemalloc for a run, unless another run or the caller already traces.
+    """
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0:
+            _tracemalloc_owned = not tracemalloc.is_tracing()
+            if _tracemalloc_owned:
+                tracemalloc.start()
+        _tracemalloc_users += 1
+
+
+def _release_tracemalloc() -> None:
+    """
+    Stop tracemalloc when the last tracing run finishes, if it was started here.
+    """
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+
+def record_retry(retry_state) -> None:
+    """
+    tenacity ``before_sleep`` callback counting retries of a method in ``self.metrics``.
+    """
+    instance = retry_state.args[0] if retry_state.args else None
+    metrics = getattr(instance, "metrics", None)
+    if metrics is not None:
+        metrics.increment("retries", operation=retry_state.fn.__name__)
+
+
+def measure_stage(name: str) -> Callable:
+    """
+    Decorator measuring a method as a stage in ``self.metrics``.
+
+    Rows in and out are taken from the first DataFrame argument and a DataFrame result.
+
+    Args:
+        name (str): Stage name.
+
+    Returns:
+        Callable: The decorator.
+    """
+
+    def decorator(method: Callable) -> Callable:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            frames = [arg for arg in args if isinstance(arg, pd.DataFrame)]
+            with self.metrics.stage(
+                name, rows_in=len(frames[0]) if frames else None
+            ) as stage:
+                result = method(self, *args, **kwargs)
+                if isinstance(result, pd.DataFrame):
+                    stage["rows_out"] = len(result)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+class MetricsRecorder:
+    """
+    Collects per-stage wall time, row counts and memory, plus counters (DB bytes fetched,
+    HTTP calls, retries) of one run, and exports them as a Prometheus textfile and a JSON
+    run record.
+
+    Stages with the same name within a run (e.g. one per chunk) are accumulated.
+
+    Peak RSS of the process never decreases, so in a long-running process it is reported
+    once per run, and a stage records how much it raised the peak instead.
+    """
+
+    def __init__(self, trace_memory: bool = False):
+        """
+        Initialize the recorder.
+
+        Args:
+            trace_memory (bool): If True, tracemalloc runs during a run and the peak of
+                traced memory is recorded per stage. Stages running concurrently share the
+                peak, so their values are approximate. Recorders of concurrent runs share
+                the tracing of the process, which stops when the last of them finishes.
+        """
+        self.trace_memory = trace_memory
+        self._lock = threading.Lock()
+        self._tracing = False
+        self.reset()
+
+    def __getstate__(self) -> dict:
+        # Блокировку нельзя передать в дочерний процесс
+        state = self.__dict__.copy()
+        del state["_lock"]
+        # Трассировку запущенного здесь запуска освобождает только этот процесс
+        state["_tracing"] = False
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def reset(self) -> None:
+        """
+        Forget the metrics of the previous run.
+        """
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+            self.started_at = None
+            self.duration = None
+            self.success = None
+            self.peak_rss = None
+
+    def start_run(self) -> None:
+        """
+        Reset the metrics and start timing a run.
+        """
+        self.reset()
+        self.started_at = datetime.now().astimezone()
+        self._run_start = time.perf_counter()
+        if self.trace_memory and not self._tracing:
+            _acquire_tracemalloc()
+            self._tracing = True
+
+    def finish_run(self, success: bool) -> None:
+        """
+        Stop timing the run.
+
+        Args:
+            success (bool): Whether the run finished without errors.
+        """
+        self.duration = time.perf_counter() - self._run_start
+        self.success = success
+        self.peak_rss = _peak_rss_bytes()
+        if self._tracing:
+            _release_tracemalloc()
+            self._tracing = False
+
+    @contextmanager
+    def stage(self, name: str, rows_in: int = None) -> Iterator[dict]:
+        """
+        Measure a stage.
+
+        Args:
+            name (str): Stage name, e.g. ``"analyze.filter_messages"``.
+            rows_in (int): Number of input rows.
+
+        Returns:
+            Iterator[dict]: A record where the caller may set ``rows_out``.
+        """
+        record = {"rows_in": rows_in, "rows_out": None}
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            traced_before = tracemalloc.get_traced_memory()[0]
+        rss_before = _peak_rss_bytes()
+
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - start
+            peak_traced = (
+                tracemalloc.get_traced_memory()[1] - traced_before if tracing else None
+            )
+            rss_growth = (
+                _peak_rss_bytes() - rss_before if rss_before is not None else None
+            )
+            self._add_stage(name, seconds, record, peak_traced, rss_growth)
+
+    def _add_stage(
+        self,
+        name: str,
+        seconds: float,
+        record: dict,
+        peak_traced: int,
+        rss_growth: int,
+    ) -> None:
+        with self._lock:
+            stage = self.stages.setdefault(
+                name,
+                {
+                    "calls": 0,
+                    "seconds": 0.0,
+                    "rows_in": None,
+                    "rows_out": None,
+                    "peak_traced_bytes": None,
+                    "rss_growth_bytes": None,
+                },
+            )
+            stage["calls"] += 1
+            stage["seconds"] += seconds
+            for key in ("rows_in", "rows_out"):
+                if record[key] is not None:
+                    stage[key] = (stage[key] or 0) + int(record[key])
+            if peak_traced is not None:
+                stage["peak_traced_bytes"] = max(
+                    stage["peak_traced_bytes"] or 0, peak_traced
+                )
+            if rss_growth is not None:
+                stage["rss_growth_bytes"] = (
+                    stage["rss_growth_bytes"] or 0
+                ) + rss_growth
+
+    def increment(self, name: str, value: int = 1, **labels) -> None:
+        """
+        Add to a counter, e.g. ``increment("http_calls", method="batchUpdate")``.
+
+        Args:
+            name (str): Counter name.
+            value (int): Amount to add.
+            **labels: Labels of the counter.
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def to_dict(self) -> dict:
+        """
+        Return the run record.
+
+        Returns:
+            dict: Run start, duration, status, peak RSS, stages and counters.
+        """
+        with self._lock:
+            return {
+                "started_at": self.started_at.isoformat() if self.started_at else None,
+                "duration_seconds": self.duration,
+                "success": self.success,
+                "peak_rss_bytes": self.peak_rss,
+                "stages": {name: dict(stage) for name, stage in self.stages.items()},
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in self.counters.items()
+                ],
+            }
+
+    @staticmethod
+    def _format_labels(labels: dict) -> str:
+        if not labels:
+            return ""
+        escaped = (
+            f'{key}="'
+            + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            + '"'
+            for key, value in labels.items()
+        )
+        return "{" + ",".join(escaped) + "}"
+
+    def to_prometheus(self) -> str:
+        """
+        Render the run in the Prometheus text exposition format.
+
+        All values describe the last run, so they are exported as gauges.
+
+        Returns:
+            str: Metrics for the node_exporter textfile collector.
+        """
+        record = self.to_dict()
+        samples = {}
+
+        def add(name: str, help_text: str, value, labels: dict = None) -> None:
+            if value is None:
+                return
+            metric = samples.setdefault(f"{METRIC_PREFIX}_{name}", (help_text, []))
+            metric[1].append((labels or {}, value))
+
+        if self.started_at is not None:
+            add(
+                "last_run_timestamp_seconds",
+                "Start time of the last run.",
+                self.started_at.timestamp(),
+            )
+        add("last_run_duration_seconds", "Wall time of the last run.", self.duration)
+        if self.success is not None:
+            add("last_run_success", "1 if the last run succeeded.", int(self.success))
+        add(
+            "peak_rss_bytes",
+            "Peak resident set size of the process at the end of the last run.",
+            self.peak_rss,
+        )
+
+        for name, stage in record["stages"].items():
+            labels = {"stage": name}
+            add(
+                "stage_duration_seconds",
+                "Wall time of a stage.",
+                stage["seconds"],
+                labels,
+            )
+            add("stage_calls", "Number of times a stage ran.", stage["calls"], labels)
+            add("stage_rows_in", "Rows a stage received.", stage["rows_in"], labels)
+            add("stage_rows_out", "Rows a stage produced.", stage["rows_out"], labels)
+            add(
+                "stage_peak_traced_bytes",
+                "Peak of memory traced by tracemalloc during a stage.",
+                stage["peak_traced_bytes"],
+                labels,
+            )
+            add(
+                "stage_rss_growth_bytes",
+                "Growth of the peak resident set size of the process during a stage.",
+                stage["rss_growth_bytes"],
+                labels,
+            )
+
+        for counter in record["counters"]:
+            add(
+                counter["name"],
+                f"Counter {counter['name']} of the last run.",
+                counter["value"],
+                counter["labels"],
+            )
+
+        lines = []
+        for name, (help_text, values) in samples.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in values:
+                lines.append(f"{name}{self._format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, file_path: str) -> None:
+        """
+        Write the metrics for the node_exporter textfile collector.
+
+        The file is replaced atomically, so the collector never reads a partial file.
+
+        Args:
+            file_path (str): Path of the ``.prom`` file.
+        """
+        if os.path.dirname(file_path):
+            DirectoryValidator.create_directory_if_not_exists(
+                os.path.dirname(file_path)
+            )
+        temporary_path = f"{file_path}.tmp"
+        try:
+            with open(temporary_path, "w", encoding="utf-8") as file:
+                file.write(self.to_prometheus())
+            os.replace(temporary_path, file_path)
+            logger.info(f"Metrics saved to {file_path}")
+        except Exception as e:
+            logger.error(f"Error saving metrics: {e}")
+            raise
+
+    def write_run_record(self, folder: str, keep: int = None) -> str:
+        """
+        Save the run record as ``run_<start time>.json``.
+
+        Args:
+            folder (str): Folder of the run records.
+            keep (int): Number of the latest records kept in the folder; older ones are
+                deleted. Default is None (all records are kept).
+
+        Returns:
+            str: Path of the saved record.
+        """
+        DirectoryValidator.create_directory_if_not_exists(folder)
+        started_at = self.started_at or datetime.now().astimezone()
+        file_path = os.path.join(
+            folder, f"run_{started_at.strftime('%Y%m%dT%H%M%S')}.json"
+        )
+        FileHandler.save_json(
+            self.to_dict(),
+            file_path,
+            f"Run record saved to {file_path}",
+            "Error saving the run record:",
+        )
+        if keep is not None:
+            self._prune_run_records(folder, keep)
+        return file_path
+
+    @staticmethod
+    def _prune_run_records(folder: str, keep: int) -> None:
+        # Время запуска в имени файла сортируется как строка
+        records = sorted(
+            file_name
+            for file_name in os.listdir(folder)
+            if file_name.startswith("run_") and file_name.endswith(".json")
+        )
+        outdated = records[: max(len(records) - keep, 0)]
+        try:
+            for file_name in outdated:
+                os.remove(os.path.join(folder, file_name))
+        except OSError as e:
+            logger.error(f"Error deleting old run records: {e}")
+            raise
+        if outdated:
+            logger.info(f"{len(outdated)} old run records deleted from {folder}")
@@ -0,0 +1,205 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from .data_processing import INCOMING_CODE, OUTGOING_CODE, ChatResponseAnalyzer
+
+
+def _summarize_shard(analyzer: ChatResponseAnalyzer, arrays: dict) -> dict:
+    """
+    Calculate partial aggregates for one shard of messages.
+
+    Args:
+        analyzer (ChatResponseAnalyzer): Analyzer with the working-hours settings.
+        arrays (dict): Columns of the shard, sorted by ``entity_id`` and ``created_at``.
+
+    Returns:
+        dict: Partial aggregates, see ``ChatResponseAnalyzer._summarize_responses``.
+    """
+    entity_ids = arrays["entity_id"]
+    type_codes = arrays["type"]
+
+    # Первые сообщения блоков: сменился тип сообщения или сделка
+    is_first_in_block = np.ones(len(entity_ids), dtype=bool)
+    is_first_in_block[1:] = (type_codes[1:] != type_codes[:-1]) | (
+        entity_ids[1:] != entity_ids[:-1]
+    )
+    first_idx = np.flatnonzero(is_first_in_block)
+    block_types = type_codes[first_idx]
+
+    manager_ids = arrays["created_by"][first_idx]
+
+    curr_idx, adjusted_response_time = analyzer._pair_responses(
+        entity_ids[first_idx],
+        block_types == INCOMING_CODE,
+        block_types == OUTGOING_CODE,
+        arrays["created_at"][first_idx],
+        manager_ids,
+    )
+    responses_df = pd.DataFrame(
+        {
+            "manager_id": manager_ids[curr_idx],
+            "created_at": arrays["created_at"][first_idx][curr_idx] // 10**9,
+            # Время ответа так же, как в _calculate_response_times
+            **analyzer._response_time_columns(adjusted_response_time),
+        }
+    )
+    return analyzer._summarize_responses(responses_df)
+
+
+def _analyze_shard(
+    analyzer: ChatResponseAnalyzer, columns: dict, start: int, stop: int
+) -> dict:
+    """
+    Worker entry point: attach to the shared memory and summarize one shard.
+
+    Only the partial aggregates (per manager, and per manager and day) are sent back
+    to the parent process.
+
+    Args:
+        analyzer (ChatResponseAnalyzer): Analyzer with the working-hours settings.
+        columns (dict): Column name -> (shared memory name, dtype, total length).
+        start (int): First row of the shard.
+        stop (int): Row after the last row of the shard.
+
+    Returns:
+        dict: Partial aggregates of the shard.
+    """
+    blocks = {}
+    arrays = {}
+    try:
+        for name, (shm_name, dtype, length) in columns.items():
+            blocks[name] = SharedMemory(name=shm_name)
+            arrays[name] = np.ndarray(length, dtype=dtype, buffer=blocks[name].buf)[
+                start:stop
+            ]
+        return _summarize_shard(analyzer, arrays)
+    finally:
+        # Массивы ссылаются на буферы разделяемой памяти, освобождаем их до закрытия
+        arrays.clear()
+        for block in blocks.values():
+            block.close()
+
+
+class ParallelChatResponseAnalyzer(ChatResponseAnalyzer):
+    """
+    A ChatResponseAnalyzer that computes response times on several cores.
+
+    Messages are hash-partitioned by ``entity_id`` (conversations are independent), the
+    partitions are placed in shared memory and processed by a pool of worker processes.
+    Workers return only the partial aggregates (per-manager sums and counts, and the
+    daily statistics and quantile sketches when enabled), which are merged in the parent.
+    """
+
+    def __init__(self, *args, workers: int = None, **kwargs):
+        """
+        Initialize the analyzer.
+
+        Args:
+            *args: Positional arguments of ChatResponseAnalyzer.
+            workers (int): Number of worker processes (and shards). Defaults to the CPU count.
+            **kwargs: Keyword arguments of ChatResponseAnalyzer.
+        """
+        super().__init__(*args, **kwargs)
+        self.workers = workers or os.cpu_count()
+
+    def _to_shared_memory(self, arrays: dict) -> tuple[dict, dict]:
+        """
+        Copy arrays into new shared memory blocks.
+
+        Args:
+            arrays (dict): Column name -> NumPy array.
+
+        Returns:
+            tuple[dict, dict]: Shared memory blocks and their descriptions for the workers.
+        """
+        blocks = {}
+        columns = {}
+        try:
+            for name, array in arrays.items():
+                block = SharedMemory(create=True, size=max(array.nbytes, 1))
+                blocks[name] = block
+                np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+                columns[name] = (block.name, array.dtype.str, len(array))
+        except Exception:
+            self._release_shared_memory(blocks)
+            raise
+        return blocks, columns
+
+    @staticmethod
+    def _release_shared_memory(blocks: dict) -> None:
+        for block in blocks.values():
+            block.close()
+            block.unlink()
+
+    def analyze_result(
+        self,
+        df_chat_messages: pd.DataFrame,
+        df_managers: pd.DataFrame,
+        df_rops: pd.DataFrame,
+    ) -> pd.DataFrame:
+        """
+        Analyze chat messages on several cores, calculate average response times
+
+        Args:
+            df_chat_messages (pd.DataFrame): Dataframe containing chat messages.
+            df_managers (pd.DataFrame): Dataframe containing manager details.
+            df_rops (pd.DataFrame): Dataframe containing additional rop details.
+
+        Returns:
+            pd.DataFrame: Dataframe with average response time per manager.
+        """
+        df_chat_messages = self.compact_messages(df_chat_messages)
+        df_chat_messages = df_chat_messages[df_chat_messages["type"].notna()]
+
+        entity_ids = df_chat_messages["entity_id"].to_numpy()
+        created_at_ns = df_chat_messages["created_at"].to_numpy(np.int64) * 10**9
+
+        # Шард определяется хешем сделки, сортировка по шарду, сделке и времени
+        # делает каждый шард непрерывным отрезком массивов
+        shards = pd.util.hash_array(entity_ids) % np.uint64(self.workers)
+        order = np.lexsort((created_at_ns, entity_ids, shards))
+        bounds = np.searchsorted(shards[order], np.arange(self.workers + 1))
+
+        arrays = {
+            "entity_id": entity_ids[order],
+            "type": df_chat_messages["type"]
+            .cat.codes.to_numpy()[order]
+            .astype(np.uint8),
+            "created_at": created_at_ns[order],
+            "created_by": df_chat_messages["created_by"].to_numpy(
+                dtype=np.float64, na_value=np.nan
+            )[order],
+        }
+        del order
+
+        blocks, columns = self._to_shared_memory(arrays)
+        del arrays
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = [
+                    executor.submit(
+                        _analyze_shard, self, columns, bounds[i], bounds[i + 1]
+                    )
+                    for i in range(self.workers)
+                    if bounds[i] < bounds[i + 1]
+                ]
+                partials = [future.result() for future in futures]
+        finally:
+            self._release_shared_memory(blocks)
+
+        average_response_time = self._finalize_summary(
+            self._merge_partials(partials) if partials else None,
+            df_managers,
+            df_rops,
+        )
+
+        logger.info(
+            f"The calculations have been carried out successfully on {self.workers} shards."
+        )
+
+        return average_response_time
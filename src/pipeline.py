@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import time
+
+import pandas as pd
+from loguru import logger
+
+from .data_processing import ChatResponseAnalyzer, PartialsBuffer
+from .get_data_db import DatabaseExtractor
+from .save_data_google_sheets import GoogleSheetsHandler
+
+# Маркер конца потока чанков
+_END_OF_STREAM = object()
+
+
+class AsyncPipeline:
+    """
+    Runs extraction, analysis and upload concurrently instead of one after another.
+
+    Chat messages are streamed from the database by a background thread into a bounded
+    queue and summarized chunk by chunk in worker threads while the next chunks are being
+    fetched. The managers and rops tables and the Google Sheets state needed for the
+    upload are fetched at the same time, so after the last chunk only the final
+    aggregation and the upload of the changed cells remain.
+    """
+
+    def __init__(
+        self,
+        analyzer: ChatResponseAnalyzer,
+        db_extractor: DatabaseExtractor,
+        gs_handler: GoogleSheetsHandler,
+        range_name: str,
+        queue_size: int = 4,
+        diff: bool = True,
+    ):
+        """
+        Initialize the pipeline.
+
+        Args:
+            analyzer (ChatResponseAnalyzer): Analyzer with the working-hours settings.
+            db_extractor (DatabaseExtractor): Extractor used to stream chat messages and
+                fetch the managers and rops tables.
+            gs_handler (GoogleSheetsHandler): Handler used to upload the result.
+            range_name (str): The range of cells to write the result to.
+            queue_size (int): Maximum number of fetched chunks waiting for the analysis.
+            diff (bool): If True, the current values of the range are prefetched and only
+                the changed cells are uploaded.
+        """
+        self.analyzer = analyzer
+        self.db_extractor = db_extractor
+        self.gs_handler = gs_handler
+        self.range_name = range_name
+        self.queue_size = queue_size
+        self.diff = diff
+
+    def _stream(
+        self,
+        queue: asyncio.Queue,
+        loop: asyncio.AbstractEventLoop,
+        stop: threading.Event,
+    ) -> None:
+        """
+        Put chunks of chat messages into the queue. Runs in a background thread and blocks
+        while the queue is full.
+
+        Args:
+            queue (asyncio.Queue): Queue read by the analysis stage.
+            loop (asyncio.AbstractEventLoop): Event loop owning the queue.
+            stop (threading.Event): Set when the pipeline no longer needs chunks.
+        """
+        chunks = self.db_extractor.stream_chat_messages()
+        try:
+            for chunk in chunks:
+                if stop.is_set():
+                    break
+                asyncio.run_coroutine_threadsafe(queue.put(chunk), loop).result()
+        finally:
+            # Закрываем генератор, чтобы освободить соединение с базой
+            chunks.close()
+            asyncio.run_coroutine_threadsafe(queue.put(_END_OF_STREAM), loop).result()
+
+    async def _summarize(self, queue: asyncio.Queue) -> dict:
+        """
+        Summarize chunks from the queue until the end of the stream.
+
+        Args:
+            queue (asyncio.Queue): Queue filled by ``_stream``.
+
+        Returns:
+            dict: Merged partial aggregates, or None if there were no messages.
+        """
+        partials = PartialsBuffer(self.analyzer)
+        carry = None
+        busy = waiting = 0.0
+
+        while True:
+            start = time.perf_counter()
+            chunk = await queue.get()
+            waiting += time.perf_counter() - start
+            if chunk is _END_OF_STREAM:
+                break
+
+            start = time.perf_counter()
+            chunk_partials, carry = await asyncio.to_thread(
+                self.analyzer._summarize_chunk, chunk, carry
+            )
+            partials.add(chunk_partials)
+            busy += time.perf_counter() - start
+
+        logger.info(
+            f"Analysis stage: {busy:.2f} s busy, {waiting:.2f} s waiting for chunks."
+        )
+        return partials.result()
+
+    async def run(self) -> pd.DataFrame:
+        """
+        Extract, analyze and upload the average response times.
+
+        Returns:
+            pd.DataFrame: Dataframe with average response time per manager.
+        """
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        stop = threading.Event()
+
+        producer = asyncio.create_task(
+            asyncio.to_thread(self._stream, queue, loop, stop)
+        )
+        dimensions = asyncio.create_task(
+            asyncio.to_thread(
+                self.db_extractor.extract_and_save_data, tables=["managers", "rops"]
+            )
+        )
+        prefetches = [dimensions]
+        if self.diff:
+            prefetches.append(
+                asyncio.create_task(
+                    asyncio.to_thread(self.gs_handler.prefetch, self.range_name)
+                )
+            )
+
+        try:
+            partials = await self._summarize(queue)
+            # Ошибка потока чанков не должна привести к выгрузке неполного результата
+            await producer
+            dict_table = await dimensions
+
+            average_response_time = await asyncio.to_thread(
+                self.analyzer._finalize_summary,
+                partials,
+                dict_table["managers"],
+                dict_table["rops"],
+            )
+            logger.info("The calculations have been carried out successfully.")
+
+            await asyncio.gather(*prefetches)
+            await asyncio.to_thread(
+                self.gs_handler.save_data_table,
+                self.range_name,
+                average_response_time,
+                diff=self.diff,
+            )
+            return average_response_time
+
+        finally:
+            stop.set()
+            # Освобождаем место в очереди, чтобы поток чтения мог завершиться
+            while not producer.done():
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    await asyncio.sleep(0.05)
+            await asyncio.gather(producer, *prefetches, return_exceptions=True)
@@ -0,0 +1,158 @@
+import math
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+
+# Корзина для нулевых (и меньших min_value) времён ответа, идёт раньше остальных
+ZERO_BUCKET = np.iinfo(np.int32).min
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch of response times with a relative error guarantee
+    (logarithmic buckets, as in DDSketch).
+
+    A value ``x`` falls into bucket ``ceil(log(x) / log(gamma))`` with
+    ``gamma = (1 + relative_accuracy) / (1 - relative_accuracy)``, so every quantile is
+    estimated within ``relative_accuracy`` of a value of the data. Sketches are long
+    frames of key columns, ``bucket`` and ``count``; merging sketches of disjoint data
+    sums the counts, so the result does not depend on how the data was split into chunks
+    or shards. The number of buckets per key is bounded by the range of the values (about
+    1000 for 1 ms to two years in minutes at 1% accuracy).
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, min_value: float = 1e-3):
+        """
+        Initialize the sketch parameters.
+
+        Args:
+            relative_accuracy (float): Relative error of the quantiles.
+            min_value (float): Values not above it (e.g. replies counted as immediate) are
+                kept in a separate bucket estimated as 0.
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1.")
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+
+    def buckets(self, values: np.ndarray) -> np.ndarray:
+        """
+        Bucket of every value.
+
+        Args:
+            values (np.ndarray): Non-negative values.
+
+        Returns:
+            np.ndarray: Bucket indexes (int32).
+        """
+        values = np.asarray(values, dtype=np.float64)
+        positive = values > self.min_value
+        indexes = np.ceil(
+            np.log(np.where(positive, values, 1.0)) / self._log_gamma
+        ).astype(np.int32)
+        return np.where(positive, indexes, ZERO_BUCKET)
+
+    def bucket_values(self, buckets: np.ndarray) -> np.ndarray:
+        """
+        Estimate of the values in every bucket (the point with equal relative error to
+        both bucket bounds).
+
+        Args:
+            buckets (np.ndarray): Bucket indexes.
+
+        Returns:
+            np.ndarray: Estimated values.
+        """
+        buckets = np.asarray(buckets, dtype=np.int64)
+        is_zero = buckets == ZERO_BUCKET
+        values = (
+            2
+            * np.exp(np.where(is_zero, 0, buckets) * self._log_gamma)
+            / (self.gamma + 1)
+        )
+        return np.where(is_zero, 0.0, values)
+
+    def summarize(
+        self, df: pd.DataFrame, keys: list[str], value_column: str = "response_time"
+    ) -> pd.DataFrame:
+        """
+        Build sketches of a column per group.
+
+        Args:
+            df (pd.DataFrame): Dataframe with the key columns and the values.
+            keys (list[str]): Columns identifying a sketch, e.g. ``["manager_id"]``.
+            value_column (str): Column with the values.
+
+        Returns:
+            pd.DataFrame: Sketches as the key columns, ``bucket`` and ``count``.
+        """
+        return (
+            df[keys]
+            .assign(bucket=self.buckets(df[value_column]))
+            .groupby([*keys, "bucket"])
+            .size()
+            .rename("count")
+            .reset_index()
+        )
+
+    @staticmethod
+    def merge(sketches: list[pd.DataFrame], keys: list[str]) -> pd.DataFrame:
+        """
+        Merge sketches built on disjoint parts of the data.
+
+        Args:
+            sketches (list[pd.DataFrame]): Sketches from ``summarize``.
+            keys (list[str]): Columns identifying a sketch.
+
+        Returns:
+            pd.DataFrame: Merged sketches.
+        """
+        return (
+            pd.concat(sketches, ignore_index=True)
+            .groupby([*keys, "bucket"])["count"]
+            .sum()
+            .reset_index()
+        )
+
+    def quantiles(
+        self, sketches: pd.DataFrame, keys: list[str], quantiles: Iterable[float]
+    ) -> pd.DataFrame:
+        """
+        Estimate quantiles of every sketch.
+
+        Args:
+            sketches (pd.DataFrame): Sketches from ``summarize`` or ``merge``.
+            keys (list[str]): Columns identifying a sketch.
+            quantiles (Iterable[float]): Quantiles, e.g. ``(0.5, 0.9, 0.99)``.
+
+        Returns:
+            pd.DataFrame: The key columns and one column per quantile, named by
+            ``quantile_column``.
+        """
+        sketches = sketches.sort_values([*keys, "bucket"], ignore_index=True)
+        grouped = sketches.groupby(keys, sort=False)["count"]
+        cumulative = grouped.cumsum().to_numpy()
+        total = grouped.transform("sum").to_numpy()
+
+        # Группы идут в порядке сортировки, и в каждой последняя корзина достигает
+        # любого ранга, поэтому результаты groupby совпадают с result построчно
+        result = sketches[keys].drop_duplicates(ignore_index=True)
+        for quantile in quantiles:
+            # Первая корзина, в которой накопленное число значений превышает ранг
+            # квантиля (нижний квантиль, как в DDSketch)
+            reached = cumulative > quantile * (total - 1)
+            first = sketches[reached].groupby(keys, sort=False)["bucket"].first()
+            result[self.quantile_column(quantile)] = self.bucket_values(
+                first.to_numpy()
+            )
+        return result
+
+    @staticmethod
+    def quantile_column(quantile: float) -> str:
+        """
+        Column name of a quantile, e.g. ``p90_response_time_minutes`` for 0.9.
+        """
+        return f"p{quantile * 100:g}_response_time_minutes"
@@ -0,0 +1,221 @@
+class QueryBuilder:
+    """
+    A class to build parameterized SELECT queries for the extractor, projecting only the
+    columns the analyzer needs and pushing the reporting window down to the database.
+    """
+
+    def __init__(
+        self,
+        schema: str = "test",
+        columns: dict = None,
+        message_types: tuple = None,
+        window_start: int = None,
+        window_end: int = None,
+        time_column: str = "created_at",
+        type_column: str = "type",
+        id_column: str = "id",
+    ):
+        """
+        Initialize the query builder.
+
+        Args:
+            schema (str): Database schema containing the tables.
+            columns (dict): Columns to select per table. Tables missing here are selected with ``*``.
+                The message id is always selected from ``chat_messages``.
+            message_types (tuple): Message types kept in ``chat_messages``. None keeps all types.
+            window_start (int): Lower bound (inclusive) of ``created_at`` in epoch seconds.
+            window_end (int): Upper bound (exclusive) of ``created_at`` in epoch seconds.
+            time_column (str): Name of the message timestamp column.
+            type_column (str): Name of the message type column.
+            id_column (str): Name of the message id column. The incremental extraction
+                de-duplicates messages by it, ``fingerprint`` reports its maximum.
+        """
+        self.schema = schema
+        self.columns = columns or {}
+        self.message_types = message_types
+        self.window_start = window_start
+        self.window_end = window_end
+        self.time_column = time_column
+        self.type_column = type_column
+        self.id_column = id_column
+
+    @classmethod
+    def from_analyzer(cls, analyzer, schema: str = "test") -> "QueryBuilder":
+        """
+        Create a query builder from the requirements of a ChatResponseAnalyzer.
+
+        Args:
+            analyzer (ChatResponseAnalyzer): Analyzer whose columns, message types and
+                reporting window define the queries.
+            schema (str): Database schema containing the tables.
+
+        Returns:
+            QueryBuilder: Configured query builder.
+        """
+        window_start, window_end = analyzer.extraction_window()
+        return cls(
+            schema=schema,
+            columns=analyzer.REQUIRED_COLUMNS,
+            message_types=analyzer.MESSAGE_TYPES,
+            window_start=window_start,
+            window_end=window_end,
+        )
+
+    def _projection(self, table_name: str) -> str:
+        """
+        Selected columns of a table, with the message id for ``chat_messages``.
+
+        Args:
+            table_name (str): Name of the table without schema.
+
+        Returns:
+            str: Comma-separated columns, or ``*``.
+        """
+        columns = self.columns.get(table_name)
+        if not columns:
+            return "*"
+        if table_name == "chat_messages" and self.id_column not in columns:
+            columns = [self.id_column, *columns]
+        return ", ".join(columns)
+
+    def _predicates(self, table_name: str) -> tuple[list[str], dict]:
+        """
+        Time window and message type predicates of a table (``chat_messages`` only).
+
+        Args:
+            table_name (str): Name of the table without schema.
+
+        Returns:
+            tuple[list[str], dict]: SQL predicates and their parameters.
+        """
+        predicates = []
+        params = {}
+        if table_name == "chat_messages":
+            if self.window_start is not None:
+                predicates.append(f"{self.time_column} >= %(window_start)s")
+                params["window_start"] = self.window_start
+            if self.window_end is not None:
+                predicates.append(f"{self.time_column} < %(window_end)s")
+                params["window_end"] = self.window_end
+            if self.message_types:
+                predicates.append(f"{self.type_column} IN %(message_types)s")
+                params["message_types"] = tuple(self.message_types)
+        return predicates, params
+
+    def select(
+        self,
+        table_name: str,
+        watermark_column: str = None,
+        order_by: tuple = None,
+    ) -> tuple[str, dict]:
+        """
+        Build a SELECT query for a table.
+
+        The time window and message type predicates apply to ``chat_messages`` only.
+
+        Args:
+            table_name (str): Name of the table without schema.
+            watermark_column (str): If set, adds a ``>= %(watermark)s`` predicate on this column;
+                the caller supplies the ``watermark`` parameter.
+            order_by (tuple): Columns for the ORDER BY clause.
+
+        Returns:
+            tuple[str, dict]: SQL with ``%(name)s`` placeholders and its parameters.
+        """
+        query = f"SELECT {self._projection(table_name)} FROM {self.schema}.{table_name}"
+
+        predicates, params = self._predicates(table_name)
+        if watermark_column:
+            predicates.append(f"{watermark_column} >= %(watermark)s")
+
+        if predicates:
+            query += " WHERE " + " AND ".join(predicates)
+        if order_by:
+            query += " ORDER BY " + ", ".join(order_by)
+
+        return query + ";", params
+
+    def carry_over(self) -> tuple[str, dict]:
+        """
+        Build a query of the conversation state at the start of the time window.
+
+        For every conversation (``entity_id``) with messages in the window it selects the
+        first message of its last block before the window, i.e. the message the first
+        reply in the window is measured from, however long ago it was sent. Combined with
+        the messages of the window, response times at the window start are the same as
+        when all earlier messages are analyzed.
+
+        Returns:
+            tuple[str, dict]: SQL with ``%(name)s`` placeholders and its parameters.
+        """
+        if self.window_start is None or self.window_end is None:
+            raise ValueError("The carry-over query requires a bounded time window.")
+
+        predicates, params = self._predicates("chat_messages")
+        type_predicate = (
+            f" AND {self.type_column} IN %(message_types)s"
+            if self.message_types
+            else ""
+        )
+        # Последнее начало блока каждой сделки до окна
+        query = f"""
+            SELECT DISTINCT ON (entity_id) {self._projection("chat_messages")}
+            FROM (
+                SELECT
+                    *,
+                    {self.type_column} IS DISTINCT FROM LAG({self.type_column}) OVER (
+                        PARTITION BY entity_id
+                        ORDER BY {self.time_column}, {self.id_column}
+                    ) AS starts_block
+                FROM {self.schema}.chat_messages
+                WHERE {self.time_column} < %(window_start)s{type_predicate}
+                    AND entity_id IN (
+                        SELECT entity_id
+                        FROM {self.schema}.chat_messages
+                        WHERE {" AND ".join(predicates)}
+                    )
+            ) m
+            WHERE starts_block
+            ORDER BY entity_id, {self.time_column} DESC, {self.id_column} DESC
+        """
+        return query.strip() + ";", params
+
+    def fingerprint(
+        self, checksum_tables: tuple = ("managers", "rops")
+    ) -> tuple[str, dict]:
+        """
+        Build a query summarizing the inputs of the analysis in one row.
+
+        For ``chat_messages`` (within the time window and message types) it returns the row
+        count and the maximum id and timestamp, which change whenever messages are added or
+        deleted. The small tables are hashed as a whole: an MD5 of their selected columns,
+        with the rows in a fixed order.
+
+        Args:
+            checksum_tables (tuple): Tables hashed as a whole.
+
+        Returns:
+            tuple[str, dict]: SQL with ``%(name)s`` placeholders and its parameters. The
+            result columns are ``chat_messages_rows``, ``chat_messages_max_id``,
+            ``chat_messages_max_<time column>`` and ``<table>_checksum``.
+        """
+        predicates, params = self._predicates("chat_messages")
+        where = " WHERE " + " AND ".join(predicates) if predicates else ""
+        checksums = []
+        for table_name in checksum_tables:
+            projection = self._projection(table_name)
+            checksums.append(
+                f"(SELECT md5(coalesce(string_agg(t::text, ',' ORDER BY t::text), '')) "
+                f"FROM (SELECT {projection} FROM {self.schema}.{table_name}) t) "
+                f"AS {table_name}_checksum"
+            )
+
+        query = (
+            "SELECT m.*, "
+            + ", ".join(checksums)
+            + " FROM (SELECT count(*) AS chat_messages_rows, "
+            f"max({self.id_column}) AS chat_messages_max_id, "
+            f"max({self.time_column}) AS chat_messages_max_{self.time_column} "
+            f"FROM {self.schema}.chat_messages{where}) m"
+        )
+        return query + ";", params
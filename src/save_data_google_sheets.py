@@ -1,48 +1,111 @@
+import re
 from typing import Any
 
-from googleapiclient.discovery import build
-import httplib2
-from oauth2client.service_account import ServiceAccountCredentials
 import pandas as pd
 from loguru import logger
 from tenacity import retry, stop_after_delay, wait_fixed
 
+from .metrics import MetricsRecorder, measure_stage, record_retry
+
 
 class GoogleSheetsHandler:
     """
     A class for interacting with Google Sheets to load data into a DataFrame or retrieve a single cell's value.
     """
 
-    def __init__(self, spreadsheet_id: str, path_google_key: str) -> None:
+    def __init__(
+        self,
+        spreadsheet_id: str,
+        path_google_key: str,
+        metrics: MetricsRecorder = None,
+        credentials_cache: dict = None,
+    ) -> None:
         """
         Initialize the GoogleSheetsHandler.
 
         Parameters:
         spreadsheet_id (str): Google Sheets ID.
         path_google_key (str): Path to the JSON file containing the Google API key.
+        metrics (MetricsRecorder): Recorder of the upload timings, HTTP calls and retries.
+            Default is a new recorder.
+        credentials_cache (dict): Credentials per key file shared between handlers, so
+            handlers of several spreadsheets read the key and refresh the access token
+            once. Default is None (own credentials).
         """
         self.spreadsheet_id = spreadsheet_id
         self.path_google_key = path_google_key
         self.scopes = ["https://www.googleapis.com/auth/spreadsheets"]
+        self._credentials = None
+        self._credentials_cache = credentials_cache
+        self._service = None
+        # Values of the last successful upload per range, used by the diff mode
+        self._last_upload = {}
+        self.metrics = metrics or MetricsRecorder()
 
     @staticmethod
     def _authenticate(path_google_key: str, scopes: list[str]) -> Any:
         """
-        Authenticate with the Google Sheets API.
+        Load the service account credentials for the Google Sheets API.
 
         Parameters:
         path_google_key (str): Path to the JSON file containing the Google API key.
         scopes (list[str]): Scopes for Google API access.
 
         Returns:
-        Any: The authorized HTTP object for accessing Google Sheets.
+        Any: The service account credentials.
         """
-        credentials = ServiceAccountCredentials.from_json_keyfile_name(
-            path_google_key, scopes
-        )
-        return credentials.authorize(httplib2.Http())
+        from oauth2client.service_account import ServiceAccountCredentials
+
+        return ServiceAccountCredentials.from_json_keyfile_name(path_google_key, scopes)
+
+    def _get_service(self) -> Any:
+        """
+        Return the Sheets service, authenticating and building it on first use.
+
+        The key file is read once. The access token is refreshed only after it expires,
+        and the service is built from the discovery document bundled with
+        google-api-python-client, so no discovery request is made.
 
-    @retry(stop=stop_after_delay(60 * 30), wait=wait_fixed(5))
+        Returns:
+        Any: The Google Sheets API service object.
+        """
+        # The Google API client libraries take longer to import than the rest of the job's
+        # dependencies, so they are loaded only when the sheet is first accessed
+        import httplib2
+        from googleapiclient.discovery import build
+
+        if self._credentials is None:
+            if self._credentials_cache is None:
+                self._credentials = self._authenticate(
+                    self.path_google_key, self.scopes
+                )
+            else:
+                # Общие только учётные данные, сервис и его соединение у каждого свои
+                self._credentials = self._credentials_cache.get(self.path_google_key)
+                if self._credentials is None:
+                    self._credentials = self._authenticate(
+                        self.path_google_key, self.scopes
+                    )
+                    self._credentials_cache[self.path_google_key] = self._credentials
+        elif self._credentials.access_token_expired:
+            self._credentials.refresh(httplib2.Http())
+            self.metrics.increment("http_calls", method="token_refresh")
+            logger.info("Google API access token refreshed.")
+
+        if self._service is None:
+            http_auth = self._credentials.authorize(httplib2.Http())
+            self._service = build(
+                "sheets",
+                "v4",
+                http=http_auth,
+                static_discovery=True,
+                cache_discovery=False,
+            )
+        return self._service
+
+    @retry(
+        stop=stop_after_delay(60 * 30), wait=wait_fixed(5), before_sleep=record_retry
+    )
     def get_data_table(self, range_name: str) -> pd.DataFrame:
         """
         Load data from Google Sheets into a DataFrame.
@@ -54,13 +117,11 @@ class GoogleSheetsHandler:
         pd.DataFrame: Data from Google Sheets in DataFrame format.
         """
         try:
-            http_auth = self._authenticate(self.path_google_key, self.scopes)
-            service = build("sheets", "v4", http=http_auth)
+            service = self._get_service()
             sheet = service.spreadsheets()
-            result = (
-                sheet.values()
-                .get(spreadsheetId=self.spreadsheet_id, range=range_name)
-                .execute()
+            result = self._execute(
+                sheet.values().get(spreadsheetId=self.spreadsheet_id, range=range_name),
+                "get",
             )
             values = result.get("values", [])
 
@@ -83,9 +144,12 @@ class GoogleSheetsHandler:
 
         except Exception as e:
             logger.error(f"Error when loading data: {e}")
+            self._service = None
             raise
 
-    @retry(stop=stop_after_delay(60 * 30), wait=wait_fixed(5))
+    @retry(
+        stop=stop_after_delay(60 * 30), wait=wait_fixed(5), before_sleep=record_retry
+    )
     def get_cell_value(self, range_name: str) -> str:
         """
         Retrieve a single cell's value from Google Sheets.
@@ -97,13 +161,11 @@ class GoogleSheetsHandler:
         str: The value of the cell as a string.
         """
         try:
-            http_auth = self._authenticate(self.path_google_key)
-            service = build("sheets", "v4", http=http_auth)
+            service = self._get_service()
             sheet = service.spreadsheets()
-            result = (
-                sheet.values()
-                .get(spreadsheetId=self.spreadsheet_id, range=range_name)
-                .execute()
+            result = self._execute(
+                sheet.values().get(spreadsheetId=self.spreadsheet_id, range=range_name),
+                "get",
             )
             values = result.get("values", [])
 
@@ -117,43 +179,292 @@ class GoogleSheetsHandler:
 
         except Exception as e:
             logger.error(f"Error when retrieving cell value: {e}")
+            self._service = None
+            raise
+
+    @retry(
+        stop=stop_after_delay(60 * 30), wait=wait_fixed(5), before_sleep=record_retry
+    )
+    def ensure_sheet(self, title: str) -> bool:
+        """
+        Add a sheet (tab) to the spreadsheet if there is none with this title.
+
+        Parameters:
+        title (str): Title of the sheet.
+
+        Returns:
+        bool: True if the sheet was added.
+        """
+        try:
+            service = self._get_service()
+            spreadsheet = self._execute(
+                service.spreadsheets().get(
+                    spreadsheetId=self.spreadsheet_id, fields="sheets.properties.title"
+                ),
+                "get_spreadsheet",
+            )
+            titles = {
+                sheet["properties"]["title"] for sheet in spreadsheet.get("sheets", [])
+            }
+            if title in titles:
+                return False
+
+            self._execute(
+                service.spreadsheets().batchUpdate(
+                    spreadsheetId=self.spreadsheet_id,
+                    body={"requests": [{"addSheet": {"properties": {"title": title}}}]},
+                ),
+                "add_sheet",
+            )
+            logger.info(f"Sheet {title} has been added to the spreadsheet.")
+            return True
+
+        except Exception as e:
+            logger.error(f"Error when adding sheet {title}: {e}")
+            self._service = None
             raise
 
-    @retry(stop=stop_after_delay(60 * 30), wait=wait_fixed(5))
-    def save_data_table(self, range_name: str, df: pd.DataFrame) -> None:
+    def _execute(self, request: Any, method: str) -> dict:
+        """
+        Execute an API request, counting it in the metrics.
+
+        Parameters:
+        request (Any): The request built by the service object.
+        method (str): API method name used as the metric label.
+
+        Returns:
+        dict: The response.
+        """
+        self.metrics.increment("http_calls", method=method)
+        return request.execute()
+
+    @staticmethod
+    def _range_origin(range_name: str) -> tuple[str, int, int]:
+        """
+        Split an A1 range into its sheet name and top-left cell.
+
+        Parameters:
+        range_name (str): A1 range, e.g. "Sheet1!B2:D100", "Sheet1!A:C", "Sheet1" or "A1:C10".
+
+        Returns:
+        tuple[str, int, int]: Sheet name prefix (including "!", empty if absent), zero-based
+        column and zero-based row of the top-left cell.
+        """
+        sheet_name, separator, cells = range_name.rpartition("!")
+        if not separator:
+            if re.fullmatch(r"[A-Za-z]{0,3}\d*(:[A-Za-z]{0,3}\d*)?", range_name):
+                sheet_name, cells = "", range_name
+            else:
+                # Only a sheet name, the range starts at A1
+                sheet_name, cells = range_name, ""
+
+        match = re.match(r"([A-Za-z]*)(\d*)", cells)
+        column = 0
+        for letter in match.group(1).upper():
+            column = column * 26 + ord(letter) - ord("A") + 1
+        row = int(match.group(2)) if match.group(2) else 1
+
+        prefix = f"{sheet_name}!" if sheet_name else ""
+        return prefix, max(column - 1, 0), row - 1
+
+    @staticmethod
+    def _cell_name(column: int, row: int) -> str:
+        """
+        Convert zero-based column and row to an A1 cell name, e.g. (27, 4) -> "AB5".
+        """
+        letters = ""
+        column += 1
+        while column:
+            column, remainder = divmod(column - 1, 26)
+            letters = chr(ord("A") + remainder) + letters
+        return f"{letters}{row + 1}"
+
+    @staticmethod
+    def _same_value(old: Any, new: Any) -> bool:
+        """
+        Compare a cell value in the sheet (or the last upload) with a new one.
+
+        Numbers are compared numerically, since the sheet returns 5.0 as 5, other values as strings.
+        """
+        numbers = (int, float)
+        if (
+            isinstance(old, numbers)
+            and isinstance(new, numbers)
+            and not isinstance(old, bool)
+            and not isinstance(new, bool)
+        ):
+            return old == new
+        return str(old) == str(new)
+
+    def _changed_ranges(
+        self, range_name: str, old_values: list[list], new_values: list[list]
+    ) -> list[dict] | None:
+        """
+        Find the cells that differ between the current and the new values.
+
+        Parameters:
+        range_name (str): The range the values are written to.
+        old_values (list[list]): Current values. Trailing empty cells and rows may be missing,
+            as in the responses of the Sheets API.
+        new_values (list[list]): Values to write.
+
+        Returns:
+        list[dict] | None: Value ranges for ``values().batchUpdate``, one per run of changed
+        cells in a row, or None if the shape of the table changed.
+        """
+        width = len(new_values[0]) if new_values else 0
+        if len(old_values) != len(new_values) or any(
+            len(row) > width for row in old_values
+        ):
+            return None
+
+        prefix, first_column, first_row = self._range_origin(range_name)
+        data = []
+        for row_index, (old_row, new_row) in enumerate(zip(old_values, new_values)):
+            old_row = list(old_row) + [""] * (width - len(old_row))
+            column_index = 0
+            while column_index < width:
+                if self._same_value(old_row[column_index], new_row[column_index]):
+                    column_index += 1
+                    continue
+                # Consecutive changed cells of a row are sent as one range
+                run_start = column_index
+                while column_index < width and not self._same_value(
+                    old_row[column_index], new_row[column_index]
+                ):
+                    column_index += 1
+                data.append(
+                    {
+                        "range": prefix
+                        + self._cell_name(
+                            first_column + run_start, first_row + row_index
+                        ),
+                        "values": [new_row[run_start:column_index]],
+                    }
+                )
+        return data
+
+    @retry(
+        stop=stop_after_delay(60 * 30), wait=wait_fixed(5), before_sleep=record_retry
+    )
+    def prefetch(self, range_name: str) -> None:
+        """
+        Prepare a diff-mode upload: authenticate, build the service and read the current
+        values of the range, unless the last upload to it is already cached.
+
+        Parameters:
+        range_name (str): The range of cells the data will be written to.
+
+        Returns:
+        None
+        """
+        try:
+            service = self._get_service()
+            if range_name not in self._last_upload:
+                self._last_upload[range_name] = self._read_values(service, range_name)
+            logger.info("Google Sheets upload prepared.")
+
+        except Exception as e:
+            logger.error(f"Error when preparing the upload: {e}")
+            self._service = None
+            raise
+
+    def _read_values(self, service: Any, range_name: str) -> list[list]:
+        """
+        Read the unformatted values of a range, as they were written in RAW mode.
+        """
+        request = (
+            service.spreadsheets()
+            .values()
+            .get(
+                spreadsheetId=self.spreadsheet_id,
+                range=range_name,
+                valueRenderOption="UNFORMATTED_VALUE",
+            )
+        )
+        return self._execute(request, "get").get("values", [])
+
+    @measure_stage("upload.save_data_table")
+    @retry(
+        stop=stop_after_delay(60 * 30), wait=wait_fixed(5), before_sleep=record_retry
+    )
+    def save_data_table(
+        self, range_name: str, df: pd.DataFrame, diff: bool = False
+    ) -> None:
         """
         Save data from a DataFrame to Google Sheets.
 
+        In diff mode only the changed cells are sent, in one ``values().batchUpdate`` request.
+        They are found by comparing with the last upload made by this handler or, if there is
+        none, with the values read from the sheet. The range is cleared and rewritten only
+        when the number of rows or columns changed.
+
         Parameters:
         range_name (str): The range of cells to write the data to.
         df (pd.DataFrame): DataFrame to save to Google Sheets.
+        diff (bool): If True, write only the cells that changed.
 
         Returns:
         None
         """
         try:
-            http_auth = self._authenticate(self.path_google_key, self.scopes)
-            service = build("sheets", "v4", http=http_auth)
+            service = self._get_service()
             sheet = service.spreadsheets()
 
             df = df.where(pd.notnull(df), "")
 
             values = [df.columns.tolist()] + df.reset_index(drop=True).values.tolist()
 
-            body = {"values": values}
+            data = None
+            if diff:
+                old_values = self._last_upload.get(range_name)
+                if old_values is None:
+                    old_values = self._read_values(service, range_name)
+                data = self._changed_ranges(range_name, old_values, values)
 
-            sheet.values().clear(
-                spreadsheetId=self.spreadsheet_id, range=range_name
-            ).execute()
-            sheet.values().update(
-                spreadsheetId=self.spreadsheet_id,
-                range=range_name,
-                valueInputOption="RAW",
-                body=body,
-            ).execute()
+            if data is None:
+                body = {"values": values}
+
+                self._execute(
+                    sheet.values().clear(
+                        spreadsheetId=self.spreadsheet_id, range=range_name
+                    ),
+                    "clear",
+                )
+                self._execute(
+                    sheet.values().update(
+                        spreadsheetId=self.spreadsheet_id,
+                        range=range_name,
+                        valueInputOption="RAW",
+                        body=body,
+                    ),
+                    "update",
+                )
+                self.metrics.increment(
+                    "sheets_cells_written", sum(len(row) for row in values)
+                )
+            elif data:
+                self._execute(
+                    sheet.values().batchUpdate(
+                        spreadsheetId=self.spreadsheet_id,
+                        body={"valueInputOption": "RAW", "data": data},
+                    ),
+                    "batchUpdate",
+                )
+                self.metrics.increment(
+                    "sheets_cells_written",
+                    sum(len(value_range["values"][0]) for value_range in data),
+                )
+                logger.info(f"{len(data)} changed ranges sent to Google Sheets.")
+            else:
+                logger.info("No changes to save to Google Sheets.")
 
+            self._last_upload[range_name] = values
             logger.info("Data has been successfully saved to Google Sheets.")
 
         except Exception as e:
             logger.error(f"Error when saving data: {e}")
+            self._service = None
+            # The state of the range is unknown after a failed write
+            self._last_upload.pop(range_name, None)
             raise
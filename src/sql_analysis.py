@@ -0,0 +1,402 @@
+import numpy as np
+import pandas as pd
+from loguru import logger
+from psycopg2.extras import execute_values
+
+from .daily_stats import STAT_COLUMNS
+from .data_processing import ChatResponseAnalyzer
+from .get_data_db import DatabaseExtractor
+from .quantile_sketch import ZERO_BUCKET
+
+# Рабочее время календаря менеджера к моменту времени: последний рабочий интервал,
+# начавшийся не позже него (как searchsorted в WorkingCalendar.cumulative_working_time)
+_WORKED_AT = """
+    LEFT JOIN LATERAL (
+        SELECT i.worked_before + LEAST(GREATEST({time} - i.start_ns, 0), i.duration)
+            AS worked
+        FROM pg_temp.working_intervals AS i
+        WHERE i.calendar = r.calendar AND i.start_ns <= {time}
+        ORDER BY i.start_ns DESC
+        LIMIT 1
+    ) AS {alias} ON TRUE
+"""
+
+
+class SqlChatResponseAnalyzer(ChatResponseAnalyzer):
+    """
+    A ChatResponseAnalyzer that computes response times inside PostgreSQL.
+
+    Block detection, the incoming→outgoing pairing (``LAG`` window functions) and the
+    working-hours adjustment run in one query, so only the per-manager aggregates (and
+    the daily statistics and quantile sketches when enabled) leave the database. The
+    working intervals of the calendars are computed in Python and loaded into temporary
+    tables of the session, so the adjustment uses the same calendars as the other
+    analyzers.
+    """
+
+    def __init__(
+        self,
+        *args,
+        db_extractor: DatabaseExtractor = None,
+        tiebreaker_column: str = "id",
+        **kwargs,
+    ):
+        """
+        Initialize the analyzer.
+
+        Args:
+            *args: Positional arguments of ChatResponseAnalyzer.
+            db_extractor (DatabaseExtractor): Extractor whose connection pool and query
+                builder (schema of the tables) are used.
+            tiebreaker_column (str): Column ordering messages of one conversation sent in
+                the same second, e.g. the insertion ``id``. None leaves their order to
+                the database.
+            **kwargs: Keyword arguments of ChatResponseAnalyzer.
+        """
+        super().__init__(*args, **kwargs)
+        if db_extractor is None:
+            raise ValueError("SqlChatResponseAnalyzer requires a db_extractor.")
+        self.db_extractor = db_extractor
+        self.tiebreaker_column = tiebreaker_column
+
+    def _message_predicates(self, params: dict) -> list[str]:
+        """
+        Predicates selecting the chat messages of the reporting window.
+
+        Args:
+            params (dict): Query parameters, extended in place.
+
+        Returns:
+            list[str]: SQL predicates.
+        """
+        window_start, window_end = self.extraction_window()
+        predicates = ["type IN %(message_types)s"]
+        params["message_types"] = tuple(self.MESSAGE_TYPES)
+        if window_start is not None:
+            predicates.append("created_at >= %(window_start)s")
+            params["window_start"] = window_start
+        if window_end is not None:
+            predicates.append("created_at < %(window_end)s")
+            params["window_end"] = window_end
+        return predicates
+
+    def _message_range(self, cursor) -> tuple[int, int]:
+        """
+        Range of the message timestamps (epoch seconds) the working intervals must cover.
+
+        Args:
+            cursor: Cursor of the analysis session.
+
+        Returns:
+            tuple[int, int]: First and last timestamp, None if there are no messages.
+        """
+        window_start, window_end = self.extraction_window()
+        if window_start is not None and window_end is not None:
+            return window_start, window_end
+
+        params = {}
+        predicates = self._message_predicates(params)
+        cursor.execute(
+            f"SELECT MIN(created_at), MAX(created_at) "
+            f"FROM {self.db_extractor.query_builder.schema}.chat_messages "
+            f"WHERE {' AND '.join(predicates)};",
+            params,
+        )
+        return cursor.fetchone()
+
+    def _load_calendars(self, cursor, first_at: int, last_at: int) -> None:
+        """
+        Load the working intervals and the team of every manager into temporary tables.
+
+        The tables are dropped at the end of the transaction.
+
+        Args:
+            cursor: Cursor of the analysis session.
+            first_at (int): First message timestamp (epoch seconds).
+            last_at (int): Last message timestamp (epoch seconds).
+        """
+        cursor.execute(
+            """
+            CREATE TEMPORARY TABLE working_intervals (
+                calendar integer NOT NULL,
+                start_ns bigint NOT NULL,
+                duration bigint NOT NULL,
+                worked_before bigint NOT NULL,
+                PRIMARY KEY (calendar, start_ns)
+            ) ON COMMIT DROP;
+            CREATE TEMPORARY TABLE manager_calendars (
+                manager_id bigint PRIMARY KEY,
+                calendar integer NOT NULL
+            ) ON COMMIT DROP;
+            """
+        )
+
+        rows = []
+        for code, calendar in enumerate(self.calendar.calendars):
+            _, _, starts, durations, worked_before = calendar._get_intervals(
+                int(first_at) * 10**9, int(last_at) * 10**9
+            )
+            rows.extend(
+                zip(
+                    [code] * len(starts),
+                    starts.tolist(),
+                    durations.tolist(),
+                    worked_before.tolist(),
+                )
+            )
+        execute_values(cursor, "INSERT INTO working_intervals VALUES %s", rows)
+        execute_values(
+            cursor,
+            "INSERT INTO manager_calendars VALUES %s",
+            zip(
+                self.calendar._manager_ids.astype(np.int64).tolist(),
+                self.calendar._calendar_codes.tolist(),
+            ),
+        )
+        cursor.execute("ANALYZE working_intervals; ANALYZE manager_calendars;")
+
+    def build_query(self) -> tuple[str, dict]:
+        """
+        Build the query computing the partial aggregates of the response times.
+
+        The rows are grouping sets: per manager, and per (manager, day), per (manager,
+        bucket) and per (manager, day, bucket) when the daily store and percentiles are
+        enabled. ``has_day`` and ``has_bucket`` tell the sets apart.
+
+        Returns:
+            tuple[str, dict]: SQL with ``%(name)s`` placeholders and its parameters.
+        """
+        params = {}
+        predicates = self._message_predicates(params)
+        order = "entity_id, created_at"
+        if self.tiebreaker_column:
+            order += f", {self.tiebreaker_column}"
+        tiebreaker = f", {self.tiebreaker_column}" if self.tiebreaker_column else ""
+
+        # Учитываем только ответы, отправленные в отчётном периоде
+        response_predicates = [
+            "type = %(outgoing_type)s",
+            "prev_type = %(incoming_type)s",
+            "prev_entity_id = entity_id",
+            "created_by IS NOT NULL",
+        ]
+        params["incoming_type"], params["outgoing_type"] = self.MESSAGE_TYPES
+        if self.period_start is not None:
+            response_predicates.append(
+                "created_at::bigint * 1000000000 >= %(period_start)s"
+            )
+            params["period_start"] = self.period_start.value
+        if self.period_end is not None:
+            response_predicates.append(
+                "created_at::bigint * 1000000000 < %(period_end)s"
+            )
+            params["period_end"] = self.period_end.value
+
+        grouping_sets = ["(manager_id)"]
+        if self.daily_store is not None:
+            grouping_sets.append("(manager_id, day)")
+            params["day_offset"] = int(self.daily_store.utc_offset.total_seconds())
+        if self.percentiles:
+            grouping_sets.append("(manager_id, bucket)")
+            if self.daily_store is not None:
+                grouping_sets.append("(manager_id, day, bucket)")
+            params["min_value"] = self.sketch.min_value
+            params["log_gamma"] = self.sketch._log_gamma
+            params["zero_bucket"] = int(ZERO_BUCKET)
+        # Столбцы дня и корзины группируются, только если они нужны; иначе NULL
+        keys = {
+            "day": (
+                "FLOOR((reply_at + %(day_offset)s) / 86400.0)::bigint"
+                if self.daily_store is not None
+                else None,
+                "bigint",
+            ),
+            # Корзины скетча, как в QuantileSketch.buckets
+            "bucket": (
+                "CASE WHEN response_time > %(min_value)s"
+                " THEN CEIL(LN(response_time) / %(log_gamma)s)::integer"
+                " ELSE %(zero_bucket)s END"
+                if self.percentiles
+                else None,
+                "integer",
+            ),
+        }
+        key_expressions = "".join(
+            f", {expression} AS {name}"
+            for name, (expression, _) in keys.items()
+            if expression is not None
+        )
+        key_columns = ", ".join(
+            f"GROUPING({name}) = 0 AS has_{name}, {name}"
+            if expression is not None
+            else f"FALSE AS has_{name}, NULL::{sql_type} AS {name}"
+            for name, (expression, sql_type) in keys.items()
+        )
+
+        query = f"""
+            WITH messages AS (
+                SELECT entity_id, type, created_at, created_by{tiebreaker},
+                       LAG(type) OVER w AS prev_type,
+                       LAG(entity_id) OVER w AS prev_entity_id
+                FROM {self.db_extractor.query_builder.schema}.chat_messages
+                WHERE {" AND ".join(predicates)}
+                WINDOW w AS (ORDER BY {order})
+            ),
+            -- Первые сообщения блоков: сменился тип сообщения или сделка
+            block_starts AS (
+                SELECT entity_id, type, created_at, created_by{tiebreaker}
+                FROM messages
+                WHERE prev_type IS DISTINCT FROM type
+                   OR prev_entity_id IS DISTINCT FROM entity_id
+            ),
+            -- Каждое первое сообщение блока сопоставляется с предыдущим
+            pairs AS (
+                SELECT entity_id, type, created_at, created_by,
+                       LAG(type) OVER w AS prev_type,
+                       LAG(entity_id) OVER w AS prev_entity_id,
+                       LAG(created_at) OVER w AS incoming_at
+                FROM block_starts
+                WINDOW w AS (ORDER BY {order})
+            ),
+            responses AS (
+                SELECT created_by AS manager_id,
+                       created_at AS reply_at,
+                       incoming_at::bigint * 1000000000 AS incoming_ns,
+                       created_at::bigint * 1000000000 AS reply_ns
+                FROM pairs
+                WHERE {" AND ".join(response_predicates)}
+            ),
+            worked_times AS (
+                SELECT r.manager_id, r.reply_at,
+                       COALESCE(reply.worked, 0) - COALESCE(incoming.worked, 0) AS worked
+                FROM (
+                    SELECT responses.*, COALESCE(c.calendar, 0) AS calendar
+                    FROM responses
+                    LEFT JOIN pg_temp.manager_calendars AS c
+                        ON c.manager_id = responses.manager_id
+                ) AS r
+                {_WORKED_AT.format(time="r.reply_ns", alias="reply")}
+                {_WORKED_AT.format(time="r.incoming_ns", alias="incoming")}
+            ),
+            -- Время ответа в минутах и в целых микросекундах, как в
+            -- _response_time_columns
+            response_times AS (
+                SELECT manager_id, reply_at,
+                       worked::double precision / 1000000000 / 60 AS response_time,
+                       worked / 1000 AS response_time_us
+                FROM worked_times
+            )
+            SELECT manager_id, {key_columns},
+                   COUNT(*) AS response_count,
+                   SUM(response_time_us)::bigint AS response_time_sum_us,
+                   SUM(response_time * response_time) AS response_time_sum_sq,
+                   MIN(response_time) AS response_time_min,
+                   MAX(response_time) AS response_time_max
+            FROM (
+                SELECT manager_id, response_time, response_time_us{key_expressions}
+                FROM response_times
+            ) AS t
+            GROUP BY GROUPING SETS ({", ".join(grouping_sets)})
+        """
+        return query, params
+
+    def _summarize_in_database(self) -> dict:
+        """
+        Run the analysis query and split its grouping sets into partial aggregates.
+
+        Returns:
+            dict: Partial aggregates, see ``ChatResponseAnalyzer._summarize_responses``,
+            or None if there are no messages.
+        """
+        conn = self.db_extractor._acquire_connection()
+        try:
+            with conn.cursor() as cursor:
+                first_at, last_at = self._message_range(cursor)
+                if first_at is None:
+                    return None
+                self._load_calendars(cursor, first_at, last_at)
+                query, params = self.build_query()
+                cursor.execute(query, params)
+                columns = [column.name for column in cursor.description]
+                rows = pd.DataFrame(cursor.fetchall(), columns=columns)
+        except Exception as e:
+            logger.error(f"Error analyzing chat messages in the database: {e}")
+            raise
+        finally:
+            # Откат транзакции удаляет временные таблицы
+            self.db_extractor._release_connection(conn)
+
+        rows = rows.astype(
+            {
+                "manager_id": np.int64,
+                "response_count": np.int64,
+                "response_time_sum_us": np.int64,
+                **{column: np.float64 for column in STAT_COLUMNS[2:]},
+            }
+        )
+        has_day = rows["has_day"].astype(bool)
+        has_bucket = rows["has_bucket"].astype(bool)
+
+        partials = {
+            "summary": rows.loc[
+                ~has_day & ~has_bucket,
+                ["manager_id", "response_time_sum_us", "response_count"],
+            ].reset_index(drop=True)
+        }
+        if self.daily_store is not None:
+            partials["daily"] = (
+                rows.loc[
+                    has_day & ~has_bucket,
+                    [
+                        "manager_id",
+                        "day",
+                        "response_count",
+                        "response_time_sum_us",
+                        *STAT_COLUMNS[2:],
+                    ],
+                ]
+                .astype({"day": np.int64})
+                .reset_index(drop=True)
+            )
+        if self.percentiles:
+            sketch = rows.rename(columns={"response_count": "count"})
+            partials["sketch"] = (
+                sketch.loc[~has_day & has_bucket, ["manager_id", "bucket", "count"]]
+                .astype({"bucket": np.int32})
+                .reset_index(drop=True)
+            )
+            if self.daily_store is not None:
+                partials["daily_sketch"] = (
+                    sketch.loc[
+                        has_day & has_bucket, ["manager_id", "day", "bucket", "count"]
+                    ]
+                    .astype({"day": np.int64, "bucket": np.int32})
+                    .reset_index(drop=True)
+                )
+        return partials
+
+    def analyze_in_database(
+        self, df_managers: pd.DataFrame, df_rops: pd.DataFrame
+    ) -> pd.DataFrame:
+        """
+        Calculate average response times in the database, without loading chat messages.
+
+        Args:
+            df_managers (pd.DataFrame): Dataframe containing manager details.
+            df_rops (pd.DataFrame): Dataframe containing additional rop details.
+
+        Returns:
+            pd.DataFrame: Dataframe with average response time per manager.
+        """
+        with self.metrics.stage("analyze.summarize_in_database") as record:
+            partials = self._summarize_in_database()
+            if partials is not None:
+                record["rows_out"] = len(partials["summary"])
+
+        average_response_time = self._finalize_summary(partials, df_managers, df_rops)
+
+        logger.info(
+            "The calculations have been carried out in the database successfully."
+        )
+
+        return average_response_time
@@ -0,0 +1,158 @@
+import os
+
+from loguru import logger
+
+from .config import Config
+from .utils import FileHandler, FileValidator
+
+
+class Tenant:
+    """
+    Settings of one tenant (sales department): its database, spreadsheet, Google API key,
+    working calendar and the folder of its local data (cache, snapshots, metrics, daily
+    statistics).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        db_info: dict,
+        spreadsheet_id: str,
+        range_name: str,
+        google_token: str,
+        calendar: str,
+        data_folder: str,
+        schema: str = "test",
+    ):
+        """
+        Initialize the tenant.
+
+        Args:
+            name (str): Unique name of the tenant, used in logs and folder names.
+            db_info (dict): Database connection with ``HOST``, ``PORT``, ``NAME``,
+                ``USER`` and ``PASSWORD`` (as ``Config.bd_info``).
+            spreadsheet_id (str): Google Sheets ID.
+            range_name (str): The range of cells the result is written to.
+            google_token (str): Path to the JSON file containing the Google API key.
+            calendar (str): Path to the working calendar YAML file.
+            data_folder (str): Folder of the local data of the tenant.
+            schema (str): Database schema containing the tables.
+        """
+        self.name = name
+        self.db_info = db_info
+        self.spreadsheet_id = spreadsheet_id
+        self.range_name = range_name
+        self.google_token = google_token
+        self.calendar = calendar
+        self.data_folder = data_folder
+        self.schema = schema
+
+    def __repr__(self) -> str:
+        return f"Tenant({self.name!r})"
+
+    @classmethod
+    def from_config(cls, config: Config) -> "Tenant":
+        """
+        The single tenant configured in ``settings`` (connect.yaml, google_sheets_info.yaml,
+        token.json and calendar.yaml), with its data in the ``data`` folder.
+
+        Args:
+            config (Config): Loaded configuration.
+
+        Returns:
+            Tenant: The tenant.
+        """
+        paths = config.get_paths()
+        return cls(
+            name="default",
+            db_info=config.bd_info(),
+            spreadsheet_id=config.get_google_sheets_info().get("SPREADSHEET_ID"),
+            range_name=config.get_google_sheets_info().get("RANGE_NAME"),
+            google_token=paths.get("google_token"),
+            calendar=paths.get("calendar"),
+            data_folder=os.path.join(config.BASE_DIR, "data"),
+        )
+
+    @classmethod
+    def from_settings(
+        cls, name: str, settings: dict, defaults: dict = None, base_dir: str = None
+    ) -> "Tenant":
+        """
+        Create a tenant from its section of the tenant manifest.
+
+        Args:
+            name (str): Name of the tenant.
+            settings (dict): ``database`` (``host``, ``port``, ``name``, ``user``,
+                ``password`` as in connect.yaml), ``spreadsheet_id``, ``range_name``,
+                ``google_token``, ``calendar`` and ``schema``.
+            defaults (dict): Settings used for the keys missing in ``settings``; the keys
+                of its ``database`` section are merged with the tenant's ones.
+            base_dir (str): Directory relative paths are resolved against. Defaults to
+                the current directory.
+
+        Returns:
+            Tenant: The tenant.
+        """
+        defaults = defaults or {}
+        settings = settings or {}
+        database = {
+            **(defaults.get("database") or {}),
+            **(settings.get("database") or {}),
+        }
+        settings = {**defaults, **settings}
+        base_dir = base_dir or os.getcwd()
+
+        missing = [
+            key
+            for key in ("spreadsheet_id", "range_name", "google_token", "calendar")
+            if not settings.get(key)
+        ] + [
+            f"database.{key}"
+            for key in ("host", "port", "name", "user", "password")
+            if key not in database
+        ]
+        if missing:
+            raise ValueError(f"Tenant {name} misses settings: {', '.join(missing)}.")
+
+        return cls(
+            name=name,
+            db_info={key.upper(): value for key, value in database.items()},
+            spreadsheet_id=settings["spreadsheet_id"],
+            range_name=settings["range_name"],
+            google_token=FileValidator.validate_file_path(
+                os.path.join(base_dir, settings["google_token"])
+            ),
+            calendar=FileValidator.validate_file_path(
+                os.path.join(base_dir, settings["calendar"])
+            ),
+            data_folder=os.path.join(base_dir, "data", "tenants", name),
+            schema=settings.get("schema", "test"),
+        )
+
+    @classmethod
+    def load_manifest(cls, file_path: str, base_dir: str = None) -> list["Tenant"]:
+        """
+        Load the tenants of a manifest YAML file (see ``settings/tenants/tenants.yaml``).
+
+        Args:
+            file_path (str): Path to the YAML file.
+            base_dir (str): Directory relative paths are resolved against. Defaults to
+                the current directory.
+
+        Returns:
+            list[Tenant]: The tenants in the order of the manifest.
+        """
+        try:
+            manifest = FileHandler.load_yaml(file_path)
+            defaults = manifest.get("defaults") or {}
+            tenants = [
+                cls.from_settings(name, settings, defaults, base_dir)
+                for name, settings in (manifest.get("tenants") or {}).items()
+            ]
+        except Exception as e:
+            logger.error(f"Error loading the tenant manifest {file_path}: {e}")
+            raise
+        if not tenants:
+            raise ValueError(f"The tenant manifest {file_path} has no tenants.")
+        logger.info(f"Tenant manifest loaded: {len(tenants)} tenants.")
+        return tenants
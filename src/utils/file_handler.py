@@ -1,10 +1,14 @@
 import json
 import yaml
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-import pandas as pd
 from loguru import logger
 
+# pandas and pyarrow are imported by the methods that use them, so that loading the
+# configuration does not import them
+if TYPE_CHECKING:
+    import pandas as pd
+
 
 class FileHandler:
     @staticmethod
@@ -55,6 +59,8 @@ class FileHandler:
         :param text_successful: The success message to log.
         :param text_error: The error message to log in case of failure.
         """
+        import pandas as pd
+
         try:
             if isinstance(data, pd.DataFrame):
                 data.to_csv(file_path, index=True)
@@ -66,7 +72,7 @@ class FileHandler:
             raise
 
     @staticmethod
-    def read_csv(file_path: str) -> pd.DataFrame:
+    def read_csv(file_path: str) -> "pd.DataFrame":
         """
         Reads data from a CSV file.
 
@@ -74,6 +80,8 @@ class FileHandler:
         :return: A pandas DataFrame containing the data from the CSV file.
         :raises Exception: If there are any issues reading the file.
         """
+        import pandas as pd
+
         try:
             data = pd.read_csv(file_path)
             return data
@@ -81,6 +89,50 @@ class FileHandler:
             logger.error(f"Error reading data from {file_path}: {e}")
             raise
 
+    @staticmethod
+    def save_snapshot(
+        data: "pd.DataFrame", file_path: str, text_successful: str, text_error: str
+    ) -> None:
+        """
+        Saves a DataFrame as an uncompressed Arrow IPC (Feather v2) snapshot.
+
+        The file is written without compression so that it can be memory-mapped on read.
+
+        :param data: The DataFrame to save. The index is not stored.
+        :param file_path: Path to the file where the data should be saved.
+        :param text_successful: The success message to log.
+        :param text_error: The error message to log in case of failure.
+        """
+        import pyarrow.feather as feather
+
+        try:
+            feather.write_feather(
+                data.reset_index(drop=True), file_path, compression="uncompressed"
+            )
+            logger.info(text_successful)
+        except Exception as e:
+            logger.error(f"{text_error} {str(e)}")
+            raise
+
+    @staticmethod
+    def read_snapshot(file_path: str, memory_map: bool = True) -> "pd.DataFrame":
+        """
+        Reads an Arrow IPC (Feather v2) snapshot.
+
+        :param file_path: The path to the snapshot file.
+        :param memory_map: If True, the file is memory-mapped instead of read into memory,
+            so numeric columns without nulls are converted to pandas without copying.
+        :return: A pandas DataFrame containing the data from the snapshot.
+        """
+        import pyarrow.feather as feather
+
+        try:
+            table = feather.read_table(file_path, memory_map=memory_map)
+            return table.to_pandas(split_blocks=True)
+        except Exception as e:
+            logger.error(f"Error reading data from {file_path}: {e}")
+            raise
+
     @staticmethod
     def load_yaml(file_path: str) -> dict:
         """
@@ -0,0 +1,368 @@
+import re
+from datetime import date, timedelta
+from typing import Iterable
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from .utils import FileHandler
+
+NS_PER_DAY = 24 * 60 * 60 * 10**9
+WEEKDAYS = (
+    "monday",
+    "tuesday",
+    "wednesday",
+    "thursday",
+    "friday",
+    "saturday",
+    "sunday",
+)
+# 1970-01-01 — четверг
+_EPOCH_WEEKDAY = 3
+
+
+def _to_ns(value: timedelta) -> int:
+    return value // timedelta(microseconds=1) * 1_000
+
+
+def _day_number(value: date) -> int:
+    return (value - date(1970, 1, 1)).days
+
+
+def parse_time_of_day(value: str) -> timedelta:
+    """
+    Parse a time of day such as ``"09:30"``, ``"23:59:59"`` or ``"24:00"``.
+
+    Args:
+        value (str): Time as ``HH:MM[:SS[.ffffff]]``. Must be quoted in YAML, otherwise
+            ``09:30`` is read as a number.
+
+    Returns:
+        timedelta: Time since midnight.
+    """
+    match = re.fullmatch(r"(\d{1,2}):(\d{2})(?::(\d{2})(?:\.(\d{1,6}))?)?", str(value))
+    if not isinstance(value, str) or match is None:
+        raise ValueError(f"Invalid time of day {value!r}, expected a quoted 'HH:MM'.")
+    hours, minutes, seconds, fraction = match.groups()
+    result = timedelta(
+        hours=int(hours),
+        minutes=int(minutes),
+        seconds=int(seconds or 0),
+        microseconds=int((fraction or "0").ljust(6, "0")),
+    )
+    if result > timedelta(days=1):
+        raise ValueError(f"Invalid time of day {value!r}.")
+    return result
+
+
+def parse_utc_offset(value: str) -> timedelta:
+    """
+    Parse a UTC offset such as ``"+03:00"`` or ``"-05:30"``.
+    """
+    match = re.fullmatch(r"([+-])?(\d{1,2}):(\d{2})", str(value))
+    if not isinstance(value, str) or match is None:
+        raise ValueError(f"Invalid UTC offset {value!r}, expected a quoted '+HH:MM'.")
+    sign, hours, minutes = match.groups()
+    offset = timedelta(hours=int(hours), minutes=int(minutes))
+    return -offset if sign == "-" else offset
+
+
+class WorkingCalendar:
+    """
+    Working schedule of a team: shifts of a working day in local time, weekends,
+    holidays, transferred working days and the UTC offset of the local time.
+
+    Working time between two timestamps is the difference of the cumulative working time
+    at these timestamps. The working intervals of the requested range of days are
+    precomputed once (sorted starts and the cumulative working time before each
+    interval), so each lookup is one ``searchsorted`` over the intervals, vectorized over
+    all timestamps.
+    """
+
+    def __init__(
+        self,
+        shifts: Iterable[tuple[timedelta, timedelta]],
+        utc_offset: timedelta = timedelta(0),
+        weekends: Iterable[int] = (),
+        holidays: Iterable[date] = (),
+        workdays: Iterable[date] = (),
+    ):
+        """
+        Initialize the calendar.
+
+        Args:
+            shifts (Iterable[tuple[timedelta, timedelta]]): Start and end of every shift of
+                a working day in local time. A shift ending before its start ends on the
+                next day (night shift). Overlapping shifts are merged.
+            utc_offset (timedelta): Offset of the local time from UTC.
+            weekends (Iterable[int]): Days off of the week, 0 is Monday.
+            holidays (Iterable[date]): Days off in addition to the weekends.
+            workdays (Iterable[date]): Working days in spite of falling on weekends
+                (transferred working days).
+        """
+        self.shifts = []
+        for start, end in shifts:
+            if end <= start:
+                end += timedelta(days=1)
+            if not timedelta(0) <= start < end <= start + timedelta(days=1):
+                raise ValueError(f"Invalid shift {start} – {end}.")
+            self.shifts.append((start, end))
+        if not self.shifts:
+            raise ValueError("A working calendar needs at least one shift.")
+
+        self.utc_offset = utc_offset
+        self.weekends = sorted(set(weekends))
+        self.holidays = sorted(set(holidays))
+        self.workdays = sorted(set(workdays))
+        # Рассчитанные рабочие интервалы: (первый день, последний день, начала,
+        # длительности, рабочее время до начала интервала)
+        self._intervals = None
+
+    @classmethod
+    def from_settings(cls, settings: dict, defaults: dict = None) -> "WorkingCalendar":
+        """
+        Create a calendar from its settings, e.g. a section of the calendar YAML file.
+
+        Args:
+            settings (dict): ``shifts`` (list of ``["HH:MM", "HH:MM"]``), ``utc_offset``
+                (``"+HH:MM"``), ``weekends`` (day names), ``holidays`` and ``workdays``
+                (dates).
+            defaults (dict): Settings used for the keys missing in ``settings``.
+
+        Returns:
+            WorkingCalendar: The calendar.
+        """
+        settings = {**(defaults or {}), **(settings or {})}
+        return cls(
+            shifts=[
+                (parse_time_of_day(start), parse_time_of_day(end))
+                for start, end in settings.get("shifts") or []
+            ],
+            utc_offset=parse_utc_offset(settings.get("utc_offset", "+00:00")),
+            weekends=[
+                WEEKDAYS.index(str(day).lower())
+                for day in settings.get("weekends") or []
+            ],
+            holidays=[
+                pd.Timestamp(day).date() for day in settings.get("holidays") or []
+            ],
+            workdays=[
+                pd.Timestamp(day).date() for day in settings.get("workdays") or []
+            ],
+        )
+
+    def _build_intervals(self, first_day: int, last_day: int) -> tuple:
+        """
+        Calculate the working intervals of a range of local days.
+
+        Args:
+            first_day (int): First local day (days since 1970-01-01).
+            last_day (int): Last local day, inclusive.
+
+        Returns:
+            tuple: The range, the interval starts (UTC nanoseconds), their durations and
+            the working time before every interval.
+        """
+        days = np.arange(first_day, last_day + 1, dtype=np.int64)
+        is_working = ~np.isin((days + _EPOCH_WEEKDAY) % 7, self.weekends)
+        is_working &= ~np.isin(days, [_day_number(day) for day in self.holidays])
+        is_working |= np.isin(days, [_day_number(day) for day in self.workdays])
+        day_starts = days[is_working] * NS_PER_DAY - _to_ns(self.utc_offset)
+
+        starts = np.concatenate(
+            [day_starts + _to_ns(start) for start, _ in self.shifts]
+        )
+        ends = np.concatenate([day_starts + _to_ns(end) for _, end in self.shifts])
+        order = np.argsort(starts, kind="stable")
+        starts, ends = starts[order], ends[order]
+
+        # Объединяем пересекающиеся смены (например, ночную смену с утренней)
+        if len(starts):
+            reach = np.maximum.accumulate(ends)
+            is_new = np.ones(len(starts), dtype=bool)
+            is_new[1:] = starts[1:] > reach[:-1]
+            group_starts = np.flatnonzero(is_new)
+            starts = starts[group_starts]
+            ends = np.maximum.reduceat(ends, group_starts)
+
+        durations = ends - starts
+        worked_before = np.concatenate([[0], np.cumsum(durations)[:-1]])
+        return first_day, last_day, starts, durations, worked_before
+
+    def _get_intervals(self, min_ns: int, max_ns: int) -> tuple:
+        """
+        Working intervals covering the timestamps, rebuilt only when the range grows.
+        """
+        offset_ns = _to_ns(self.utc_offset)
+        # Смена, начавшаяся накануне, может продолжаться в первый день диапазона
+        first_day = (min_ns + offset_ns) // NS_PER_DAY - 1
+        last_day = (max_ns + offset_ns) // NS_PER_DAY
+
+        intervals = self._intervals
+        if intervals is None or first_day < intervals[0] or last_day > intervals[1]:
+            if intervals is not None:
+                first_day = min(first_day, intervals[0])
+                last_day = max(last_day, intervals[1])
+            intervals = self._build_intervals(int(first_day), int(last_day))
+            self._intervals = intervals
+        return intervals
+
+    def cumulative_working_time(
+        self, timestamps_ns: np.ndarray, intervals: tuple
+    ) -> np.ndarray:
+        """
+        Working time from the start of the precomputed range to every timestamp.
+
+        Args:
+            timestamps_ns (np.ndarray): UTC nanoseconds since epoch.
+            intervals (tuple): Result of ``_get_intervals`` covering the timestamps.
+
+        Returns:
+            np.ndarray: Working time in nanoseconds (int64).
+        """
+        _, _, starts, durations, worked_before = intervals
+        if not len(starts):
+            return np.zeros(len(timestamps_ns), dtype=np.int64)
+
+        position = np.searchsorted(starts, timestamps_ns, side="right") - 1
+        clipped = np.maximum(position, 0)
+        worked = worked_before[clipped] + np.clip(
+            timestamps_ns - starts[clipped], 0, durations[clipped]
+        )
+        return np.where(position >= 0, worked, 0)
+
+    def working_time(self, start_ns: np.ndarray, end_ns: np.ndarray) -> np.ndarray:
+        """
+        Working time between pairs of timestamps.
+
+        Args:
+            start_ns (np.ndarray): Start timestamps, UTC nanoseconds since epoch.
+            end_ns (np.ndarray): End timestamps, not earlier than the starts.
+
+        Returns:
+            np.ndarray: Working time in nanoseconds (int64).
+        """
+        start_ns = np.asarray(start_ns, dtype=np.int64)
+        end_ns = np.asarray(end_ns, dtype=np.int64)
+        if not len(start_ns):
+            return np.zeros(0, dtype=np.int64)
+
+        intervals = self._get_intervals(int(start_ns.min()), int(end_ns.max()))
+        return self.cumulative_working_time(
+            end_ns, intervals
+        ) - self.cumulative_working_time(start_ns, intervals)
+
+
+class TeamCalendars:
+    """
+    Working calendars of the managers: a default calendar and per-team calendars (own
+    shifts, days off or UTC offset) assigned to lists of manager ids.
+    """
+
+    def __init__(self, default: WorkingCalendar, teams: dict[str, tuple] = None):
+        """
+        Initialize the calendars.
+
+        Args:
+            default (WorkingCalendar): Calendar of the managers not in any team.
+            teams (dict[str, tuple]): Team name -> (WorkingCalendar, manager ids).
+        """
+        self.default = default
+        self.teams = teams or {}
+
+        self.calendars = [default]
+        manager_ids = []
+        calendar_codes = []
+        for name, (calendar, team_manager_ids) in self.teams.items():
+            self.calendars.append(calendar)
+            for manager_id in team_manager_ids:
+                if manager_id in manager_ids:
+                    raise ValueError(
+                        f"Manager {manager_id} belongs to several teams ({name})."
+                    )
+                manager_ids.append(manager_id)
+                calendar_codes.append(len(self.calendars) - 1)
+
+        order = np.argsort(manager_ids)
+        self._manager_ids = np.asarray(manager_ids, dtype=np.float64)[order]
+        self._calendar_codes = np.asarray(calendar_codes, dtype=np.int64)[order]
+
+    @classmethod
+    def from_settings(cls, settings: dict) -> "TeamCalendars":
+        """
+        Create the calendars from settings with a ``default`` section and an optional
+        ``teams`` section (team name -> ``managers`` ids and settings overriding the
+        default ones).
+
+        Args:
+            settings (dict): Loaded calendar YAML file.
+
+        Returns:
+            TeamCalendars: The calendars.
+        """
+        defaults = settings.get("default") or {}
+        teams = {}
+        for name, team in (settings.get("teams") or {}).items():
+            team = dict(team)
+            manager_ids = team.pop("managers", None) or []
+            teams[name] = (WorkingCalendar.from_settings(team, defaults), manager_ids)
+        return cls(WorkingCalendar.from_settings(defaults), teams)
+
+    @classmethod
+    def from_yaml(cls, file_path: str) -> "TeamCalendars":
+        """
+        Load the calendars from a YAML file (see ``settings/calendar/calendar.yaml``).
+
+        Args:
+            file_path (str): Path to the YAML file.
+
+        Returns:
+            TeamCalendars: The calendars.
+        """
+        try:
+            calendars = cls.from_settings(FileHandler.load_yaml(file_path))
+        except Exception as e:
+            logger.error(f"Error loading the working calendar {file_path}: {e}")
+            raise
+        logger.info(
+            f"Working calendar loaded: {len(calendars.teams)} teams besides the default."
+        )
+        return calendars
+
+    def working_time(
+        self, start_ns: np.ndarray, end_ns: np.ndarray, manager_ids: np.ndarray = None
+    ) -> np.ndarray:
+        """
+        Working time between pairs of timestamps in the calendar of the manager.
+
+        Args:
+            start_ns (np.ndarray): Start timestamps, UTC nanoseconds since epoch.
+            end_ns (np.ndarray): End timestamps, not earlier than the starts.
+            manager_ids (np.ndarray): Manager of every pair. Missing ids and managers
+                without a team use the default calendar.
+
+        Returns:
+            np.ndarray: Working time in nanoseconds (int64).
+        """
+        if not len(self._manager_ids) or manager_ids is None:
+            return self.default.working_time(start_ns, end_ns)
+
+        manager_ids = pd.array(manager_ids).to_numpy(dtype=np.float64, na_value=np.nan)
+        position = np.searchsorted(self._manager_ids, manager_ids)
+        clipped = np.minimum(position, len(self._manager_ids) - 1)
+        codes = np.where(
+            self._manager_ids[clipped] == manager_ids,
+            self._calendar_codes[clipped],
+            0,
+        )
+
+        start_ns = np.asarray(start_ns, dtype=np.int64)
+        end_ns = np.asarray(end_ns, dtype=np.int64)
+        result = np.empty(len(start_ns), dtype=np.int64)
+        for code, calendar in enumerate(self.calendars):
+            selected = np.flatnonzero(codes == code)
+            result[selected] = calendar.working_time(
+                start_ns[selected], end_ns[selected]
+            )
+        return result
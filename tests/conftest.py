@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def db_settings() -> dict:
+    """
+    Connection arguments of DatabaseExtractor for the PostgreSQL database of
+    ``TEST_DATABASE_DSN``. Tests using it are skipped when the variable is not set.
+    """
+    dsn = os.environ.get("TEST_DATABASE_DSN")
+    if not dsn:
+        pytest.skip("TEST_DATABASE_DSN is not set")
+    from psycopg2.extensions import parse_dsn
+
+    settings = parse_dsn(dsn)
+    return {
+        "db_host": settings.get("host", "localhost"),
+        "db_port": int(settings.get("port", 5432)),
+        "db_name": settings.get("dbname", "postgres"),
+        "db_user": settings.get("user", "postgres"),
+        "db_password": settings.get("password", ""),
+    }
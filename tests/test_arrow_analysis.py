@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_tables
+from src import ArrowChatResponseAnalyzer, ChatResponseAnalyzer, DailyStatsStore
+
+WORKING_HOURS = {
+    "work_start": timedelta(hours=9),
+    "work_end": timedelta(hours=18),
+    "utc_offset": timedelta(hours=3),
+}
+PERCENTILES = (0.5, 0.9, 0.99)
+
+
+def analyzers(tmp_path, **kwargs) -> tuple:
+    return tuple(
+        cls(
+            **WORKING_HOURS,
+            percentiles=PERCENTILES,
+            daily_store=DailyStatsStore(
+                str(tmp_path / f"{cls.__name__}.sqlite3"),
+                utc_offset=WORKING_HOURS["utc_offset"],
+            ),
+            **kwargs,
+        )
+        for cls in (ChatResponseAnalyzer, ArrowChatResponseAnalyzer)
+    )
+
+
+# Суммы с плавающей точкой при многопоточной группировке Arrow складывались в другом
+# порядке, и после округления средние расходились (например, seed 0 на 10^4 сообщений)
+@pytest.mark.parametrize(
+    "messages, seed", [(10_000, 0), *((20_000, seed) for seed in range(8))]
+)
+def test_arrow_result_equals_pandas(tmp_path, messages, seed):
+    tables = generate_tables(messages=messages, seed=seed)
+    pandas_analyzer, arrow_analyzer = analyzers(tmp_path)
+
+    expected = pandas_analyzer.analyze_result(
+        tables["chat_messages"], tables["managers"], tables["rops"]
+    )
+    actual = arrow_analyzer.analyze_result(
+        tables["chat_messages"], tables["managers"], tables["rops"]
+    )
+
+    pd.testing.assert_frame_equal(actual, expected, check_exact=True)
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_arrow_partials_equal_pandas(tmp_path, seed):
+    tables = generate_tables(messages=20_000, seed=seed)
+    pandas_analyzer, arrow_analyzer = analyzers(
+        tmp_path, period_start=pd.Timestamp("2024-01-03", tz="UTC")
+    )
+
+    messages = pandas_analyzer._preprocess_messages(tables["chat_messages"])
+    expected = pandas_analyzer._summarize_responses(
+        pandas_analyzer._calculate_response_times(
+            pandas_analyzer._filter_messages(messages)
+        )
+    )
+    actual = arrow_analyzer._summarize_arrow(
+        arrow_analyzer._calculate_response_times_arrow(
+            arrow_analyzer._filter_arrow(
+                arrow_analyzer._preprocess_arrow(tables["chat_messages"])
+            )
+        )
+    )
+
+    keys = {
+        "summary": ["manager_id"],
+        "daily": ["manager_id", "day"],
+        "sketch": ["manager_id", "bucket"],
+        "daily_sketch": ["manager_id", "day", "bucket"],
+    }
+    assert actual.keys() == expected.keys()
+    for name, columns in keys.items():
+        left = actual[name].sort_values(columns, ignore_index=True)
+        right = expected[name].sort_values(columns, ignore_index=True)
+        # Суммы квадратов остаются числами с плавающей точкой
+        exact_columns = right.columns.drop("response_time_sum_sq", errors="ignore")
+        pd.testing.assert_frame_equal(
+            left[exact_columns], right[exact_columns], check_dtype=False
+        )
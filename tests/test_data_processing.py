@@ -0,0 +1,259 @@
+"""
+ChatResponseAnalyzer against the per-row loop it replaced.
+
+``reference_result`` keeps the structure of the original implementation: block starts
+are compared pairwise with ``iloc`` inside every conversation, averages are the mean of
+the response times in minutes and the names are attached with merges. The original
+working-hours branches only handled replies on the same or the next day; they were
+replaced by the working calendar, so the reference walks the local days between the
+client message and the reply instead and adds up the overlap with the shift.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_tables
+from src import ChatResponseAnalyzer
+from src.data_processing import PartialsBuffer
+
+WORK_START = timedelta(hours=9)
+WORK_END = timedelta(hours=18)
+UTC_OFFSET = timedelta(hours=3)
+INCOMING, OUTGOING = ChatResponseAnalyzer.MESSAGE_TYPES
+RESULT_COLUMNS = ["name_mop", "avg_response_time_minutes", "rop_name"]
+
+
+def reference_working_time(incoming: pd.Timestamp, reply: pd.Timestamp) -> timedelta:
+    # Пересечение интервала с рабочим временем каждого местного дня
+    incoming, reply = incoming + UTC_OFFSET, reply + UTC_OFFSET
+    worked = timedelta(0)
+    day = incoming.normalize()
+    while day <= reply:
+        start = max(day + WORK_START, incoming)
+        end = min(day + WORK_END, reply)
+        if start < end:
+            worked += end - start
+        day += timedelta(days=1)
+    return worked
+
+
+def reference_result(
+    df_chat_messages: pd.DataFrame, df_managers: pd.DataFrame, df_rops: pd.DataFrame
+) -> pd.DataFrame:
+    df_chat_messages = df_chat_messages.copy()
+    df_chat_messages["created_at"] = pd.to_datetime(
+        df_chat_messages["created_at"], unit="s", utc=True
+    )
+    df_chat_messages = df_chat_messages.sort_values(by=["entity_id", "created_at"])
+    df_chat_messages["is_first_in_block"] = (
+        df_chat_messages["type"] != df_chat_messages["type"].shift()
+    ) | (df_chat_messages["entity_id"] != df_chat_messages["entity_id"].shift())
+    filtered_messages = df_chat_messages[df_chat_messages["is_first_in_block"]]
+
+    responses = []
+    for _, group in filtered_messages.groupby("entity_id"):
+        for i in range(1, len(group)):
+            prev_row = group.iloc[i - 1]
+            curr_row = group.iloc[i]
+            if prev_row["type"] == INCOMING and curr_row["type"] == OUTGOING:
+                responses.append(
+                    {
+                        "manager_id": curr_row["created_by"],
+                        "response_time": reference_working_time(
+                            prev_row["created_at"], curr_row["created_at"]
+                        ).total_seconds()
+                        / 60,
+                    }
+                )
+    if not responses:
+        return pd.DataFrame({column: [] for column in RESULT_COLUMNS}).astype(
+            {"name_mop": object, "rop_name": object}
+        )
+
+    responses_df = pd.DataFrame(responses).merge(
+        df_managers, left_on="manager_id", right_on="mop_id"
+    )
+    average_response_time = (
+        responses_df.groupby("name_mop")["response_time"].mean().reset_index()
+    )
+    average_response_time = average_response_time.rename(
+        columns={"response_time": "avg_response_time_minutes"}
+    )
+    average_response_time["avg_response_time_minutes"] = average_response_time[
+        "avg_response_time_minutes"
+    ].round(2)
+    average_response_time = average_response_time.sort_values(
+        by="avg_response_time_minutes"
+    ).reset_index(drop=True)
+
+    merged_df = average_response_time.merge(
+        df_managers[["name_mop", "rop_id"]].astype({"rop_id": str}),
+        on="name_mop",
+        how="left",
+    ).merge(
+        df_rops[["rop_id", "rop_name"]].astype({"rop_id": str}),
+        on="rop_id",
+        how="left",
+    )
+    return merged_df.drop(columns=["rop_id"])
+
+
+def analyzer() -> ChatResponseAnalyzer:
+    return ChatResponseAnalyzer(
+        work_start=WORK_START, work_end=WORK_END, utc_offset=UTC_OFFSET
+    )
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize(
+    "settings",
+    [
+        # Короткие ответы, часть переписок начинается в нерабочее время
+        {"mean_response_minutes": 30.0, "off_hours_share": 0.3},
+        # Ответы через несколько дней, длинные блоки сообщений
+        {"mean_response_minutes": 2000.0, "mean_block_length": 4.0},
+        # Все переписки начинаются вне рабочего времени
+        {"mean_response_minutes": 300.0, "off_hours_share": 1.0},
+    ],
+)
+def test_result_equals_reference_loop(settings, seed):
+    tables = generate_tables(messages=3_000, managers=12, seed=seed, **settings)
+
+    expected = reference_result(
+        tables["chat_messages"], tables["managers"], tables["rops"]
+    )
+    actual = analyzer().analyze_result(
+        tables["chat_messages"], tables["managers"], tables["rops"]
+    )
+
+    pd.testing.assert_frame_equal(actual, expected, check_exact=True)
+
+
+def utc_seconds(day: int, hour: int, minute: int = 0) -> int:
+    return int(datetime(2024, 1, day, hour, minute, tzinfo=timezone.utc).timestamp())
+
+
+# Смена 09:00–18:00 по UTC+3, то есть 06:00–15:00 UTC.
+# Менеджер -> (сообщения переписки (тип, время), ожидаемое время ответа в минутах)
+CASES = {
+    "same shift": ([(INCOMING, (1, 7)), (OUTGOING, (1, 7, 30))], 30.0),
+    "before the shift": ([(INCOMING, (1, 3)), (OUTGOING, (1, 6, 30))], 30.0),
+    "next morning": ([(INCOMING, (1, 14)), (OUTGOING, (2, 7))], 120.0),
+    "two days later": ([(INCOMING, (1, 14)), (OUTGOING, (3, 7))], 660.0),
+    "reply after the shift": ([(INCOMING, (1, 7)), (OUTGOING, (1, 16))], 480.0),
+    "both off hours": ([(INCOMING, (1, 16)), (OUTGOING, (1, 20))], 0.0),
+    # Считаются только первые сообщения блоков
+    "block boundaries": (
+        [
+            (INCOMING, (1, 7)),
+            (INCOMING, (1, 7, 10)),
+            (OUTGOING, (1, 7, 45)),
+            (OUTGOING, (1, 8)),
+            (INCOMING, (1, 9)),
+            (OUTGOING, (1, 9, 5)),
+        ],
+        25.0,
+    ),
+}
+
+
+def test_result_of_fixed_cases():
+    rows = [
+        (entity_id, message_type, utc_seconds(*at), entity_id)
+        for entity_id, (messages, _) in enumerate(CASES.values(), start=1)
+        for message_type, at in messages
+    ]
+    # Менеджер пишет первым: ответа нет, менеджера нет в результате
+    rows += [
+        (99, OUTGOING, utc_seconds(1, 7), 99),
+        (99, INCOMING, utc_seconds(1, 8), 99),
+    ]
+    df_chat_messages = pd.DataFrame(
+        rows, columns=["entity_id", "type", "created_at", "created_by"]
+    )
+    df_managers = pd.DataFrame(
+        {
+            "mop_id": [*range(1, len(CASES) + 1), 99],
+            "name_mop": [*CASES, "initiator"],
+            "rop_id": 1,
+        }
+    )
+    df_rops = pd.DataFrame({"rop_id": [1], "rop_name": ["ROP"]})
+
+    actual = analyzer().analyze_result(df_chat_messages, df_managers, df_rops)
+
+    expected = pd.DataFrame(
+        {
+            "name_mop": list(CASES),
+            "avg_response_time_minutes": [minutes for _, minutes in CASES.values()],
+            "rop_name": "ROP",
+        }
+    )
+    # Порядок менеджеров с одинаковым средним не задан
+    order = ["avg_response_time_minutes", "name_mop"]
+    pd.testing.assert_frame_equal(
+        actual.sort_values(order, ignore_index=True),
+        expected.sort_values(order, ignore_index=True),
+    )
+    pd.testing.assert_frame_equal(
+        reference_result(df_chat_messages, df_managers, df_rops), actual
+    )
+
+
+def test_empty_messages():
+    tables = generate_tables(messages=10, seed=0)
+    df_chat_messages = tables["chat_messages"].iloc[:0]
+
+    actual = analyzer().analyze_result(
+        df_chat_messages, tables["managers"], tables["rops"]
+    )
+
+    pd.testing.assert_frame_equal(
+        actual,
+        reference_result(df_chat_messages, tables["managers"], tables["rops"]),
+        check_index_type=False,
+    )
+    assert np.array_equal(actual.columns, RESULT_COLUMNS)
+
+
+@pytest.mark.parametrize("messages, chunk_size", [(600, 1), (3_000, 7), (3_000, 500)])
+def test_chunks_equal_whole_analysis(messages, chunk_size, monkeypatch):
+    tables = generate_tables(messages=messages, seed=1)
+    # Потоковый режим получает сообщения, упорядоченные по сделке и времени
+    df_chat_messages = tables["chat_messages"].sort_values(
+        ["entity_id", "created_at"], kind="stable", ignore_index=True
+    )
+    chunks = [
+        df_chat_messages.iloc[start : start + chunk_size]
+        for start in range(0, len(df_chat_messages), chunk_size)
+    ]
+    chunk_analyzer = ChatResponseAnalyzer(
+        work_start=WORK_START,
+        work_end=WORK_END,
+        utc_offset=UTC_OFFSET,
+        percentiles=(0.5, 0.9),
+    )
+    merges = []
+    merge_partials = chunk_analyzer._merge_partials
+    monkeypatch.setattr(
+        chunk_analyzer,
+        "_merge_partials",
+        lambda partials: merges.append(len(partials)) or merge_partials(partials),
+    )
+
+    expected = ChatResponseAnalyzer(
+        work_start=WORK_START,
+        work_end=WORK_END,
+        utc_offset=UTC_OFFSET,
+        percentiles=(0.5, 0.9),
+    ).analyze_result(df_chat_messages, tables["managers"], tables["rops"])
+    actual = chunk_analyzer.analyze_chunks(
+        iter(chunks), tables["managers"], tables["rops"]
+    )
+
+    pd.testing.assert_frame_equal(actual, expected, check_exact=True)
+    # Частичные агрегаты объединяются пачками, а не на каждом чанке
+    assert len(merges) <= len(chunks) // PartialsBuffer(chunk_analyzer).batch_chunks + 1
@@ -0,0 +1,164 @@
+"""
+Incremental extraction of DatabaseExtractor. Needs the PostgreSQL database of
+``TEST_DATABASE_DSN``; the test table is created in a separate schema.
+"""
+
+import os
+
+import pandas as pd
+import pytest
+
+from src import ChatResponseAnalyzer, DatabaseExtractor, QueryBuilder
+from src.utils import FileHandler
+
+SCHEMA = "test_get_data_db"
+INCOMING, OUTGOING = ChatResponseAnalyzer.MESSAGE_TYPES
+
+
+@pytest.fixture
+def extractor(db_settings, tmp_path) -> DatabaseExtractor:
+    extractor = DatabaseExtractor(
+        **db_settings,
+        cache_folder=str(tmp_path / "cache"),
+        query_builder=QueryBuilder(
+            schema=SCHEMA,
+            columns=ChatResponseAnalyzer.REQUIRED_COLUMNS,
+            message_types=ChatResponseAnalyzer.MESSAGE_TYPES,
+        ),
+    )
+    execute(
+        extractor,
+        f"""
+        DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;
+        CREATE SCHEMA {SCHEMA};
+        CREATE TABLE {SCHEMA}.chat_messages (
+            id bigint PRIMARY KEY,
+            entity_id integer,
+            type text,
+            created_at bigint,
+            created_by integer
+        );
+        """,
+    )
+    yield extractor
+    execute(extractor, f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;")
+    extractor.close()
+
+
+def execute(extractor: DatabaseExtractor, query: str, params: list = None) -> None:
+    conn = extractor.connect_to_db()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(query, params)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def insert(extractor: DatabaseExtractor, rows: list[tuple]) -> None:
+    for row in rows:
+        execute(
+            extractor,
+            f"INSERT INTO {SCHEMA}.chat_messages VALUES (%s, %s, %s, %s, %s);",
+            row,
+        )
+
+
+def extract(extractor: DatabaseExtractor) -> pd.DataFrame:
+    history = extractor.extract_and_save_data(
+        incremental=True, tables=["chat_messages"]
+    )["chat_messages"]
+    return history.sort_values("id", ignore_index=True)
+
+
+def expected_table(extractor: DatabaseExtractor) -> pd.DataFrame:
+    conn = extractor.connect_to_db()
+    try:
+        return extractor._read_query(conn, extractor.queries["chat_messages"])
+    finally:
+        conn.close()
+
+
+def test_incremental_keeps_distinct_messages_with_equal_values(extractor):
+    # Два сообщения с одинаковыми сделкой, типом, менеджером и временем
+    insert(
+        extractor,
+        [
+            (1, 10, INCOMING, 1_000, None),
+            (2, 10, OUTGOING, 1_600, 7),
+            (3, 10, OUTGOING, 1_600, 7),
+        ],
+    )
+    assert len(extract(extractor)) == 3
+
+    # Новые одинаковые сообщения и изменённая строка в окне перекрытия
+    insert(
+        extractor,
+        [(4, 10, INCOMING, 2_000, None), (5, 10, INCOMING, 2_000, None)],
+    )
+    execute(
+        extractor, f"UPDATE {SCHEMA}.chat_messages SET created_by = 8 WHERE id = 3;"
+    )
+
+    history = extract(extractor)
+
+    pd.testing.assert_frame_equal(
+        history,
+        expected_table(extractor).sort_values("id", ignore_index=True),
+        check_dtype=False,
+    )
+    assert history["id"].tolist() == [1, 2, 3, 4, 5]
+    assert history.loc[history["id"] == 3, "created_by"].item() == 8
+
+
+def test_incremental_reloads_cache_with_other_columns(extractor):
+    insert(
+        extractor,
+        [(1, 10, INCOMING, 1_000, None), (2, 10, OUTGOING, 1_600, 7)],
+    )
+    extract(extractor)
+    # Кэш без id, как до его добавления в выборку
+    history_path = os.path.join(extractor.cache_folder, "chat_messages.arrow")
+    FileHandler.save_snapshot(
+        FileHandler.read_snapshot(history_path, memory_map=False).drop(columns="id"),
+        history_path,
+        "",
+        "",
+    )
+    insert(extractor, [(3, 10, OUTGOING, 1_600, 7)])
+
+    history = extract(extractor)
+
+    assert history["id"].tolist() == [1, 2, 3]
+
+
+COPY_PARITY_QUERY = """
+SELECT * FROM (VALUES
+    (1::bigint, '01'::text, 'NA'::varchar, 1.5::float8, true,
+     '2024-01-01 10:00:00+03'::timestamptz, '2024-01-01 10:00'::timestamp, 5),
+    (2, '', 'null', NULL, NULL, NULL, NULL, NULL),
+    (3, NULL, 'None', 2.0, false, '2024-01-02 00:00:00+00', '2024-01-02', 7),
+    (4, 'nan', E'a,"b"\\nc', 3.0, true, '2024-01-02 00:00:00+00', '2024-01-02', 8)
+) AS result (id, code, name, score, active, updated_at, local_at, created_by)
+WHERE id >= %(first_id)s
+"""
+
+
+@pytest.mark.parametrize("client_encoding", ["UTF8", "WIN1251"])
+def test_copy_backend_equals_read_sql(db_settings, client_encoding):
+    frames = {}
+    for backend in ("read_sql", "copy"):
+        extractor = DatabaseExtractor(**db_settings, backend=backend)
+        conn = extractor.connect_to_db()
+        try:
+            conn.set_client_encoding(client_encoding)
+            frames[backend] = extractor._read_query(
+                conn, (COPY_PARITY_QUERY, {"first_id": 1})
+            )
+        finally:
+            conn.close()
+
+    pd.testing.assert_frame_equal(frames["copy"], frames["read_sql"])
+    # NULL, пустая строка и текст, похожий на пропуск, различаются
+    assert frames["copy"]["code"].tolist() == ["01", "", None, "nan"]
+    assert frames["copy"]["name"].tolist()[:3] == ["NA", "null", "None"]
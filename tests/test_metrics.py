@@ -0,0 +1,82 @@
+import os
+import threading
+import tracemalloc
+
+from src.metrics import MetricsRecorder
+
+
+def test_tracing_stops_after_the_last_concurrent_run():
+    recorders = [MetricsRecorder(trace_memory=True) for _ in range(2)]
+    recorders[0].start_run()
+    recorders[1].start_run()
+
+    recorders[0].finish_run(True)
+    assert tracemalloc.is_tracing()
+    with recorders[1].stage("analyze") as stage:
+        stage["rows_out"] = 1
+    recorders[1].finish_run(True)
+
+    assert not tracemalloc.is_tracing()
+    assert recorders[1].stages["analyze"]["peak_traced_bytes"] is not None
+
+
+def test_tracing_of_concurrent_threads():
+    started = threading.Barrier(4)
+
+    def run() -> None:
+        recorder = MetricsRecorder(trace_memory=True)
+        recorder.start_run()
+        started.wait()
+        with recorder.stage("analyze"):
+            assert tracemalloc.is_tracing()
+        recorder.finish_run(True)
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not tracemalloc.is_tracing()
+
+
+def test_tracing_started_by_the_caller_is_kept():
+    tracemalloc.start()
+    try:
+        recorder = MetricsRecorder(trace_memory=True)
+        recorder.start_run()
+        recorder.finish_run(True)
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+
+def test_stage_records_growth_of_peak_rss():
+    recorder = MetricsRecorder()
+    recorder.start_run()
+    with recorder.stage("analyze"):
+        pass
+    recorder.finish_run(True)
+
+    record = recorder.to_dict()
+    growth = record["stages"]["analyze"]["rss_growth_bytes"]
+    assert growth is None or growth >= 0
+    assert "peak_rss_bytes" not in record["stages"]["analyze"]
+    assert record["peak_rss_bytes"] == recorder.peak_rss
+
+
+def test_run_records_are_pruned(tmp_path):
+    (tmp_path / "average_response.prom").write_text("")
+    recorder = MetricsRecorder()
+    paths = []
+    for hour in range(5):
+        recorder.start_run()
+        recorder.started_at = recorder.started_at.replace(
+            year=2024, month=1, day=1, hour=hour
+        )
+        recorder.finish_run(True)
+        paths.append(recorder.write_run_record(str(tmp_path), keep=3))
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        [os.path.basename(path) for path in paths[2:]] + ["average_response.prom"]
+    )
@@ -0,0 +1,156 @@
+"""
+SqlChatResponseAnalyzer against ChatResponseAnalyzer on the same synthetic messages.
+
+The tests need a PostgreSQL database: set ``TEST_DATABASE_DSN`` (e.g.
+``host=localhost port=5432 dbname=postgres user=postgres password=...``). The synthetic
+table is created in a separate schema, which is dropped afterwards.
+"""
+
+import io
+import os
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import generate_tables
+from src import (
+    ChatResponseAnalyzer,
+    DailyStatsStore,
+    DatabaseExtractor,
+    SqlChatResponseAnalyzer,
+    TeamCalendars,
+)
+
+SCHEMA = "test_sql_analysis"
+CALENDAR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "settings",
+    "calendar",
+    "calendar.yaml",
+)
+PERCENTILES = (0.5, 0.9, 0.99)
+DAYS = 7
+# Ключи частичных агрегатов для сравнения построчно
+PARTIAL_KEYS = {
+    "summary": ["manager_id"],
+    "daily": ["manager_id", "day"],
+    "sketch": ["manager_id", "bucket"],
+    "daily_sketch": ["manager_id", "day", "bucket"],
+}
+
+
+@pytest.fixture(scope="module")
+def tables() -> dict:
+    tables = generate_tables(messages=50_000, days=DAYS, seed=0)
+    # Строки приходят из базы в порядке id, так одинаково упорядочены сообщения,
+    # отправленные в одну секунду
+    tables["chat_messages"] = tables["chat_messages"].sort_values(
+        "id", ignore_index=True
+    )
+    return tables
+
+
+@pytest.fixture(scope="module")
+def extractor(db_settings, tables) -> DatabaseExtractor:
+    extractor = DatabaseExtractor(**db_settings)
+    extractor.query_builder.schema = SCHEMA
+
+    buffer = io.StringIO()
+    tables["chat_messages"].astype({"created_by": "Int64"}).to_csv(buffer, index=False)
+    buffer.seek(0)
+    conn = extractor.connect_to_db()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(
+                f"""
+                DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;
+                CREATE SCHEMA {SCHEMA};
+                CREATE TABLE {SCHEMA}.chat_messages (
+                    id bigint PRIMARY KEY,
+                    entity_id integer,
+                    type text,
+                    created_at bigint,
+                    created_by integer
+                );
+                """
+            )
+            cursor.copy_expert(
+                f"COPY {SCHEMA}.chat_messages "
+                f"({', '.join(tables['chat_messages'].columns)}) "
+                "FROM STDIN WITH (FORMAT csv, HEADER)",
+                buffer,
+            )
+        conn.commit()
+        yield extractor
+    finally:
+        with conn.cursor() as cursor:
+            cursor.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE;")
+        conn.commit()
+        conn.close()
+        extractor.close()
+
+
+@pytest.mark.parametrize("period_days", [None, 3])
+def test_sql_result_equals_pandas(tmp_path, extractor, tables, period_days):
+    calendar = TeamCalendars.from_yaml(CALENDAR)
+    period = {}
+    if period_days:
+        first = pd.Timestamp(
+            tables["chat_messages"]["created_at"].min(), unit="s"
+        ).normalize()
+        period = {
+            "period_start": first + timedelta(days=DAYS - period_days),
+            "period_end": first + timedelta(days=DAYS),
+        }
+    pandas_analyzer, sql_analyzer = (
+        cls(
+            calendar=calendar,
+            daily_store=DailyStatsStore(
+                str(tmp_path / f"{name}.sqlite3"),
+                utc_offset=calendar.default.utc_offset,
+            ),
+            percentiles=PERCENTILES,
+            **period,
+            **kwargs,
+        )
+        for name, cls, kwargs in (
+            ("pandas", ChatResponseAnalyzer, {}),
+            ("sql", SqlChatResponseAnalyzer, {"db_extractor": extractor}),
+        )
+    )
+
+    messages = pandas_analyzer._preprocess_messages(tables["chat_messages"])
+    expected = pandas_analyzer._summarize_responses(
+        pandas_analyzer._calculate_response_times(
+            pandas_analyzer._filter_messages(messages)
+        )
+    )
+    actual = sql_analyzer._summarize_in_database()
+
+    assert actual.keys() == expected.keys()
+    for name, keys in PARTIAL_KEYS.items():
+        left = actual[name].sort_values(keys, ignore_index=True)
+        right = expected[name].sort_values(keys, ignore_index=True)
+        # Счётчики и суммы в микросекундах целые и совпадают точно; минуты и суммы
+        # квадратов считаются в double precision базы
+        float_columns = right.columns.intersection(
+            ["response_time_sum_sq", "response_time_min", "response_time_max"]
+        )
+        pd.testing.assert_frame_equal(
+            left[right.columns.drop(float_columns)],
+            right[right.columns.drop(float_columns)],
+            check_dtype=False,
+        )
+        np.testing.assert_allclose(
+            left[float_columns].to_numpy(np.float64),
+            right[float_columns].to_numpy(np.float64),
+            rtol=1e-12,
+        )
+
+    pd.testing.assert_frame_equal(
+        sql_analyzer._finalize_summary(actual, tables["managers"], tables["rops"]),
+        pandas_analyzer._finalize_summary(expected, tables["managers"], tables["rops"]),
+        check_exact=True,
+    )